@@ -44,9 +44,10 @@ from .progressbar import ProgressBar
 from .about import About
 from .knitprogress import KnitProgress
 from .thread import GenericThread
-from .engine import Engine
+from .engine.engine import Engine
 from .engine.engine_fsm import Operation
-from typing import TYPE_CHECKING
+from .engine.latency import LineTiming
+from typing import TYPE_CHECKING, Optional
 
 if TYPE_CHECKING:
     from ..main import AppContext
@@ -88,6 +89,7 @@ class GuiMain(QMainWindow):
         self.flash = FirmwareFlash(self)
         self.audio = AudioPlayer(self)
         self.knit_thread = GenericThread(self.engine.run, Operation.KNIT)
+        self.line_timing: Optional[LineTiming] = None
         self.test_thread = GenericThread(self.engine.run, Operation.TEST)
 
         # show UI
@@ -171,6 +173,16 @@ class GuiMain(QMainWindow):
         self.ui.open_image_file_button.setEnabled(True)
         self.menu.setEnabled(True)
 
+    def report_line_timing(self, timing: LineTiming) -> None:
+        """Keep the line timing of the last knitting session and show it."""
+        self.line_timing = timing
+        if timing.lines > 0:
+            self.notify(
+                QCoreApplication.translate("KnitEngine", "Line timing")
+                + ": "
+                + timing.brief()
+            )
+
     def set_image_dimensions(self) -> None:
         """Set dimensions of image."""
         width, height = self.scene.ayabimage.image.size
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Knits an image from the command line, without the GUI.
+
+Loads an image, builds the `Pattern` and runs a `KnitSession` for each
+machine with a `SessionManager`, printing the progress as it goes. None
+of the modules used import Qt, so this starts much faster and in much
+less memory than the GUI.
+
+From `src/main/python/main` run:
+
+`python -m ayab.cli IMAGE --port /dev/ttyACM0 [options]`
+
+Repeat `--port` to knit the same image on several machines at once.
+
+Options can also be read from a JSON file in the format of
+`OptionsTab.as_dict`, with `--options FILE`; arguments take precedence.
+
+`--capture FILE` records the bytes exchanged with the device. Knitting the
+same image with the same options and `--replay FILE` instead of a port
+plays back the device side of the capture, and fails unless the same
+lines are sent to it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import logging
+import sys
+from typing import Any, Optional, Sequence
+
+from PIL import Image
+
+from .engine.capture import CaptureRecorder, ReplaySerial
+from .engine.clock import SYSTEM_CLOCK, Clock, VirtualClock
+from .engine.communication import Transport
+from .engine.emulator import FirmwareEmulator
+from .engine.knit_options import Alignment, KnitOptions, KnitPreferences, NeedleColor
+from .engine.mode import Mode
+from .engine.output import Output
+from .engine.pattern import Pattern
+from .engine.sessions import KnitSession, SessionManager
+from .engine.simulator import SimulatedSerial
+from .engine.status import Status
+from .machine import Machine
+
+MESSAGES = {
+    Output.CONNECTING_TO_MACHINE: "Connecting to machine...",
+    Output.DISCONNECTING_FROM_MACHINE: "Disconnecting from machine...",
+    Output.INITIALIZING_FIRMWARE: "Initializing firmware",
+    Output.ERROR_INITIALIZING_FIRMWARE: "Error initializing firmware",
+    Output.ERROR_SERIAL_PORT: "Error opening serial port",
+    Output.ERROR_INVALID_SETTINGS: "Invalid settings",
+    Output.WAIT_FOR_INIT: "Please start machine. (Set the carriage to mode KC-I "
+    + "or KC-II and move the carriage over the left turn mark).",
+    Output.ERROR_WRONG_API: "Wrong Arduino firmware version. Please check "
+    + "that you have flashed the latest version.",
+    Output.PLEASE_KNIT: "Please knit.",
+    Output.DEVICE_NOT_READY: "Device not ready, try again.",
+    Output.KNITTING_FINISHED: "Image transmission finished. Please knit until you "
+    + "hear the double beep sound.",
+}
+
+# seconds to wait for the sessions to close their ports when interrupted
+CANCEL_TIMEOUT = 5.0
+
+# outputs after which the state machine waits for the user to give up
+FATAL = (
+    Output.ERROR_INVALID_SETTINGS,
+    Output.ERROR_WRONG_API,
+    Output.ERROR_INITIALIZING_FIRMWARE,
+    Output.DEVICE_NOT_READY,
+)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="ayab-cli", description="Knit an image with an AYAB device."
+    )
+    parser.add_argument("image", help="image file to knit")
+    parser.add_argument("--options", metavar="FILE", help="JSON file of options")
+    device = parser.add_mutually_exclusive_group()
+    device.add_argument(
+        "--port",
+        action="append",
+        help="serial port, ws:// URL or Simulation; repeat to knit on several"
+        + " machines",
+    )
+    device.add_argument(
+        "--simulate",
+        nargs="?",
+        type=float,
+        const=FirmwareEmulator.DEFAULT_SPEED,
+        metavar="SPEED",
+        help="knit on a simulated machine in virtual time, with the carriage"
+        + " moving at SPEED needles per second",
+    )
+    parser.add_argument(
+        "--machines",
+        type=int,
+        default=1,
+        metavar="N",
+        help="number of machines to simulate",
+    )
+    device.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="knit on the device recorded in a capture FILE, and check that"
+        + " the same lines are sent",
+    )
+    parser.add_argument(
+        "--capture",
+        metavar="FILE",
+        help="record the bytes exchanged with the device to FILE",
+    )
+    parser.add_argument("--machine", choices=[m.name for m in Machine])
+    parser.add_argument("--mode", choices=[m.name for m in Mode])
+    parser.add_argument("--colors", type=int, dest="num_colors")
+    parser.add_argument(
+        "--start-row", type=int, help="first row to knit, counting from 1"
+    )
+    parser.add_argument("--start-needle", help="e.g. L100 (orange side)")
+    parser.add_argument("--stop-needle", help="e.g. R100 (green side)")
+    parser.add_argument("--alignment", choices=[a.name for a in Alignment])
+    parser.add_argument(
+        "--infinite-repeat", action="store_true", default=None, dest="inf_repeat"
+    )
+    parser.add_argument(
+        "--auto-mirror", action="store_true", default=None, dest="auto_mirror"
+    )
+    parser.add_argument(
+        "--continuous-reporting",
+        action="store_true",
+        default=None,
+        dest="continuous_reporting",
+    )
+    parser.add_argument("--no-beep", action="store_true")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only errors")
+    parser.add_argument("-v", "--verbose", action="store_true", help="debug output")
+    return parser.parse_args(argv)
+
+
+def read_options(args: argparse.Namespace) -> KnitOptions:
+    """Combine the options file, if any, with the arguments."""
+    values: dict[str, Any] = {}
+    if args.options is not None:
+        with open(args.options) as file:
+            values.update(json.load(file))
+    for name in (
+        "machine",
+        "mode",
+        "num_colors",
+        "alignment",
+        "inf_repeat",
+        "auto_mirror",
+        "continuous_reporting",
+    ):
+        if getattr(args, name) is not None:
+            values[name] = getattr(args, name)
+    if args.port is not None:
+        values["portname"] = args.port[0]
+    if args.start_row is not None:
+        values["start_row"] = args.start_row - 1
+    machine = Machine[values.get("machine", Machine.KH910_KH950.name)]
+    if args.start_needle is not None:
+        values["start_needle"] = NeedleColor.parse(args.start_needle, machine)
+    if args.stop_needle is not None:
+        values["stop_needle"] = NeedleColor.parse(args.stop_needle, machine)
+    if args.simulate is not None:
+        values["portname"] = "Simulation"
+    if args.replay is not None:
+        values["portname"] = "Replay"
+    options = KnitOptions.from_dict(values)
+    options.prefs = KnitPreferences(disable_hardware_beep=args.no_beep)
+    return options
+
+
+def load_pattern(filename: str, options: KnitOptions) -> Pattern:
+    """Load an image and prepare it for knitting, as the GUI does."""
+    image = Image.open(filename).convert("RGBA")
+    # start to knit with the bottom first
+    image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    pattern = Pattern(image, options, options.num_colors)
+    pattern.set_knit_needles(options.start_needle, options.stop_needle, options.machine)
+    pattern.alignment = options.alignment
+    return pattern
+
+
+class Progress(object):
+    """
+    Prints the progress of the sessions, each line starting with the name
+    of the session if `names`. Stops a session if it replays a capture and
+    has sent a line that differs from it.
+    """
+
+    def __init__(
+        self,
+        quiet: bool = False,
+        replay: Optional[ReplaySerial] = None,
+        names: bool = False,
+    ):
+        self.quiet = quiet
+        self.replay = replay
+        self.names = names
+        self.outputs: dict[str, Output] = {}
+        self.line_numbers: dict[str, int] = {}
+
+    def __call__(self, session: KnitSession, status: Status) -> None:
+        prefix = session.name + ": " if self.names else ""
+        output = session.output
+        if output != self.outputs.get(session.name, Output.NONE):
+            self.outputs[session.name] = output
+            message = MESSAGES.get(output)
+            if output in FATAL:
+                print(prefix + str(message), file=sys.stderr)
+                session.cancel()
+            elif message is not None and not self.quiet:
+                print(prefix + message)
+        if self.replay is not None and self.replay.mismatches > 0:
+            # the device side of the capture cannot follow any more
+            session.cancel()
+        if (
+            status.line_number != self.line_numbers.get(session.name, -1)
+            and status.total_rows > 0
+            and not self.quiet
+        ):
+            self.line_numbers[session.name] = status.line_number
+            row = f"Row {status.current_row}/{status.total_rows}"
+            if status.repeats > 0:
+                row += f" (repeat {status.repeats})"
+            print(
+                f"{prefix}{row}, line {status.line_number},"
+                + f" color {status.color_symbol}"
+            )
+
+
+def machine_portnames(args: argparse.Namespace, options: KnitOptions) -> list[str]:
+    """Return the port of each machine to knit on."""
+    if args.machines < 1:
+        raise ValueError("Invalid number of machines.")
+    # else
+    if args.simulate is not None:
+        return [options.portname] * args.machines
+    # else
+    if args.machines > 1:
+        raise ValueError("Only simulated machines can be counted, use --port.")
+    # else
+    portnames = args.port or [options.portname]
+    if len(portnames) > 1 and (args.capture is not None or args.replay is not None):
+        raise ValueError("Captures can only be made and replayed on one machine.")
+    # else
+    return portnames
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    level = logging.DEBUG if args.verbose else logging.WARNING
+    logging.basicConfig(level=level, format="%(levelname)s %(name)s: %(message)s")
+    try:
+        options = read_options(args)
+        valid, error = options.validate()
+        if not valid:
+            raise ValueError(error)
+        # else
+        portnames = machine_portnames(args, options)
+        # each machine knits from its own pattern, as the rows are
+        # expanded on the knitting threads
+        patterns = [load_pattern(args.image, options) for _port in portnames]
+        if options.start_row >= patterns[0].pat_height:
+            raise ValueError("Start row is larger than the image.")
+        # else
+        replay = None
+        if args.replay is not None:
+            replay = ReplaySerial.open(args.replay)
+        recorder = None
+        if args.capture is not None:
+            recorder = CaptureRecorder.open(args.capture)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ayab-cli: {e}", file=sys.stderr)
+        return 2
+    # else
+    several = len(portnames) > 1
+    manager = SessionManager(Progress(args.quiet, replay, several))
+    for number, (portname, pattern) in enumerate(zip(portnames, patterns), 1):
+        clock: Clock = SYSTEM_CLOCK
+        transport: Optional[Transport] = None
+        if args.simulate is not None:
+            clock = VirtualClock()
+            transport = SimulatedSerial(FirmwareEmulator(args.simulate), clock)
+        elif replay is not None:
+            transport = replay
+        name = portname
+        if args.simulate is not None and several:
+            name += " " + str(number)
+        machine_options = copy.copy(options)
+        machine_options.portname = portname
+        try:
+            manager.add(name, pattern, machine_options, clock, transport, recorder)
+        except ValueError as e:
+            print(f"ayab-cli: {e}", file=sys.stderr)
+            return 2
+    manager.start()
+    try:
+        manager.wait()
+    except KeyboardInterrupt:
+        manager.cancel()
+        manager.wait(CANCEL_TIMEOUT)
+        print("Knitting canceled.", file=sys.stderr)
+        return 130
+    finally:
+        if recorder is not None:
+            recorder.close()
+    # else
+    result = 0
+    for session in manager.sessions.values():
+        prefix = session.name + ": " if several else ""
+        timing = session.control.timing
+        if not args.quiet and timing.lines > 0:
+            print(prefix + "Line timing: " + timing.summary())
+        if session.error is not None or session.output != Output.KNITTING_FINISHED:
+            result = 1
+    if replay is not None:
+        if not replay.verified:
+            print(
+                f"The replay differs from the capture: {replay.mismatches} lines"
+                + f" differ, {len(replay.cnf_lines)} lines sent",
+                file=sys.stderr,
+            )
+            return 1
+        # else
+        if result == 0 and not args.quiet:
+            print("The replay matches the capture.")
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
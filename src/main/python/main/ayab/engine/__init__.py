@@ -1,9 +1,22 @@
-from . import engine
-from . import lowercase_e_rc, lowercase_e_reversed_rc
+from __future__ import annotations
 
-# This adds the engine to the upper namespace of the module.
-Engine = engine.Engine
+import importlib
+from typing import TYPE_CHECKING, Any
 
-# We also add the resources for proper loading.
-lowercase_e_rc = lowercase_e_rc
-lowercase_e_reversed_rc = lowercase_e_reversed_rc
+if TYPE_CHECKING:
+    from .engine import Engine as Engine
+
+__all__ = ["Engine", "lowercase_e_rc", "lowercase_e_reversed_rc"]
+
+
+def __getattr__(name: str) -> Any:
+    # The engine (the dock widget) and its resources are loaded on first use,
+    # so that the modules of this package that do not need Qt can be
+    # imported without it.
+    if name == "Engine":
+        return importlib.import_module(".engine", __name__).Engine
+    # else
+    if name in ("lowercase_e_rc", "lowercase_e_reversed_rc"):
+        return importlib.import_module("." + name, __name__)
+    # else
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Runs the engine on an asyncio event loop.
+
+An alternative to the polling loop in `Runner.run`: the state machine is
+only stepped when the serial reader thread has queued a packet, when it
+has moved on to another state, or when a request is due to be repeated.
+The engine of the GUI uses it when the `event_driven_engine` preference
+is set.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Optional, Protocol
+
+from wakepy import keep
+
+from .engine_fsm import Operation, State
+
+if TYPE_CHECKING:
+    from .control import Control
+
+
+class Steppable(Protocol):
+    """The part of `Engine` used by the driver."""
+
+    control: Control
+
+    def begin(self, operation: Operation) -> None: ...
+
+    def step(self, operation: Operation) -> bool: ...
+
+    def finish(self, operation: Operation) -> None: ...
+
+    def cancel(self) -> None: ...
+
+
+class AsyncDriver(object):
+    """
+    Drives an engine operation with asyncio.
+
+    Between steps, the driver awaits an event that the reader thread of
+    `Communication` sets when packets arrive, so that no CPU is used while
+    waiting for the carriage. In the states that repeat their requests
+    to the device, and with simulated devices that have no reader thread,
+    it also wakes up every `RETRY_INTERVAL` seconds.
+    """
+
+    RETRY_INTERVAL = 0.1
+    RETRY_STATES = State.VERSION_CHECK, State.INIT
+
+    def __init__(self, engine: Steppable):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.__engine = engine
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__wakeup: Optional[asyncio.Event] = None
+        self.__canceled = False
+
+    def run(self, operation: Operation) -> None:
+        """Run an operation to completion on a new event loop."""
+        asyncio.run(self.operate(operation))
+
+    async def operate(self, operation: Operation) -> None:
+        """Run an operation to completion."""
+        self.__loop = asyncio.get_running_loop()
+        self.__wakeup = asyncio.Event()
+        self.__canceled = False
+        engine = self.__engine
+        engine.begin(operation)
+        with keep.presenting(on_fail="pass"):
+            try:
+                await self.__operate(engine, operation)
+            finally:
+                com = getattr(engine.control, "com", None)
+                if com is not None:
+                    com.set_listener(None)
+                engine.finish(operation)
+                self.__wakeup = None
+
+    async def __operate(self, engine: Steppable, operation: Operation) -> None:
+        assert self.__wakeup is not None
+        control = engine.control
+        com = None
+        events = False
+        while not self.__canceled:
+            self.__wakeup.clear()
+            state = control.state
+            if engine.step(operation):
+                break
+            # else
+            if getattr(control, "com", None) is not com:
+                # the connection was opened in this step
+                com = control.com
+                events = com.set_listener(self.wake)
+            if control.state != state or len(control.com.rx_msg_list) > 0:
+                continue
+            # else
+            timeout = None
+            if not events or control.state in self.RETRY_STATES:
+                timeout = self.RETRY_INTERVAL
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), timeout)
+            except TimeoutError:
+                pass
+
+    def wake(self) -> None:
+        """
+        Step the engine at once. Called from the reader thread when packets
+        have arrived, and may be called from any thread.
+        """
+        loop, wakeup = self.__loop, self.__wakeup
+        if loop is not None and wakeup is not None:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def cancel(self) -> None:
+        """Cancel the operation. May be called from any thread."""
+        self.__canceled = True
+        self.__engine.cancel()
+        self.wake()
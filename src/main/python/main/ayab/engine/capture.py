@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Capture and replay of the bytes exchanged with the device.
+
+A capture file starts with `MAGIC`, followed by one record per read from or
+write to the serial port: a header with the direction, the time in
+nanoseconds since the start of the capture and the length of the data,
+then the data itself.
+
+`ReplaySerial` plays back the device side of a capture as a serial port,
+and checks that the `cnfLine` messages written to it are the same as in
+the capture.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+import logging
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional, TypeAlias
+
+import sliplib
+
+from .messages import Token
+
+MAGIC = b"AYABCAP1"
+READ = 0
+WRITE = 1
+
+# direction, time in ns, data
+Record: TypeAlias = tuple[int, int, bytes]
+
+_header = struct.Struct("<BQI")
+
+
+class CaptureRecorder(object):
+    """Writes the bytes read from and written to the device to a capture file."""
+
+    def __init__(self, file: BinaryIO):
+        self.__file = file
+        self.__lock = threading.Lock()
+        self.__start = time.monotonic_ns()
+        self.__file.write(MAGIC)
+
+    @classmethod
+    def open(cls, path: str) -> CaptureRecorder:
+        return cls(open(path, "wb"))
+
+    def read(self, data: bytes) -> None:
+        self.__record(READ, data)
+
+    def write(self, data: bytes) -> None:
+        self.__record(WRITE, data)
+
+    def __record(self, direction: int, data: bytes) -> None:
+        if len(data) == 0:
+            return
+        # else
+        with self.__lock:
+            offset = time.monotonic_ns() - self.__start
+            self.__file.write(_header.pack(direction, offset, len(data)))
+            self.__file.write(data)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__file.close()
+
+
+def read_capture(file: BinaryIO) -> Iterator[Record]:
+    """Return the records of a capture file."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not an AYAB capture file")
+    # else
+    while True:
+        header = file.read(_header.size)
+        if len(header) < _header.size:
+            return
+        # else
+        direction, offset, length = _header.unpack(header)
+        data = file.read(length)
+        if len(data) < length:
+            raise ValueError("Truncated capture file")
+        # else
+        yield direction, offset, data
+
+
+def load_capture(path: str) -> list[Record]:
+    with open(path, "rb") as file:
+        return list(read_capture(file))
+
+
+class ReplaySerial(object):
+    """
+    Serial port that plays back the device side of a capture.
+
+    Data read by the device is only made available once the host has written
+    the messages that preceded it in the capture, so the replay follows the
+    conversation rather than the clock. Requests that the host repeats on a
+    timer (`reqInfo`, `reqInit`) are not counted, as their number depends on
+    timing. With `realtime`, the recorded gaps between reads are kept as well.
+
+    Every `cnfLine` written is compared with the capture: `mismatches` counts
+    the ones that differ, and `verified` tells whether the replay is complete
+    and identical.
+    """
+
+    REPEATED = Token.reqInfo.value, Token.reqInit.value
+
+    def __init__(
+        self, records: list[Record], realtime: bool = False, timeout: float = 0.1
+    ):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.is_open = True
+        self.timeout = timeout
+        self.realtime = realtime
+        self.mismatches = 0
+        self.cnf_lines: list[bytes] = []
+        self.__expected: list[bytes] = []
+        # reads of the device: messages written before, time, data
+        self.__reads: deque[tuple[int, int, bytes]] = deque()
+        self.__buffer = bytearray()
+        self.__driver = sliplib.Driver()
+        self.__written = 0
+        self.__written_times: list[float] = []
+        self.__last_read: Optional[tuple[int, float]] = None
+        self.__cond = threading.Condition()
+        self.__canceled = False
+        self.__start = time.monotonic()
+
+        driver = sliplib.Driver()
+        written = 0
+        for direction, offset, data in records:
+            if direction == READ:
+                self.__reads.append((written, offset, data))
+                continue
+            # else
+            for msg in driver.receive(data):
+                if len(msg) > 0 and msg[0] not in self.REPEATED:
+                    written += 1
+                if len(msg) > 0 and msg[0] == Token.cnfLine.value:
+                    self.__expected.append(msg)
+
+    @classmethod
+    def open(cls, path: str, realtime: bool = False) -> ReplaySerial:
+        return cls(load_capture(path), realtime)
+
+    @property
+    def in_waiting(self) -> int:
+        with self.__cond:
+            self.__release()
+            return len(self.__buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        with self.__cond:
+            while self.is_open:
+                wait = self.__release()
+                if len(self.__buffer) > 0:
+                    break
+                # else
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.__canceled:
+                    break
+                # else
+                self.__cond.wait(remaining if wait is None else min(wait, remaining))
+            self.__canceled = False
+            data = bytes(self.__buffer[:size])
+            del self.__buffer[:size]
+        return data
+
+    def __release(self) -> Optional[float]:
+        """
+        Move the reads that are due into the buffer. Return the time to wait
+        for the next one, or `None` if it waits for the host.
+        """
+        while len(self.__reads) > 0:
+            written, offset, data = self.__reads[0]
+            if written > self.__written:
+                return None
+            # else
+            if self.realtime:
+                # keep the recorded gap to the previous read,
+                # counting from when the host wrote what was answered
+                if self.__last_read is None:
+                    due = self.__start + offset / 1e9
+                else:
+                    last_offset, last_time = self.__last_read
+                    due = last_time + (offset - last_offset) / 1e9
+                if written > 0:
+                    due = max(due, self.__written_times[written - 1])
+                now = time.monotonic()
+                if due > now:
+                    return due - now
+                # else
+                self.__last_read = offset, due
+            self.__reads.popleft()
+            self.__buffer.extend(data)
+        return None
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        now = time.monotonic()
+        with self.__cond:
+            for msg in self.__driver.receive(bytes(data)):
+                if len(msg) == 0:
+                    continue
+                # else
+                if msg[0] not in self.REPEATED:
+                    self.__written += 1
+                    self.__written_times.append(now)
+                if msg[0] == Token.cnfLine.value:
+                    self.__check_cnf_line(msg)
+            self.__cond.notify_all()
+        return len(data)
+
+    def __check_cnf_line(self, msg: bytes) -> None:
+        index = len(self.cnf_lines)
+        self.cnf_lines.append(msg)
+        if index >= len(self.__expected):
+            self.mismatches += 1
+            self.logger.error(f"Unexpected cnfLine {index}: {msg.hex(' ')}")
+        elif msg != self.__expected[index]:
+            self.mismatches += 1
+            self.logger.error(
+                f"cnfLine {index} differs from the capture: {msg.hex(' ')}"
+                + f", expected {self.__expected[index].hex(' ')}"
+            )
+
+    @property
+    def finished(self) -> bool:
+        """Whether all the data of the capture has been read."""
+        with self.__cond:
+            return len(self.__reads) == 0 and len(self.__buffer) == 0
+
+    @property
+    def verified(self) -> bool:
+        """Whether all `cnfLine` messages of the capture were sent unchanged."""
+        return self.mismatches == 0 and len(self.cnf_lines) == len(self.__expected)
+
+    def cancel_read(self) -> None:
+        with self.__cond:
+            self.__canceled = True
+            self.__cond.notify_all()
+
+    def close(self) -> None:
+        with self.__cond:
+            self.is_open = False
+            self.__cond.notify_all()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Clocks for the timers of the knitting controller.
+
+The controller reads the time from a `Clock` rather than from the `time`
+module, so that simulations can run on a `VirtualClock` that only moves
+forward when something waits on it.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Protocol
+
+
+class Clock(Protocol):
+    def time(self) -> float:
+        """Return the time in seconds."""
+        ...
+
+    def sleep(self, seconds: float) -> None: ...
+
+
+class SystemClock(object):
+    """The monotonic clock of the system."""
+
+    def time(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class VirtualClock(object):
+    """A clock that advances when it is slept on, without waiting."""
+
+    def __init__(self, start: float = 0.0):
+        self.__now = start
+
+    def time(self) -> float:
+        return self.__now
+
+    def sleep(self, seconds: float) -> None:
+        self.__now += max(0.0, seconds)
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -18,65 +18,153 @@
 #    https://github.com/AllYarnsAreBeautiful/ayab-desktop
 """Handles the serial communication protocol.
 
-This module handles serial communication, currently works in a synchronous way.
+This module handles serial communication, either in a synchronous way or
+with a reader thread that queues incoming packets.
 AyabCommunication uses an internal PySerial.Serial object to connect
 to the device.
 The initializer can also be overriden with a dummy serial object.
 """
 
 from __future__ import annotations
-from typing import Optional
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Optional, Protocol
 import serial
 import sliplib
-from enum import Enum
+import threading
 from ..machine import Machine
+from .clock import SYSTEM_CLOCK, Clock
+from .edge import EDGE_TIMEOUT, EdgeJob
+from .messages import Message, Token as Token, Unknown, decode_message
 from .websocketserial import WebsocketSerial
 
 import logging
-import pprint
-
-
-class Token(Enum):
-    unknown = -2
-    none = -1
-    reqInfo = 0x03
-    cnfInfo = 0xC3
-    reqTest = 0x04
-    cnfTest = 0xC4
-    reqStart = 0x01
-    cnfStart = 0xC1
-    reqLine = 0x82
-    cnfLine = 0x42
-    indState = 0x84
-    helpCmd = 0x25
-    sendCmd = 0x26
-    beepCmd = 0x27
-    setSingleCmd = 0x28
-    setAllCmd = 0x29
-    readEOLsensorsCmd = 0x2A
-    readEncodersCmd = 0x2B
-    autoReadCmd = 0x2C
-    autoTestCmd = 0x2D
-    stopCmd = 0x2E
-    quitCmd = 0x2F
-    reqInit = 0x05
-    cnfInit = 0xC5
-    testRes = 0xEE
-    debug = 0x9F
-    slipFrameEnd = 0xC0
+
+if TYPE_CHECKING:
+    from .capture import CaptureRecorder
+
+
+class Transport(Protocol):
+    """The part of the `serial.Serial` interface used by `Communication`."""
+
+    @property
+    def is_open(self) -> bool: ...
+
+    @property
+    def in_waiting(self) -> int: ...
+
+    def read(self, size: int = 1, /) -> bytes: ...
+
+    def write(self, data: bytes | bytearray | memoryview, /) -> int | None: ...
+
+    def close(self) -> None: ...
+
+
+# SLIP special characters
+SLIP_END = 0xC0
+SLIP_ESC = 0xDB
+SLIP_ESC_END = 0xDC
+SLIP_ESC_ESC = 0xDD
+
+
+class FrameEncoder(object):
+    """Encodes `cnfLine` messages into reusable buffers.
+
+    The message header, line data, CRC and SLIP framing are written into
+    buffers that are allocated once, instead of building a new message
+    byte by byte for every line. The returned frame is a view into the
+    buffer and is only valid until the next call.
+    """
+
+    def __init__(self, max_line_length: int = 32):
+        self.__max_line_length = max_line_length
+        self.__message = bytearray(4 + max_line_length + 1)
+        self.__message_view = memoryview(self.__message)
+        self.__frame = bytearray(2 * len(self.__message) + 2)
+        self.__frame_view = memoryview(self.__frame)
+
+    def cnf_line(
+        self, line_number: int, color: int, flags: int, line_data: bytes
+    ) -> memoryview:
+        """Return the SLIP frame of a `cnfLine` message."""
+        if len(line_data) > self.__max_line_length:
+            raise ValueError("Line data too long")
+        # else
+        message = self.__message
+        end = 4 + len(line_data)
+        message[0] = Token.cnfLine.value
+        message[1] = line_number
+        message[2] = color
+        message[3] = flags
+        message[4:end] = line_data
+        message[end] = add_crc(0, self.__message_view[:end])
+        return self.__slip(end + 1)
+
+    def __slip(self, length: int) -> memoryview:
+        message = self.__message
+        frame = self.__frame
+        frame[0] = SLIP_END
+        if message.find(SLIP_END, 0, length) < 0 and (
+            message.find(SLIP_ESC, 0, length) < 0
+        ):
+            # nothing to escape
+            frame[1 : length + 1] = self.__message_view[:length]
+            pos = length + 1
+        else:
+            pos = 1
+            for byte in self.__message_view[:length]:
+                if byte == SLIP_END:
+                    frame[pos] = SLIP_ESC
+                    frame[pos + 1] = SLIP_ESC_END
+                    pos += 2
+                elif byte == SLIP_ESC:
+                    frame[pos] = SLIP_ESC
+                    frame[pos + 1] = SLIP_ESC_ESC
+                    pos += 2
+                else:
+                    frame[pos] = byte
+                    pos += 1
+        frame[pos] = SLIP_END
+        return self.__frame_view[: pos + 1]
 
 
 class Communication(object):
-    """Class Handling the serial communication protocol."""
+    """Class Handling the serial communication protocol.
 
-    def __init__(self, serial: Optional[serial.Serial | WebsocketSerial] = None):
+    In reader thread mode, a background thread drains the serial port
+    continuously and queues the decoded packets, and `read_API6` waits on
+    the queue instead of polling the port.
+    """
+
+    READ_TIMEOUT = 0.1
+
+    def __init__(
+        self,
+        serial: Optional[Transport] = None,
+        reader_thread: bool = False,
+        recorder: Optional[CaptureRecorder] = None,
+        clock: Clock = SYSTEM_CLOCK,
+    ):
         """Create an AyabCommunication object,
         with an optional serial communication object."""
         logging.basicConfig(level=logging.DEBUG)
         self.logger = logging.getLogger(type(self).__name__)
         self.__ser = serial
+        self.recorder = recorder
+        self.clock = clock
         self.__driver = sliplib.Driver()
-        self.rx_msg_list: list[bytes] = list()
+        self.__encoder = FrameEncoder()
+        self.rx_msg_list: deque[bytes] = deque()
+        self.__rx_times: deque[float] = deque()
+        self.rx_time = 0.0
+        self.read_timeout = self.READ_TIMEOUT
+        self.__listener: Optional[Callable[[], None]] = None
+        self.__reader_thread = reader_thread
+        self.__reader: Optional[threading.Thread] = None
+        self.__reader_stop = threading.Event()
+        self.__reader_error: Optional[Exception] = None
+        self.__rx_ready = threading.Condition()
+        if self.__ser is not None and self.__reader_thread:
+            self.start_reader()
 
     def __del__(self) -> None:
         """Handle behaviour on deletion by closing the serial port connection."""
@@ -89,6 +177,40 @@ class Communication(object):
         else:
             return False
 
+    @property
+    def reconnects(self) -> int:
+        """
+        Number of times that the transport has reestablished a dropped
+        connection, which may have lost data in either direction.
+        """
+        return int(getattr(self.__ser, "reconnects", 0))
+
+    def can_upload_job(self) -> bool:
+        """Whether the transport leads to a bridge that may run jobs."""
+        return hasattr(self.__ser, "request")
+
+    def upload_job(self, job: EdgeJob) -> bool:
+        """
+        Hand the job over to the bridge, so that it answers the line
+        requests of the device itself. Return whether it accepted the job.
+        """
+        request = getattr(self.__ser, "request", None)
+        if request is None:
+            return False
+        # else
+        reply = request(job.message(), EDGE_TIMEOUT)
+        if reply is None:
+            self.logger.info("The bridge does not run jobs")
+            return False
+        # else
+        if not reply.get("accepted"):
+            self.logger.warning(
+                "The bridge refused the job: " + str(reply.get("error"))
+            )
+            return False
+        # else
+        return True
+
     def open_serial(self, portname: Optional[str] = None) -> bool:
         """Open serial port communication."""
         if not self.__ser:
@@ -100,6 +222,8 @@ class Communication(object):
                     self.__ser = serial.Serial(
                         self.__portname, 115200, timeout=0.1, exclusive=True
                     )
+                if self.__reader_thread:
+                    self.start_reader()
                 return True
             except Exception:
                 self.logger.exception(f"Could not open serial port {self.__portname}")
@@ -107,6 +231,7 @@ class Communication(object):
 
     def close_serial(self) -> None:
         """Close the serial port."""
+        self.stop_reader()
         if self.__ser is not None and self.__ser.is_open is True:
             try:
                 self.__ser.close()
@@ -125,14 +250,14 @@ class Communication(object):
         if self.__ser is None:
             return
         data = self.__driver.send(bytes([Token.reqInfo.value]))
-        self.__ser.write(data)
+        self.__write(data)
 
     def req_test_API6(self) -> None:
         """Send a request for testing to the device."""
         if self.__ser is None:
             return
         data = self.__driver.send(bytes([Token.reqTest.value]))
-        self.__ser.write(data)
+        self.__write(data)
 
     def req_start_API6(
         self,
@@ -153,7 +278,7 @@ class Communication(object):
         hash = add_crc(hash, data)
         data.append(hash)
         data = self.__driver.send(bytes(data))
-        self.__ser.write(data)
+        self.__write(data)
 
     def req_init_API6(self, machine: Machine) -> None:
         """Send a start message to the device."""
@@ -166,7 +291,7 @@ class Communication(object):
         hash = add_crc(hash, data)
         data.append(hash)
         data = self.__driver.send(bytes(data))
-        self.__ser.write(data)
+        self.__write(data)
 
     def cnf_line_API6(
         self, line_number: int, color: int, flags: int, line_data: bytes
@@ -187,34 +312,110 @@ class Communication(object):
         """
         if self.__ser is None:
             return
-        data = bytearray()
-        data.append(Token.cnfLine.value)
-        data.append(line_number)
-        data.append(color)
-        data.append(flags)
-        data.extend(line_data)
-        hash = 0
-        hash = add_crc(hash, data)
-        data.append(hash)
-        data = self.__driver.send(bytes(data))
-        self.__ser.write(data)
+        frame = self.__encoder.cnf_line(line_number, color, flags, line_data)
+        self.__write(frame)
 
-    def update_API6(self) -> tuple[bytes | None, Token, int]:
+    def update_API6(self) -> Optional[Message]:
         """Read data from serial and parse as SLIP packet."""
         return self.parse_API6(self.read_API6())
 
-    def parse_API6(self, msg: Optional[bytes]) -> tuple[bytes | None, Token, int]:
+    def parse_API6(self, msg: Optional[bytes]) -> Optional[Message]:
+        """Decode a SLIP packet into a message record."""
         if msg is None:
-            return None, Token.none, 0
+            return None
+        # else
+        record = decode_message(msg)
+        if type(record) is Unknown:
+            self.logger.debug("unknown message: " + msg.hex(" "))
+        return record
+
+    def start_reader(self) -> None:
+        """Start the thread that reads from the serial port."""
+        if self.__reader is not None:
+            return
         # else
-        for t in list(Token):
-            if msg[0] == t.value:
-                return msg, t, msg[1]
-        # fallthrough
-        self.logger.debug("unknown message: ")  # drop crlf
-        pp = pprint.PrettyPrinter(indent=4)
-        pp.pprint(msg[1:-1].decode())
-        return msg, Token.unknown, 0
+        self.__reader_stop.clear()
+        self.__reader_error = None
+        self.__reader = threading.Thread(
+            target=self.__run_reader, name="AyabSerialReader", daemon=True
+        )
+        self.__reader.start()
+
+    def stop_reader(self) -> None:
+        """Stop the reader thread."""
+        if self.__reader is None:
+            return
+        # else
+        self.__reader_stop.set()
+        # interrupt a pending read rather than waiting for it to time out
+        cancel_read = getattr(self.__ser, "cancel_read", None)
+        if cancel_read is not None:
+            cancel_read()
+        if self.__reader is not threading.current_thread():
+            self.__reader.join()
+        self.__reader = None
+        with self.__rx_ready:
+            self.__rx_ready.notify_all()
+
+    def set_listener(self, listener: Optional[Callable[[], None]]) -> bool:
+        """
+        Set a function that the reader thread calls whenever it has queued
+        packets, or the transport has reconnected. While a listener is set,
+        `read_API6` does not wait for packets to arrive. Return `False` if
+        there is no reader thread to call the listener.
+        """
+        self.__listener = listener
+        self.read_timeout = self.READ_TIMEOUT if listener is None else 0
+        return self.__reader is not None
+
+    def __run_reader(self) -> None:
+        try:
+            reconnects = self.reconnects
+            while not self.__reader_stop.is_set():
+                messages = self.__receive()
+                if len(messages) > 0:
+                    with self.__rx_ready:
+                        self.__enqueue(messages)
+                        self.__rx_ready.notify_all()
+                if len(messages) > 0 or self.reconnects != reconnects:
+                    # after a reconnect, the controller resends what was lost
+                    reconnects = self.reconnects
+                    self.__notify_listener()
+        except Exception as e:
+            if not self.__reader_stop.is_set():
+                self.logger.exception("Reading from serial port failed")
+                self.__reader_error = e
+            with self.__rx_ready:
+                self.__rx_ready.notify_all()
+            self.__notify_listener()
+
+    def __notify_listener(self) -> None:
+        listener = self.__listener
+        if listener is not None:
+            listener()
+
+    def __receive(self) -> list[bytes]:
+        """Read data from serial, return the SLIP packets completed by it."""
+        if self.__ser is None:
+            return []
+        # else
+        # This will block until the timeout configured in the Serial constructor
+        # if no data is available (to avoid busy-waiting), but return as soon as
+        # a single byte is available to read.
+        data = self.__ser.read(1)
+
+        # More bytes may have become available simultaneously: grab them now.
+        if self.__ser.in_waiting > 0:
+            data = data + self.__ser.read(self.__ser.in_waiting)
+
+        if self.recorder is not None:
+            self.recorder.read(data)
+
+        # Send everything we received to the SLIP decoder.
+        messages: list[bytes] = []
+        if len(data) > 0:
+            messages = self.__driver.receive(data)
+        return messages
 
     def read_API6(self) -> Optional[bytes]:
         """Read data from serial, return the next SLIP packet"""
@@ -222,46 +423,80 @@ class Communication(object):
         if self.__ser is None:
             return None
 
+        if self.__reader is not None:
+            # Wait for the reader thread to queue a packet.
+            with self.__rx_ready:
+                self.__rx_ready.wait_for(
+                    lambda: len(self.rx_msg_list) > 0
+                    or self.__reader_error is not None,
+                    self.read_timeout,
+                )
+                if len(self.rx_msg_list) > 0:
+                    return self.__dequeue()
+            if self.__reader_error is not None:
+                raise self.__reader_error
+            # else
+            return None
+
         # If we already have messages pending from previous serial reads,
         # do not bother waiting on the serial port. The data will be safely
         # buffered by the OS until we have consumed the messages already
         # received.
         if len(self.rx_msg_list) == 0:
-            # This will block until the timeout configured in the Serial constructor
-            # if no data is available (to avoid busy-waiting), but return as soon as
-            # a single byte is available to read.
-            data = self.__ser.read(1)
-
-            # More bytes may have become available simultaneously: grab them now.
-            if self.__ser.in_waiting > 0:
-                data = data + self.__ser.read(self.__ser.in_waiting)
-
-            # Send everything we received to the SLIP decoder and enqueue any messages
-            # it extracted from the data so far.
-            if len(data) > 0:
-                self.rx_msg_list.extend(self.__driver.receive(data))
+            self.__enqueue(self.__receive())
 
         # Now, return the oldest message we have in the queue.
         if len(self.rx_msg_list) > 0:
-            return self.rx_msg_list.pop(0)  # FIFO
+            return self.__dequeue()
 
         return None
 
+    def __enqueue(self, messages: list[bytes]) -> None:
+        """Queue received messages together with their time of arrival."""
+        now = self.clock.time()
+        self.rx_msg_list.extend(messages)
+        self.__rx_times.extend(now for _msg in messages)
+
+    def __dequeue(self) -> bytes:
+        """Return the oldest message, and set `rx_time` to its arrival."""
+        if len(self.__rx_times) > 0:
+            self.rx_time = self.__rx_times.popleft()
+        else:
+            self.rx_time = self.clock.time()
+        return self.rx_msg_list.popleft()  # FIFO
+
+    def __write(self, data: bytes | memoryview) -> None:
+        assert self.__ser is not None
+        if self.recorder is not None:
+            self.recorder.write(bytes(data))
+        self.__ser.write(data)
+
     def write_API6(self, msg: bytes | bytearray) -> None:
         if self.__ser is None:
             return
         data = self.__driver.send(bytes(msg))
-        self.__ser.write(data)
+        self.__write(data)
 
 
 # CRC algorithm after Maxim/Dallas
-def add_crc(crc: int, data: bytearray) -> int:
-    for i in range(len(data)):
-        n = data[i]
+def _crc_table() -> bytes:
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
         for _j in range(8):
-            f = (crc ^ n) & 1
+            f = crc & 1
             crc >>= 1
             if f:
                 crc ^= 0x8C
-            n >>= 1
-    return crc & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+CRC_TABLE = _crc_table()
+
+
+def add_crc(crc: int, data: bytes | bytearray | memoryview) -> int:
+    crc &= 0xFF
+    for n in data:
+        crc = CRC_TABLE[crc ^ n]
+    return crc
@@ -21,19 +21,21 @@ Mock Class of Communication for Test/Simulation purposes
 """
 
 import logging
-from time import sleep
+from typing import Optional
 
+from .clock import SYSTEM_CLOCK, Clock
 from .communication import Communication, Token
 
 
 class CommunicationMock(Communication):
     """Class Handling the mock communication protocol."""
 
-    def __init__(self, delay=True) -> None:
+    def __init__(self, delay=True, clock: Clock = SYSTEM_CLOCK) -> None:
         """Initialize communication."""
         logging.basicConfig(level=logging.DEBUG)
         self.logger = logging.getLogger(type(self).__name__)
         self.__delay = delay
+        self.__clock = clock
         self.reset()
 
     def __del__(self) -> None:
@@ -44,6 +46,7 @@ class CommunicationMock(Communication):
         self.__is_open = False
         self.__is_started = False
         self.rx_msg_list = list()
+        self.rx_time = 0.0
         self.__line_count = 0
         self.__started_row = False
 
@@ -51,6 +54,15 @@ class CommunicationMock(Communication):
         """Return status of the interface."""
         return self.__is_open
 
+    @property
+    def reconnects(self) -> int:
+        """The mock connection never drops."""
+        return 0
+
+    def can_upload_job(self) -> bool:
+        """The mock device is not behind a bridge."""
+        return False
+
     def close_serial(self) -> None:
         """Close communication."""
         self.reset()
@@ -106,8 +118,12 @@ class CommunicationMock(Communication):
         """Send a row of stitch data."""
         return True
 
-    def update_API6(self) -> tuple[bytes | None, Token, int]:
-        """Read and parse data packet."""
+    def set_listener(self, listener) -> bool:
+        """Packets are generated on demand, there is nothing to listen to."""
+        return False
+
+    def read_API6(self) -> Optional[bytes]:
+        """Return the next data packet."""
         if self.__is_open and self.__is_started:
             # Alternate between reqLine and no message
             # (so that the UI makes the end-of-line sound for each row)
@@ -118,10 +134,11 @@ class CommunicationMock(Communication):
                 self.__line_count %= 256
                 self.rx_msg_list.append(reqLine)
                 if self.__delay:
-                    sleep(1)  # wait for knitting progress dialog to update
+                    self.__clock.sleep(1)  # wait for knitting progress dialog to update
             else:
                 self.__started_row = True
         if len(self.rx_msg_list) > 0:
-            return self.parse_API6(self.rx_msg_list.pop(0))  # FIFO
+            self.rx_time = self.__clock.time()
+            return self.rx_msg_list.pop(0)  # FIFO
         # else
-        return self.parse_API6(None)
+        return None
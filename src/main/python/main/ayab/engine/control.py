@@ -19,50 +19,87 @@
 #    https://github.com/AllYarnsAreBeautiful/ayab-desktop
 
 from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
 import logging
 from bitarray import bitarray
 
 from ..signal_sender import SignalSender
-from .communication import Communication, Token
+from .clock import SYSTEM_CLOCK, Clock
+from .communication import Communication, Transport
 from .communication_mock import CommunicationMock
-from .options import OptionsTab
+from .edge import EdgeJob
 from .mode import Mode, ModeFunc
-from typing import TYPE_CHECKING, Callable
+from typing import TYPE_CHECKING, Callable, Optional, Protocol
 
 if TYPE_CHECKING:
-    from .mode import ModeFuncType
-    from .engine import Engine
-    from ..ayab import GuiMain
+    from .capture import CaptureRecorder
+    from .knit_options import KnitOptions, KnitPreferences
+    from .options import OptionsTab
+    from ..signal_receiver import SignalReceiver
+    from ..preferences import Preferences
 from .engine_fsm import State, Operation, StateMachine
+from .latency import LineTiming
+from .line_table import LineTable
+from .messages import CnfInfo, IndState, Message, TestRes
+from .schedule import KnitSchedule
 from .output import Output
-from .status import Carriage, Direction, StatusTab
+from .status import Carriage, Direction, Status
 from .pattern import Pattern
-from ..preferences import Preferences
+
+
+class ControlParent(Protocol):
+    """What `Control` needs from the main window, or what stands in for it."""
+
+    @property
+    def signal_receiver(self) -> Optional[SignalReceiver]: ...
+
+
+class ControlEngine(Protocol):
+    """What `Control` needs from the engine, or what stands in for it."""
+
+    @property
+    def status(self) -> Status: ...
 
 
 class Control(SignalSender):
     """
     Class governing information flow with the shield.
+
+    If the transport reconnects during an operation, the knitting progress
+    (`line_block`, `former_request`) is kept and the last `cnfLine` frame
+    is sent again, since the device may not have received it.
+
+    If the transport leads to a bridge that runs jobs, the compiled job is
+    uploaded before knitting starts (`edge`). The bridge then answers the
+    line requests itself, and the requests only update the status here.
+
+    With a `recorder`, the bytes exchanged with the device are written to
+    a capture file that `ReplaySerial` can play back.
     """
 
     BLOCK_LENGTH = 256
+    PREFETCH_LINES = 8
     COLOR_SYMBOLS = "A", "B", "C", "D", "E", "F"
     FIRST_SUPPORTED_API_VERSION = 6  # currently this is the only supported version
     FLANKING_NEEDLES = True
 
+    clock: Clock
     com: Communication | CommunicationMock
     continuous_reporting: bool
+    edge: bool
     end_needle: int
     end_pixel: int
     former_request: int
     inf_repeat: bool
+    last_retry: tuple[Optional[Callable[..., None]], float]
     initial_carriage: Carriage
     initial_direction: Direction
     initial_position: int
     len_pat_expanded: int
     line_block: int
+    line_table: LineTable
+    timing: LineTiming
     mode: Mode
-    mode_func: ModeFuncType
     num_colors: int
     passes_per_row: int
     pat_height: int
@@ -70,22 +107,40 @@ class Control(SignalSender):
     pattern: Pattern
     pattern_repeats: int
     portname: str
-    prefs: Preferences
+    prefs: Preferences | KnitPreferences
+    recorder: Optional[CaptureRecorder]
+    schedule: KnitSchedule
     start_needle: int
     start_pixel: int
     start_row: int
     state: State
+    transport: Optional[Transport]
     logger: logging.Logger
 
-    def __init__(self, parent: GuiMain, engine: Engine):
+    def __init__(
+        self,
+        parent: ControlParent,
+        engine: ControlEngine,
+        clock: Clock = SYSTEM_CLOCK,
+        transport: Optional[Transport] = None,
+        recorder: Optional[CaptureRecorder] = None,
+    ):
         super().__init__(parent.signal_receiver)
         self.logger = logging.getLogger(type(self).__name__)
-        self.status: StatusTab = engine.status
+        self.status: Status = engine.status
+        self.clock = clock
+        self.transport = transport
+        self.recorder = recorder
         self.notification = Output.NONE
         self.api_version: int = self.FIRST_SUPPORTED_API_VERSION
+        self.__prefetcher: Optional[ThreadPoolExecutor] = None
+        self.__prefetch_future: Optional[Future[None]] = None
+        self.__last_line: Optional[tuple[int, int, int, bytes]] = None
+        self.__reconnects = 0
+        self.edge = False
 
     def start(
-        self, pattern: Pattern, options: OptionsTab, operation: Operation
+        self, pattern: Pattern, options: OptionsTab | KnitOptions, operation: Operation
     ) -> None:
         self.machine = options.machine
         if operation == Operation.KNIT:
@@ -109,14 +164,24 @@ class Control(SignalSender):
             )
             self.start_pixel = self.start_needle - self.pattern.pat_start_needle
             self.end_pixel = self.end_needle - self.pattern.pat_start_needle
+            self.line_table = LineTable(self.select_needles_API6)
+            self.timing = LineTiming()
+            self.__prefetch_future = None
+            self.__last_line = None
+            self.edge = False
             self.initial_carriage = Carriage.Unknown
             self.initial_position = -1
             self.initial_direction = Direction.Unknown
             self.reset_status()
         self.portname = options.portname
+        self.last_retry = None, 0.0
+        self.__reconnects = 0
         self.state = State.CONNECT
 
     def stop(self) -> None:
+        if self.__prefetcher is not None:
+            self.__prefetcher.shutdown(wait=False, cancel_futures=True)
+            self.__prefetcher = None
         try:
             self.com.close_serial()
         except Exception:
@@ -125,7 +190,8 @@ class Control(SignalSender):
     def func_selector(self) -> bool:
         """
         Method selecting the function that decides which line of data to send
-        according to the knitting mode and number of colors.
+        according to the knitting mode and number of colors, and compiling
+        the knit schedule from it.
 
         @author Tom Price
         @date   June 2020
@@ -139,7 +205,10 @@ class Control(SignalSender):
             self.logger.error("Unrecognized value returned from Mode.knit_func()")
             return False
         # else
-        self.mode_func: ModeFuncType = getattr(ModeFunc, func_name)
+        self.schedule = KnitSchedule(
+            self.mode, self.num_colors, self.start_row, self.pat_height, self.inf_repeat
+        )
+        self.__prefetch(0)
         return True
 
     def reset_status(self) -> None:
@@ -160,29 +229,56 @@ class Control(SignalSender):
 
         self.status.passes_per_row = self.passes_per_row
 
-    def check_serial_API6(self) -> tuple[Token, int]:
-        msg, token, param = self.com.update_API6()
-        if msg is None:
-            return Token.none, param  # TODO: Do We Throw Here?
-        if token == Token.cnfInfo:
+    def check_serial_API6(self) -> Optional[Message]:
+        reconnects = self.com.reconnects
+        if reconnects != self.__reconnects:
+            self.__reconnects = reconnects
+            self.__resume()
+        msg = self.com.update_API6()
+        if isinstance(msg, CnfInfo):
             self.__log_cnfInfo(msg)
-        elif token == Token.indState:
-            self.status.parse_device_state_API6(param, msg)
-        elif token == Token.testRes:
-            if len(msg) > 0:
-                self.emit_hw_test_writer(msg[1:].decode())
-        return token, param
-
-    def __log_cnfInfo(self, msg: bytes) -> None:
-        api = msg[1]
-        log = "API v" + str(api)
-        if api >= 5:
-            log += ", FW v" + str(msg[2]) + "." + str(msg[3]) + "." + str(msg[4])
-            suffix = msg[5:21]
-            suffix_null_index = suffix.find(0)
-            suffix_str = suffix[: suffix_null_index + 1].decode()
-            if len(suffix_str) > 1:
-                log += "-" + suffix_str
+        elif isinstance(msg, IndState):
+            self.status.parse_device_state_API6(msg)
+        elif isinstance(msg, TestRes):
+            self.emit_hw_test_writer(msg.text)
+        return msg
+
+    def __resume(self) -> None:
+        """Resend what the device may have missed while disconnected."""
+        self.logger.warning("Connection reestablished in state " + self.state.name)
+        # requests sent with `StateMachine.retry` are repeated at once
+        self.last_retry = None, 0.0
+        if (
+            not self.edge
+            and self.__last_line is not None
+            and self.state
+            in (
+                State.RUN_KNIT,
+                State.FINISHING,
+                State.DISCONNECT,
+            )
+        ):
+            line_number = self.__last_line[0]
+            self.logger.info("Sending line " + str(line_number) + " again")
+            self.com.cnf_line_API6(*self.__last_line)
+        if self.state == State.DISCONNECT:
+            self.com.req_info()
+
+    def start_edge(self) -> None:
+        """Upload the compiled job, if the transport leads to a bridge."""
+        self.edge = False
+        if not self.com.can_upload_job():
+            return
+        # else
+        job = EdgeJob.compile(self.schedule, self.line_table)
+        self.edge = self.com.upload_job(job)
+        if self.edge:
+            self.logger.info("The bridge answers " + str(len(job)) + " lines")
+
+    def __log_cnfInfo(self, msg: CnfInfo) -> None:
+        log = "API v" + str(msg.api_version)
+        if msg.api_version >= 5:
+            log += ", FW v" + msg.firmware_version
         self.logger.info(log)
 
     def cnf_line_API6(self, line_number: int) -> bool:
@@ -211,33 +307,42 @@ class Control(SignalSender):
         line_number += self.BLOCK_LENGTH * self.line_block
 
         # get data for next line of knitting
-        color, row_index, blank_line, last_line = self.mode_func(self, line_number)
-        bits = self.select_needles_API6(color, row_index, blank_line)
+        # (usually compiled in advance by the prefetcher)
+        color, row_index, blank_line, last_line = self.schedule.line(line_number)
+        payload, bits = self.line_table.get(color, row_index, blank_line)
 
         # Send line to machine
         # Note that we never set the "final line" flag here, because
         # we will send an extra blank line afterwards to make sure we
         # can track the final line being knitted.
         flags = 0
-        self.com.cnf_line_API6(requested_line, color, flags, bits.tobytes())
+        if not self.edge:
+            self.com.cnf_line_API6(requested_line, color, flags, payload)
+            self.__last_line = requested_line, color, flags, payload
+            self.timing.record(self.com.rx_time, self.clock.time())
+
+        # everything below is off the critical path
+        self.pat_row = self.schedule.row(line_number)
+        self.__prefetch(line_number + 1)
 
         # screen output
         # TODO: tidy up this code
-        msg = (
-            str(self.line_block)
-            + " "
-            + str(line_number)
-            + " reqLine: "
-            + str(requested_line)
-            + " pat_row: "
-            + str(self.pat_row)
-        )
-        if blank_line:
-            msg += " BLANK LINE"
-        else:
-            msg += " row_index: " + str(row_index)
-            msg += " color: " + str(self.COLOR_SYMBOLS[color])
-        self.logger.debug(msg)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            msg = (
+                str(self.line_block)
+                + " "
+                + str(line_number)
+                + " reqLine: "
+                + str(requested_line)
+                + " pat_row: "
+                + str(self.pat_row)
+            )
+            if blank_line:
+                msg += " BLANK LINE"
+            else:
+                msg += " row_index: " + str(row_index)
+                msg += " color: " + str(self.COLOR_SYMBOLS[color])
+            self.logger.debug(msg)
 
         # get status to send to GUI
         self.__update_status(line_number, color, bits)
@@ -250,6 +355,27 @@ class Control(SignalSender):
         else:
             return True  # pattern finished
 
+    def __prefetch(self, line_number: int) -> None:
+        """
+        Compile the next `PREFETCH_LINES` lines from `line_number` on a worker
+        thread, so that they are ready when the device requests them.
+        """
+        if self.__prefetch_future is not None and not self.__prefetch_future.done():
+            return  # still busy with the previous lines
+        # else
+        end = line_number + self.PREFETCH_LINES
+        if not self.inf_repeat:
+            end = min(end, len(self.schedule))
+        if end <= line_number:
+            return
+        # else
+        if self.__prefetcher is None:
+            self.__prefetcher = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="AyabPrefetch"
+            )
+        keys = [self.schedule.line(n)[0:3] for n in range(line_number, end)]
+        self.__prefetch_future = self.__prefetcher.submit(self.line_table.compile, keys)
+
     def cnf_final_line_API6(self, requested_line: int) -> None:
         self.logger.debug("sending blank line as final line=%d", requested_line)
 
@@ -259,7 +385,10 @@ class Control(SignalSender):
         # send line to machine
         color = 0  # doesn't matter
         flags = 1  # this is the last line
-        self.com.cnf_line_API6(requested_line, color, flags, bits.tobytes())
+        payload = bits.tobytes()
+        if not self.edge:
+            self.com.cnf_line_API6(requested_line, color, flags, payload)
+            self.__last_line = requested_line, color, flags, payload
 
     def __update_status(self, line_number: int, color: int, bits: bitarray) -> None:
         self.status.total_rows = self.pat_height
@@ -297,9 +426,9 @@ class Control(SignalSender):
             bits[self.end_needle : self.machine.width] = True
 
         if not blank_line:
-            bits[self.start_needle : self.end_needle] = (self.pattern.pattern_expanded)[
+            bits[self.start_needle : self.end_needle] = self.pattern.expanded_row(
                 row_index
-            ][self.start_pixel : self.end_pixel]
+            )[self.start_pixel : self.end_pixel]
 
         return bits
 
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+"""
+Edge execution of knitting jobs.
+
+A websocket bridge next to the machine can answer the `reqLine` requests
+of the device itself, without a round trip over the network for every
+line. For that, the compiled job is uploaded to it before knitting starts.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .line_table import LineTable
+    from .schedule import KnitSchedule
+
+# seconds to wait for the bridge to accept a job
+EDGE_TIMEOUT = 1.0
+
+
+class EdgeJob(object):
+    """
+    The lines of a knitting job in the order that the device requests
+    them: the color and the needle payload of each line. Without infinite
+    repeat, the lines end with the last line of the pattern, and the bridge
+    sends a blank final line after them.
+    """
+
+    def __init__(self, lines: list[tuple[int, bytes]], repeat: bool):
+        self.lines = lines
+        self.repeat = repeat
+
+    @classmethod
+    def compile(cls, schedule: KnitSchedule, line_table: LineTable) -> EdgeJob:
+        lines = []
+        # identical lines share one buffer, even after the line table
+        # has dropped them
+        payloads: dict[bytes, bytes] = {}
+        for line_number in range(len(schedule)):
+            color, row_index, blank_line, last_line = schedule.line(line_number)
+            payload, _bits = line_table.get(color, row_index, blank_line)
+            lines.append((color, payloads.setdefault(payload, payload)))
+            if last_line and not schedule.inf_repeat:
+                break
+        return cls(lines, schedule.inf_repeat)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def message(self) -> dict[str, Any]:
+        """The job as a JSON message, with every distinct payload once."""
+        payloads: dict[bytes, int] = {}
+        lines = []
+        for color, payload in self.lines:
+            index = payloads.setdefault(payload, len(payloads))
+            lines.append([color, index])
+        return {
+            "type": "job",
+            "repeat": self.repeat,
+            "payloads": [payload.hex() for payload in payloads],
+            "lines": lines,
+        }
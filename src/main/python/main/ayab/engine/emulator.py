@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Emulator of the AYAB firmware, API v6.
+
+`FirmwareEmulator` implements the device side of the serial protocol,
+including SLIP framing, CRC checks, the hardware test commands and the
+timing of the carriage. It is driven with the bytes written by the host
+and the current time, so it can run on any transport and any clock.
+`pty_emulator` serves it on a pseudo-terminal, on POSIX systems.
+"""
+
+from __future__ import annotations
+
+from enum import Enum
+import heapq
+import logging
+import struct
+from typing import Callable, Optional
+
+import sliplib
+
+from .communication import add_crc
+from .messages import Token
+
+
+class OpState(Enum):
+    WAIT_FOR_MACHINE = 0
+    INIT = 1
+    READY = 2
+    KNIT = 3
+    TEST = 4
+
+
+class ErrorCode(Enum):
+    SUCCESS = 0x00
+    EXPECTED_LONGER_MESSAGE = 0x01
+    UNRECOGNIZED_MESSAGE = 0x02
+    UNEXPECTED_MESSAGE = 0x03
+    CHECKSUM_ERROR = 0x04
+    MACHINE_TYPE_INVALID = 0x10
+    NEEDLE_VALUE_INVALID = 0x11
+    WRONG_MACHINE_STATE = 0x21
+
+
+class FirmwareEmulator(object):
+    """
+    Device side of the API v6 protocol.
+
+    The carriage moves at `speed` needles per second. After each pass it
+    requests the next line and turns around, which takes `TURN_NEEDLES`
+    needles; a `cnfLine` arriving after that is counted in `late_lines`
+    and holds up the carriage. The lines received are kept in `lines`.
+    """
+
+    API_VERSION = 6
+    FIRMWARE_VERSION = 1, 0, 0
+    FIRMWARE_SUFFIX = b"emulator"
+    WIDTHS = 200, 200, 112  # by machine type
+    TURN_NEEDLES = 24
+    TEST_INTERVAL = 0.5
+    DEFAULT_SPEED = 400.0
+
+    def __init__(
+        self,
+        speed: float = DEFAULT_SPEED,
+        write: Optional[Callable[[bytes], None]] = None,
+    ):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.speed = speed
+        self.write = write
+        self.__driver = sliplib.Driver()
+        self.__events: list[tuple[float, int, Callable[[float], None]]] = []
+        self.__sequence = 0
+        self.state = OpState.WAIT_FOR_MACHINE
+        self.width = 0
+        self.start_needle = 0
+        self.stop_needle = 0
+        self.continuous_reporting = False
+        self.position = 0
+        self.direction = 0
+        self.lines: list[tuple[int, int, int, bytes]] = []
+        self.late_lines = 0
+        self.crc_errors = 0
+        self.test_output: list[str] = []
+        self.__requested_line: Optional[int] = None
+        self.__deadline = 0.0
+        self.__line_number = 0
+        self.__auto_read = False
+        self.__auto_test = False
+        self.__solenoids = 0
+
+    # I/O
+
+    def feed(self, data: bytes, now: float) -> None:
+        """Process bytes written by the host."""
+        self.advance(now)
+        for msg in self.__driver.receive(data):
+            if len(msg) > 0:
+                self.__receive(msg, now)
+
+    def advance(self, now: float) -> Optional[float]:
+        """Run the events that are due, return the time of the next one."""
+        while len(self.__events) > 0 and self.__events[0][0] <= now:
+            due, _sequence, event = heapq.heappop(self.__events)
+            event(due)
+        if len(self.__events) > 0:
+            return self.__events[0][0]
+        # else
+        return None
+
+    def __send(self, msg: bytes) -> None:
+        if self.write is not None:
+            self.write(sliplib.encode(msg))
+
+    def __schedule(self, due: float, event: Callable[[float], None]) -> None:
+        self.__sequence += 1
+        heapq.heappush(self.__events, (due, self.__sequence, event))
+
+    def __cancel_events(self) -> None:
+        self.__events = []
+
+    # messages
+
+    def __receive(self, msg: bytes, now: float) -> None:
+        token = msg[0]
+        handler = self.__handlers.get(token)
+        if handler is None:
+            self.logger.warning(f"Unrecognized message: {msg.hex(' ')}")
+            return
+        # else
+        handler(self, msg, now)
+
+    def __check_crc(self, msg: bytes, length: int) -> bool:
+        if len(msg) < length:
+            return False
+        # else
+        if add_crc(0, msg[:-1]) != msg[-1]:
+            self.crc_errors += 1
+            self.logger.warning(f"Checksum error: {msg.hex(' ')}")
+            return False
+        # else
+        return True
+
+    def _req_info(self, msg: bytes, now: float) -> None:
+        major, minor, patch = self.FIRMWARE_VERSION
+        suffix = self.FIRMWARE_SUFFIX.ljust(16, b"\0")
+        self.__send(
+            bytes([Token.cnfInfo.value, self.API_VERSION, major, minor, patch]) + suffix
+        )
+
+    def _req_init(self, msg: bytes, now: float) -> None:
+        error = ErrorCode.SUCCESS
+        if not self.__check_crc(msg, 3):
+            error = ErrorCode.CHECKSUM_ERROR
+        elif msg[1] >= len(self.WIDTHS):
+            error = ErrorCode.MACHINE_TYPE_INVALID
+        elif self.state not in (OpState.WAIT_FOR_MACHINE, OpState.READY):
+            error = ErrorCode.WRONG_MACHINE_STATE
+        self.__send(bytes([Token.cnfInit.value, error.value]))
+        if error != ErrorCode.SUCCESS:
+            return
+        # else
+        self.width = self.WIDTHS[msg[1]]
+        # the carriage passes a Hall sensor and the machine is ready
+        self.position = 0
+        self.direction = 1
+        self.state = OpState.READY
+        self.__ind_state()
+
+    def _req_start(self, msg: bytes, now: float) -> None:
+        error = ErrorCode.SUCCESS
+        if not self.__check_crc(msg, 5):
+            error = ErrorCode.CHECKSUM_ERROR
+        elif self.state != OpState.READY:
+            error = ErrorCode.WRONG_MACHINE_STATE
+        elif not (msg[1] <= msg[2] < self.width):
+            error = ErrorCode.NEEDLE_VALUE_INVALID
+        self.__send(bytes([Token.cnfStart.value, error.value]))
+        if error != ErrorCode.SUCCESS:
+            return
+        # else
+        self.start_needle = msg[1]
+        self.stop_needle = msg[2]
+        self.continuous_reporting = bool(msg[3] & 1)
+        self.state = OpState.KNIT
+        self.__line_number = 0
+        self.__request_line(now)
+
+    def _cnf_line(self, msg: bytes, now: float) -> None:
+        if self.state != OpState.KNIT or self.__requested_line is None:
+            self.logger.warning("Unexpected cnfLine")
+            return
+        # else
+        if not self.__check_crc(msg, 6):
+            # ask again
+            self.__send(bytes([Token.reqLine.value, self.__requested_line]))
+            return
+        # else
+        line_number, color, flags = msg[1], msg[2], msg[3]
+        if line_number != self.__requested_line:
+            self.logger.warning(
+                f"cnfLine {line_number} does not match reqLine {self.__requested_line}"
+            )
+            return
+        # else
+        self.__requested_line = None
+        self.lines.append((line_number, color, flags, bytes(msg[4:-1])))
+        start = now
+        if now > self.__deadline:
+            self.late_lines += 1
+        else:
+            start = self.__deadline
+        if flags & 1:
+            # final line
+            self.__schedule(start + self.__pass_time(), self.__finish)
+        else:
+            self.__schedule(start + self.__pass_time(), self.__end_pass)
+
+    def _req_test(self, msg: bytes, now: float) -> None:
+        error = ErrorCode.SUCCESS
+        if self.state not in (OpState.WAIT_FOR_MACHINE, OpState.READY):
+            error = ErrorCode.WRONG_MACHINE_STATE
+        self.__send(bytes([Token.cnfTest.value, error.value]))
+        if error != ErrorCode.SUCCESS:
+            return
+        # else
+        self.state = OpState.TEST
+        self.__auto_read = False
+        self.__auto_test = False
+        self.__test_result("AYAB Hardware Test v1.0 API v6\n\n")
+        self.__help()
+        self.__schedule(now + self.TEST_INTERVAL, self.__test_timer)
+
+    def _test_cmd(self, msg: bytes, now: float) -> None:
+        if self.state != OpState.TEST:
+            self.logger.warning("Test command outside of test mode")
+            return
+        # else
+        cmd = Token(msg[0]).name
+        self.__test_result("Called " + cmd[: -len("Cmd")] + "\n")
+        if msg[0] == Token.helpCmd.value:
+            self.__help()
+        elif msg[0] == Token.sendCmd.value:
+            self.__test_result("\x31\x32\x33\n")
+        elif msg[0] == Token.readEOLsensorsCmd.value:
+            self.__read_eol_sensors()
+            self.__test_result("\n")
+        elif msg[0] == Token.readEncodersCmd.value:
+            self.__read_encoders()
+            self.__test_result("\n")
+        elif msg[0] == Token.autoReadCmd.value:
+            self.__auto_read = True
+        elif msg[0] == Token.autoTestCmd.value:
+            self.__auto_test = True
+        elif msg[0] == Token.stopCmd.value:
+            self.__auto_read = False
+            self.__auto_test = False
+        elif msg[0] == Token.setSingleCmd.value:
+            if len(msg) < 3 or msg[1] > 15 or msg[2] > 1:
+                self.__test_result("Invalid argument\n")
+            elif msg[2]:
+                self.__solenoids |= 1 << msg[1]
+            else:
+                self.__solenoids &= ~(1 << msg[1])
+        elif msg[0] == Token.setAllCmd.value:
+            if len(msg) < 3:
+                self.__test_result("Invalid argument\n")
+            else:
+                self.__solenoids = (msg[1] << 8) + msg[2]
+        elif msg[0] == Token.quitCmd.value:
+            self.__cancel_events()
+            self.state = OpState.WAIT_FOR_MACHINE
+
+    __handlers: dict[int, Callable[[FirmwareEmulator, bytes, float], None]] = {
+        Token.reqInfo.value: _req_info,
+        Token.reqInit.value: _req_init,
+        Token.reqStart.value: _req_start,
+        Token.cnfLine.value: _cnf_line,
+        Token.reqTest.value: _req_test,
+        Token.helpCmd.value: _test_cmd,
+        Token.sendCmd.value: _test_cmd,
+        Token.beepCmd.value: _test_cmd,
+        Token.setSingleCmd.value: _test_cmd,
+        Token.setAllCmd.value: _test_cmd,
+        Token.readEOLsensorsCmd.value: _test_cmd,
+        Token.readEncodersCmd.value: _test_cmd,
+        Token.autoReadCmd.value: _test_cmd,
+        Token.autoTestCmd.value: _test_cmd,
+        Token.stopCmd.value: _test_cmd,
+        Token.quitCmd.value: _test_cmd,
+    }
+
+    # knitting
+
+    def __pass_time(self) -> float:
+        if self.speed <= 0:
+            return 0.0
+        # else
+        return (self.stop_needle - self.start_needle + 1) / self.speed
+
+    def __turn_time(self) -> float:
+        if self.speed <= 0:
+            return 0.0
+        # else
+        return self.TURN_NEEDLES / self.speed
+
+    def __request_line(self, now: float) -> None:
+        self.__requested_line = self.__line_number
+        self.__line_number = (self.__line_number + 1) % 256
+        self.__deadline = now + self.__turn_time()
+        self.__send(bytes([Token.reqLine.value, self.__requested_line]))
+
+    def __end_pass(self, now: float) -> None:
+        self.__move_carriage()
+        self.__request_line(now)
+
+    def __finish(self, now: float) -> None:
+        self.__move_carriage()
+        self.state = OpState.READY
+
+    def __move_carriage(self) -> None:
+        if self.direction == 1:
+            self.position = self.stop_needle
+            self.direction = 0
+        else:
+            self.position = self.start_needle
+            self.direction = 1
+        if self.continuous_reporting:
+            self.__ind_state()
+
+    def __ind_state(self) -> None:
+        self.__send(
+            bytes([Token.indState.value])
+            + struct.pack(
+                ">BBHHBBB",
+                ErrorCode.SUCCESS.value,
+                self.state.value,
+                0x200,
+                0x200,
+                0,  # knit carriage
+                min(self.position, 255),
+                self.direction,
+            )
+        )
+
+    # hardware test
+
+    def __test_result(self, text: str) -> None:
+        self.test_output.append(text)
+        self.__send(bytes([Token.testRes.value]) + text.encode())
+
+    def __help(self) -> None:
+        self.__test_result("The following commands are available:\n")
+        for cmd in (
+            "setSingle [0..15] [1/0]",
+            "setAll [0..FFFF]",
+            "readEOLsensors",
+            "readEncoders",
+            "beep",
+            "autoRead",
+            "autoTest",
+            "send",
+            "stop",
+            "quit",
+            "help",
+        ):
+            self.__test_result(cmd + "\n")
+
+    def __read_eol_sensors(self) -> None:
+        self.__test_result("  EOL_L: 512")
+        self.__test_result("  EOL_R: 512")
+
+    def __read_encoders(self) -> None:
+        self.__test_result("  ENC_A: LOW")
+        self.__test_result("  ENC_B: LOW")
+        self.__test_result("  ENC_C: LOW")
+
+    def __test_timer(self, now: float) -> None:
+        if self.state != OpState.TEST:
+            return
+        # else
+        if self.__auto_read:
+            self.__read_eol_sensors()
+            self.__read_encoders()
+            self.__test_result("\n")
+        if self.__auto_test:
+            self.__solenoids ^= 0xFFFF
+            self.__test_result("Set solenoids\n")
+        self.__schedule(now + self.TEST_INTERVAL, self.__test_timer)
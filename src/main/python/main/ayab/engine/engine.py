@@ -20,40 +20,46 @@
 
 from __future__ import annotations
 import logging
+import threading
 from PIL import Image
 
-from PySide6.QtCore import QCoreApplication, Signal, Slot
+from PySide6.QtCore import QCoreApplication, Qt, Signal, Slot
 from PySide6.QtWidgets import QDockWidget
-from wakepy import keep
 
 from .. import utils
 from ..machine import Machine
-from .engine_fsm import Operation, State
-from .pattern import Pattern
+from .engine_fsm import Operation
+from .pattern import Pattern, PatternCache
 from .options import OptionsTab
-from .status import Status, StatusTab
-from .output import FeedbackHandler
+from .status import Status
+from .status_tab import StatusTab
+from .output import FeedbackHandler, Output
+from .runner import Runner
 from .dock_gui import Ui_Dock
 from typing import TYPE_CHECKING, Literal, Optional, cast
 from ..signal_sender import SignalSender
 
 import ipaddress
+from zeroconf import ServiceInfo
 from .mdns_discovery import MdnsBrowser
+from .probe import DeviceInfo, DeviceProber
 
 if TYPE_CHECKING:
     from ..ayab import GuiMain
 from .control import Control
 
 
-class Engine(SignalSender, QDockWidget):
+class Engine(SignalSender, Runner, QDockWidget):
     """
     Top-level class for the slave thread that communicates with the shield.
 
-    Implemented as a subclass of `QDockWidget` and `SignalSender`.
+    Implemented as a subclass of `QDockWidget` and `SignalSender`, and runs
+    operations with the loop of `Runner`.
     """
 
     port_opener = Signal()
-    mdns_update_signal = Signal()
+    mdns_update_signal = Signal(str, object)
+    device_probe_signal = Signal(object)
 
     pattern: Pattern
     status: StatusTab
@@ -62,8 +68,13 @@ class Engine(SignalSender, QDockWidget):
         # set up UI
         super().__init__(parent.signal_receiver)
         self.mdns_browser = MdnsBrowser("_ayab._tcp.local.", self.mdns_update)
-        self.mdns_update_signal.connect(self.__populate_ports)
+        self.mdns_update_signal.connect(self.__update_websocket_port)
         self.mdns_browser.start()
+        self.__prober = DeviceProber()
+        self.__devices: dict[str, DeviceInfo] = {}
+        # the port of the running operation, which must not be probed
+        self.__port_in_use: Optional[str] = None
+        self.device_probe_signal.connect(self.__show_devices)
 
         self.ui = Ui_Dock()
         self.ui.setupUi(self)
@@ -75,16 +86,16 @@ class Engine(SignalSender, QDockWidget):
         parent.ui.dock_container_layout.addWidget(self)
 
         self.pattern: Pattern = None  # type:ignore
+        self.__pattern_cache = PatternCache()
         self.control = Control(parent, self)
         self.__feedback = FeedbackHandler(parent)
         self.__logger = logging.getLogger(type(self).__name__)
 
-    @Slot()
-    def mdns_update(self) -> None:
+    def mdns_update(self, name: str, info: Optional[ServiceInfo]) -> None:
         """
         This method can be called from a non-Qt thread
         """
-        self.mdns_update_signal.emit()
+        self.mdns_update_signal.emit(name, info)
 
     def setup_ui(self) -> None:
         # insert tabs
@@ -131,14 +142,99 @@ class Engine(SignalSender, QDockWidget):
         # Add websocket ports (collected by mDNS)
         for _key, value in self.mdns_browser.get_known_services().items():
             if value and value.server:
-                server_name = value.server.removesuffix(".local.")
-                try:
-                    server_ip = str(ipaddress.IPv4Address(value.addresses[0]))
-                except (IndexError, ipaddress.AddressValueError):
-                    server_ip = "unknown"
-                combo_box.addItem(f"{server_name} ({server_ip})", value)
+                combo_box.addItem(self.__websocket_port_text(value), value)
         # Add Simulation item to indicate operation without machine
         combo_box.addItem(QCoreApplication.translate("KnitEngine", "Simulation"))
+        self.__probe_ports(
+            [self.__portname_at(index) for index in range(combo_box.count() - 1)]
+        )
+
+    @Slot(str, object)
+    def __update_websocket_port(self, name: str, info: Optional[ServiceInfo]) -> None:
+        """
+        Add, update or remove the item of one websocket port in place,
+        keeping the selection of the port list.
+        """
+        combo_box = self.ui.serial_port_dropdown
+        index = -1
+        for i in range(combo_box.count()):
+            value = combo_box.itemData(i)
+            if isinstance(value, ServiceInfo) and value.name == name:
+                index = i
+                break
+        if info is None or not info.server:
+            if index >= 0:
+                combo_box.removeItem(index)
+        elif index >= 0:
+            combo_box.setItemText(index, self.__websocket_port_text(info))
+            combo_box.setItemData(index, info)
+        else:
+            # before the Simulation item
+            index = combo_box.count() - 1
+            combo_box.insertItem(index, self.__websocket_port_text(info), info)
+            self.__probe_ports([self.__portname_at(index)])
+
+    @staticmethod
+    def __websocket_port_text(info: ServiceInfo) -> str:
+        server_name = (info.server or "").removesuffix(".local.")
+        try:
+            server_ip = str(ipaddress.IPv4Address(info.addresses[0]))
+        except (IndexError, ipaddress.AddressValueError):
+            server_ip = "unknown"
+        return f"{server_name} ({server_ip})"
+
+    def __probe_ports(self, portnames: list[str]) -> None:
+        """Look for devices on the ports in the background."""
+        # probing a bridge in use could drop the connection of the operation
+        portnames = [name for name in portnames if name != self.__port_in_use]
+
+        def probe() -> None:
+            self.device_probe_signal.emit(self.__prober.probe(portnames))
+
+        threading.Thread(target=probe, name="AyabProber", daemon=True).start()
+
+    @Slot(object)
+    def __show_devices(self, devices: list[tuple[str, DeviceInfo]]) -> None:
+        """
+        Show the versions of the devices found as tooltips of their ports,
+        and select the best port unless a supported device is selected.
+        """
+        combo_box = self.ui.serial_port_dropdown
+        indexes = {self.__portname_at(i): i for i in range(combo_box.count())}
+        for portname, info in devices:
+            self.__devices[portname] = info
+            if portname in indexes:
+                combo_box.setItemData(
+                    indexes[portname], str(info), Qt.ItemDataRole.ToolTipRole
+                )
+        current = self.__devices.get(self.__portname_at(combo_box.currentIndex()))
+        if current is not None and current.supported:
+            return
+        # else
+        candidates = [
+            (info.rank, portname)
+            for portname, info in self.__devices.items()
+            if portname in indexes and info.supported
+        ]
+        if len(candidates) > 0:
+            portname = max(candidates)[1]
+            self.__logger.info(f"Selecting {portname} ({self.__devices[portname]})")
+            combo_box.setCurrentIndex(indexes[portname])
+
+    def forget_device(self, portname: str) -> None:
+        """Detect the device on a port again, e.g. after flashing it."""
+        self.__prober.forget(portname)
+        self.__devices.pop(portname, None)
+
+    def __portname_at(self, index: int) -> str:
+        user_data = self.ui.serial_port_dropdown.itemData(index)
+        if user_data:
+            # Websocket connection
+            path = user_data.properties.get(b"path", b"/ws").decode()
+            return f"ws://{user_data.server.removesuffix('.')}:{user_data.port}{path}"
+        # else
+        # Serial connection (default)
+        return self.ui.serial_port_dropdown.itemText(index)
 
     def __read_portname(self) -> str:
         # FIXME: method should return a class rather than a string to forward
@@ -149,15 +245,8 @@ class Engine(SignalSender, QDockWidget):
             # Websocket connection
             path = user_data.properties.get(b"path", b"/ws").decode()
             board_id = user_data.properties.get(b"board_id", b"<Unknown>").decode()
-            portname = (
-                f"ws://{user_data.server.removesuffix('.')}:{user_data.port}{path}"
-            )
-
             self.__logger.info(f"Connecting to {board_id} at {path}")
-        else:
-            # Serial connection (default)
-            portname = self.ui.serial_port_dropdown.currentText()
-        return portname
+        return self.__portname_at(selected_index)
 
     def knit_config(self, image: Image.Image) -> None:
         """
@@ -170,9 +259,9 @@ class Engine(SignalSender, QDockWidget):
         # start to knit with the bottom first
         image = image.transpose(Image.FLIP_TOP_BOTTOM)
 
-        # TODO: detect if previous conf had the same
-        # image to avoid re-generating.
-        self.pattern = Pattern(image, self.config, self.config.num_colors)
+        # reuse the color separation if the same image
+        # was knitted before with the same options
+        self.pattern = self.__pattern_cache.pattern(image, self.config)
 
         # validate configuration options
         valid, msg = self.validate()
@@ -204,43 +293,43 @@ class Engine(SignalSender, QDockWidget):
         # else
         return self.config.validate()
 
-    def run(self, operation: Operation) -> None:
-        self.__canceled = False
+    @property
+    def event_driven(self) -> bool:
+        return bool(self.config.prefs.value("event_driven_engine"))
 
-        # setup knitting controller
+    def begin(self, operation: Operation) -> None:
+        """Set up the knitting controller for an operation."""
         self.config.portname = self.__read_portname()
-        self.control.start(self.pattern, self.config, operation)
-
-        with keep.presenting(on_fail="pass"):
-            while True:
-                # continue operating
-                # typically each step involves some communication with the device
-                output = self.control.operate(operation)
-                if output != self.control.notification:
-                    self.__feedback.handle(output)
-                    self.control.notification = output
-                if operation == Operation.KNIT:
-                    self.__handle_status()
-                if self.__canceled or self.control.state == State.FINISHED:
-                    break
-
-            self.control.stop()
-
-            if operation == Operation.KNIT:
-                if self.__canceled:
-                    self.emit_notification("Knitting canceled.")
-                    self.__logger.info("Knitting canceled.")
-                else:
-                    # operation == Operation.TEST:
-                    self.__logger.info("Finished knitting.")
+        self.__port_in_use = self.config.portname
+        super().begin(operation)
+
+    def finish(self, operation: Operation) -> None:
+        """Close the connection and report the end of the operation."""
+        super().finish(operation)
+        self.__port_in_use = None
+
+        if operation == Operation.KNIT:
+            timing = self.control.timing
+            if timing.lines > 0:
+                self.__logger.info("Line timing: " + timing.summary())
+            self.emit_line_timing_reporter(timing)
+            if self.canceled:
+                self.emit_notification("Knitting canceled.")
+                self.__logger.info("Knitting canceled.")
             else:
-                # TODO: provide translations for these messages
-                self.__logger.info("Finished testing.")
+                # operation == Operation.TEST:
+                self.__logger.info("Finished knitting.")
+        else:
+            # TODO: provide translations for these messages
+            self.__logger.info("Finished testing.")
 
-            # send signal to finish operation
-            self.emit_operation_finisher(operation)
+        # send signal to finish operation
+        self.emit_operation_finisher(operation)
 
-    def __handle_status(self) -> None:
+    def handle_output(self, output: Output) -> None:
+        self.__feedback.handle(output)
+
+    def handle_status(self) -> None:
         if self.status.active:
             self.status.refresh()
         # If we do not make a copy of status object to emit to the UI thread
@@ -252,6 +341,3 @@ class Engine(SignalSender, QDockWidget):
         status_copy.copy(self.status)
         self.emit_knit_progress_updater(status_copy)
         self.emit_progress_bar_updater(status_copy)
-
-    def cancel(self) -> None:
-        self.__canceled = True
@@ -21,21 +21,16 @@
 from __future__ import annotations
 
 from enum import Enum, auto
+import sys
 
-from PySide6.QtCore import QCoreApplication
-from PySide6.QtStateMachine import QStateMachine, QState
-
-from .communication import Communication, Token
+from .communication import Communication
 from .communication_mock import CommunicationMock
-from .hw_test_communication_mock import HardwareTestCommunicationMock
+from .messages import CnfInfo, CnfInit, CnfStart, CnfTest, IndState, ReqLine
 from .output import Output
 from typing import TYPE_CHECKING, Callable, Any
 
-import time
-
 if TYPE_CHECKING:
     from .control import Control
-    from .engine import Engine
 
 
 class Operation(Enum):
@@ -58,7 +53,22 @@ class State(Enum):
     FINISHED = auto()
 
 
-class StateMachine(QStateMachine):
+def is_simulation(portname: str) -> bool:
+    """Whether the port is the Simulation item of the port list."""
+    if portname == "Simulation":
+        return True
+    # else
+    # the item is translated in the GUI, which is the only place
+    # where Qt has been loaded
+    qt_core = sys.modules.get("PySide6.QtCore")
+    if qt_core is None:
+        return False
+    # else
+    translated: str = qt_core.QCoreApplication.translate("KnitEngine", "Simulation")
+    return portname == translated
+
+
+class StateMachine(object):
     """
         Each method is a step in the finite state machine that governs serial
     M
@@ -68,26 +78,23 @@ class StateMachine(QStateMachine):
         @date   June 2020
     """
 
-    CONNECT: QState
-    VERSION_CHECK: QState
-
-    lastRetry: float = 0.0
-
     @staticmethod
     def retry(
-        method: Callable[..., None], args: Any = (), timeout: float = 0.1
+        control: Control,
+        method: Callable[..., None],
+        args: Any = (),
+        timeout: float = 0.1,
     ) -> None:
-        current_time = time.time()
-        if (current_time - StateMachine.lastRetry) > timeout:
-            StateMachine.lastRetry = current_time
+        """
+        Call `method` unless it was called less than `timeout` seconds ago.
+        The first request after another one is sent at once.
+        """
+        current_time = control.clock.time()
+        last_method, last_time = control.last_retry
+        if method != last_method or (current_time - last_time) > timeout:
+            control.last_retry = method, current_time
             method(*args)
 
-    def set_transitions(self, parent: Engine) -> None:
-        """Define transitions between states for Finite State Machine"""
-
-        # Events that trigger state changes
-        self.CONNECT.addTransition(parent.port_opener, self.VERSION_CHECK)
-
     @staticmethod
     def _API6_connect(control: Control, operation: Operation) -> Output:
         control.logger.debug("State CONNECT")
@@ -96,14 +103,22 @@ class StateMachine(QStateMachine):
                 return Output.ERROR_INVALID_SETTINGS
         # else
         control.logger.debug("Port name: " + control.portname)
-        if control.portname == QCoreApplication.translate("KnitEngine", "Simulation"):
+        if control.transport is not None:
+            control.com = Communication(
+                control.transport, recorder=control.recorder, clock=control.clock
+            )
+        elif is_simulation(control.portname):
             if operation == Operation.KNIT:
-                control.com = CommunicationMock()
+                control.com = CommunicationMock(clock=control.clock)
             else:
+                from .hw_test_communication_mock import HardwareTestCommunicationMock
+
                 control.com = HardwareTestCommunicationMock()  # type: ignore
         else:
-            control.com = Communication()
-        if not control.com.open_serial(control.portname):
+            control.com = Communication(
+                reader_thread=True, recorder=control.recorder, clock=control.clock
+            )
+        if not control.com.is_open() and not control.com.open_serial(control.portname):
             control.logger.error("Could not open serial port")
             control.state = State.FINISHED
             return Output.ERROR_SERIAL_PORT
@@ -115,31 +130,31 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_version_check(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.cnfInfo:
-            if param >= control.FIRST_SUPPORTED_API_VERSION:
-                control.api_version = param
+        msg = control.check_serial_API6()
+        if isinstance(msg, CnfInfo):
+            if msg.api_version >= control.FIRST_SUPPORTED_API_VERSION:
+                control.api_version = msg.api_version
                 control.state = State.INIT
                 control.logger.debug("State INIT")
                 return Output.NONE
             else:
                 control.logger.error(
                     "Wrong API version: "
-                    + str(param)
+                    + str(msg.api_version)
                     + ", expected >= "
                     + str(control.FIRST_SUPPORTED_API_VERSION)
                 )
                 return Output.ERROR_WRONG_API
         # else
-        StateMachine.retry(control.com.req_info)
+        StateMachine.retry(control, control.com.req_info)
         return Output.CONNECTING_TO_MACHINE
 
     @staticmethod
     def _API6_init(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.cnfInit:
+        msg = control.check_serial_API6()
+        if isinstance(msg, CnfInit):
             # no errors? Move on
-            if param == 0:
+            if msg.error == 0:
                 if operation == Operation.TEST:
                     control.state = State.REQUEST_TEST
                     control.logger.debug("State REQUEST_TEST")
@@ -150,23 +165,25 @@ class StateMachine(QStateMachine):
                     control.logger.debug("State REQUEST_START")
                     return Output.NONE
             else:
-                control.logger.error("Error initializing firmware: " + str(param))
+                control.logger.error("Error initializing firmware: " + str(msg.error))
                 return Output.ERROR_INITIALIZING_FIRMWARE
         # else
-        StateMachine.retry(control.com.req_init_API6, (control.machine,))
+        StateMachine.retry(control, control.com.req_init_API6, (control.machine,))
         return Output.INITIALIZING_FIRMWARE
 
     @staticmethod
     def _API6_request_start(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.indState:
-            if param == 0:
+        msg = control.check_serial_API6()
+        if isinstance(msg, IndState):
+            if msg.error == 0:
                 # record initial position, direction, carriage
                 control.initial_carriage = control.status.carriage_type
                 control.initial_position = control.status.carriage_position
                 control.initial_direction = control.status.carriage_direction
                 # set status.active
                 control.status.active = control.continuous_reporting
+                # hand the job over to the bridge, if any
+                control.start_edge()
                 # request start
                 control.com.req_start_API6(
                     control.pattern.knit_start_needle,
@@ -177,10 +194,10 @@ class StateMachine(QStateMachine):
                 control.state = State.CONFIRM_START
                 control.logger.debug("State CONFIRM_START")
             else:
-                # any value of param other than 0 is some kind of error code
+                # any value of error other than 0 is some kind of error code
                 control.logger.debug(
                     "Knit init failed with error code "
-                    + str(param)
+                    + str(msg.error)
                     + " in state "
                     + str(control.status.firmware_state)
                 )
@@ -189,17 +206,17 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_confirm_start(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.cnfStart:
-            if param == 0:
+        msg = control.check_serial_API6()
+        if isinstance(msg, CnfStart):
+            if msg.error == 0:
                 control.state = State.RUN_KNIT
                 control.logger.debug("State RUN_KNIT")
                 return Output.PLEASE_KNIT
             else:
-                # any value of param other than 0 is some kind of error code
+                # any value of error other than 0 is some kind of error code
                 control.logger.error(
                     "Device not ready, returned `cnfStart` with error code "
-                    + str(param)
+                    + str(msg.error)
                 )
                 # TODO: more output to describe error
                 return Output.DEVICE_NOT_READY
@@ -208,9 +225,9 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_run_knit(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.reqLine:
-            pattern_finished = control.cnf_line_API6(param)
+        msg = control.check_serial_API6()
+        if isinstance(msg, ReqLine):
+            pattern_finished = control.cnf_line_API6(msg.line_number)
             if pattern_finished:
                 control.state = State.FINISHING
                 return Output.NEXT_LINE
@@ -228,18 +245,19 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_confirm_test(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.cnfTest:
-            if param == 0:
+        msg = control.check_serial_API6()
+        if isinstance(msg, CnfTest):
+            if msg.error == 0:
                 control.emit_hw_test_starter(control)
                 control.state = State.RUN_TEST
                 control.logger.debug("State RUN_TEST")
                 # TODO: need more informative messages for HW test
                 return Output.NONE
             else:
-                # any value of param other than 0 is some kind of error code
+                # any value of error other than 0 is some kind of error code
                 control.logger.error(
-                    "Device not ready, returned `cnfTest` with error code " + str(param)
+                    "Device not ready, returned `cnfTest` with error code "
+                    + str(msg.error)
                 )
                 # TODO: more output to describe error
                 return Output.DEVICE_NOT_READY
@@ -255,9 +273,9 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_finishing(control: Control, operation: Operation) -> Output:
-        token, param = control.check_serial_API6()
-        if token == Token.reqLine:
-            control.cnf_final_line_API6(param)
+        msg = control.check_serial_API6()
+        if isinstance(msg, ReqLine):
+            control.cnf_final_line_API6(msg.line_number)
 
             # When closing the serial port, the final bytes written
             # may be dropped by the driver
@@ -276,8 +294,8 @@ class StateMachine(QStateMachine):
 
     @staticmethod
     def _API6_disconnect(control: Control, operation: Operation) -> Output:
-        token, _ = control.check_serial_API6()
-        if token == Token.cnfInfo:
+        msg = control.check_serial_API6()
+        if isinstance(msg, CnfInfo):
             # We received a response to our final `reqInfo` request,
             # it is now safe to close the port.
             control.state = State.FINISHED
@@ -54,9 +54,6 @@ class HardwareTestCommunicationMock(QObject, CommunicationMock):
             dispatch = getattr(self, "_handle_" + cmd)
             dispatch(msg)
 
-    def update_API6(self):
-        return self.parse_API6(self.read_API6())
-
     def read_API6(self):
         if len(self.rx_msg_list) == 0:
             return None
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Options of a knitting job that do not depend on the GUI.
+
+`KnitOptions` holds the same settings as the options tab of the dock
+widget, with the same names, so that a job can be set up and run without
+loading Qt. It reads and writes the dictionaries of `OptionsTab.as_dict`.
+"""
+
+from __future__ import annotations
+
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Literal, Mapping, Optional
+
+from ..machine import Machine
+from .mode import Mode
+
+if TYPE_CHECKING:
+    from PySide6.QtWidgets import QComboBox
+    from .options_gui import Ui_Options
+
+
+class Alignment(Enum):
+    CENTER = 0
+    LEFT = 1
+    RIGHT = 2
+
+    @staticmethod
+    def add_items(box: QComboBox) -> None:
+        """Add items to alignment combo box."""
+        from PySide6.QtCore import QCoreApplication
+
+        tr_ = QCoreApplication.translate
+        box.addItem(tr_("Alignment", "Center"))
+        box.addItem(tr_("Alignment", "Left"))
+        box.addItem(tr_("Alignment", "Right"))
+
+
+class NeedleColor(Enum):
+    ORANGE = 0
+    GREEN = 1
+
+    @staticmethod
+    def add_items(box: QComboBox) -> None:
+        """Add items to needle color combo box."""
+        from PySide6.QtCore import QCoreApplication
+
+        tr_ = QCoreApplication.translate
+        box.addItem(tr_("NeedleColor", "left"))
+        box.addItem(tr_("NeedleColor", "right"))
+
+    def read(self, needle: int, machine: Machine) -> int:
+        if self == NeedleColor.ORANGE:
+            return machine.width // 2 - int(needle)
+        elif self == NeedleColor.GREEN:
+            return machine.width // 2 + int(needle) - 1
+
+    @staticmethod
+    def read_start_needle(ui: Ui_Options, machine: Machine) -> int:
+        """Read the start needle prefs from UI and normalize"""
+        start_needle_col = NeedleColor(ui.start_needle_color.currentIndex())
+        start_needle_text = ui.start_needle_edit.value()
+        return start_needle_col.read(start_needle_text, machine)
+
+    @staticmethod
+    def read_stop_needle(ui: Ui_Options, machine: Machine) -> int:
+        """Read the stop needle prefs from UI and normalize"""
+        stop_needle_col = NeedleColor(ui.stop_needle_color.currentIndex())
+        stop_needle_text = ui.stop_needle_edit.value()
+        return stop_needle_col.read(stop_needle_text, machine)
+
+    @staticmethod
+    def parse(text: str, machine: Machine) -> int:
+        """
+        Return the needle for a needle number as written on the machine,
+        such as `L20` (orange) or `R20` (green).
+        """
+        side = text[:1].upper()
+        if side not in ("L", "R") or not text[1:].isdigit():
+            raise ValueError(f"Invalid needle: {text}")
+        # else
+        number = int(text[1:])
+        if not 1 <= number <= machine.width // 2:
+            raise ValueError(f"Invalid needle: {text}")
+        # else
+        color = NeedleColor.ORANGE if side == "L" else NeedleColor.GREEN
+        return color.read(number, machine)
+
+
+class KnitPreferences(object):
+    """Preferences used while knitting, with the defaults of the GUI."""
+
+    DEFAULTS: dict[str, Any] = {"disable_hardware_beep": False}
+
+    def __init__(self, **values: Any):
+        self.__values = dict(self.DEFAULTS)
+        self.__values.update(values)
+
+    def value(self, var: str) -> Any:
+        return self.__values[var]
+
+
+class KnitOptions(object):
+    """Options of a knitting job."""
+
+    def __init__(
+        self,
+        portname: str = "",
+        machine: Machine = Machine.KH910_KH950,
+        mode: Mode = Mode.SINGLEBED,
+        num_colors: int = 2,
+        start_row: int = 0,
+        inf_repeat: bool = False,
+        start_needle: Optional[int] = None,
+        stop_needle: Optional[int] = None,
+        alignment: Alignment = Alignment.CENTER,
+        auto_mirror: bool = False,
+        continuous_reporting: bool = False,
+        prefs: Optional[KnitPreferences] = None,
+    ):
+        self.portname = portname
+        self.machine = machine
+        self.mode = mode
+        self.num_colors = num_colors
+        self.start_row = start_row
+        self.inf_repeat = inf_repeat
+        self.start_needle = 0 if start_needle is None else start_needle
+        self.stop_needle = machine.width - 1 if stop_needle is None else stop_needle
+        self.alignment = alignment
+        self.auto_mirror = auto_mirror
+        self.continuous_reporting = continuous_reporting
+        self.prefs = prefs or KnitPreferences()
+
+    @classmethod
+    def from_dict(cls, options: Mapping[str, Any]) -> KnitOptions:
+        """Read the options from a dictionary like `OptionsTab.as_dict`."""
+        machine = Machine[options.get("machine", Machine.KH910_KH950.name)]
+        return cls(
+            options.get("portname", ""),
+            machine,
+            Mode[options.get("mode", Mode.SINGLEBED.name)],
+            int(options.get("num_colors", 2)),
+            int(options.get("start_row", 0)),
+            bool(options.get("inf_repeat", False)),
+            options.get("start_needle"),
+            options.get("stop_needle"),
+            Alignment[options.get("alignment", Alignment.CENTER.name)],
+            bool(options.get("auto_mirror", False)),
+            bool(options.get("continuous_reporting", False)),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "portname": self.portname,
+            "machine": self.machine.name,
+            "mode": self.mode.name,
+            "num_colors": self.num_colors,
+            "start_row": self.start_row,
+            "inf_repeat": self.inf_repeat,
+            "start_needle": self.start_needle,
+            "stop_needle": self.stop_needle,
+            "alignment": self.alignment.name,
+            "auto_mirror": self.auto_mirror,
+            "continuous_reporting": self.continuous_reporting,
+        }
+
+    def validate(self) -> tuple[Literal[False], str] | tuple[Literal[True], None]:
+        """Validate configuration options, like `OptionsTab.validate`."""
+        if self.portname == "":
+            return False, "Please choose a valid port."
+        # else
+        if not (0 <= self.start_needle <= self.stop_needle < self.machine.width):
+            return False, "Invalid needle start and end."
+        # else
+        if self.mode == Mode.SINGLEBED and self.num_colors >= 3:
+            return False, "Single bed knitting currently supports only 2 colors."
+        # else
+        if self.mode == Mode.CIRCULAR_RIBBER and self.num_colors >= 3:
+            return False, "Circular knitting supports only 2 colors."
+        # else
+        if not self.mode.good_ncolors(self.num_colors) or self.num_colors > 6:
+            return False, "Invalid number of colors."
+        # else
+        return True, None
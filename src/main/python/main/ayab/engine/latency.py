@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Timing statistics of the line requests of a knitting session."""
+
+from __future__ import annotations
+from typing import Optional
+
+
+class Histogram(object):
+    """
+    Histogram of durations, after HdrHistogram.
+
+    Durations are counted in microseconds. Each power of two has the same
+    number of linear sub-buckets, so the histogram stays small over a wide
+    range of values while every percentile is accurate to within
+    `1 / 2 ** (SUB_BITS - 1)` of its value.
+    """
+
+    SUB_BITS = 7
+    UNIT = 1e-6
+
+    def __init__(self) -> None:
+        self.__counts: list[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def bucket(cls, value: int) -> int:
+        """Return the index of the bucket of a value in units."""
+        sub_buckets = 1 << cls.SUB_BITS
+        if value < sub_buckets:
+            return value
+        # else
+        half = sub_buckets >> 1
+        shift = value.bit_length() - cls.SUB_BITS
+        return sub_buckets + (shift - 1) * half + (value >> shift) - half
+
+    @classmethod
+    def highest_value(cls, index: int) -> int:
+        """Return the highest value in units counted in a bucket."""
+        sub_buckets = 1 << cls.SUB_BITS
+        if index < sub_buckets:
+            return index
+        # else
+        half = sub_buckets >> 1
+        shift, sub_bucket = divmod(index - sub_buckets, half)
+        shift += 1
+        return ((sub_bucket + half + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        seconds = max(0.0, seconds)
+        index = self.bucket(int(seconds / self.UNIT))
+        if index >= len(self.__counts):
+            self.__counts.extend([0] * (index + 1 - len(self.__counts)))
+        self.__counts[index] += 1
+        if self.count == 0 or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.count += 1
+        self.total += seconds
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        # else
+        return self.total / self.count
+
+    def percentile(self, percent: float) -> float:
+        """Return the duration in seconds below which `percent` % of values lie."""
+        if self.count == 0:
+            return 0.0
+        # else
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, (self.highest_value(index) + 1) * self.UNIT)
+        # fallthrough
+        return self.max
+
+
+class LineTiming(object):
+    """
+    Timing of the line requests of a knitting session.
+
+    Records the turnaround from receiving `reqLine` to sending `cnfLine`,
+    and the interval between successive line requests. A turnaround longer
+    than `deadline` seconds counts as a missed deadline.
+    """
+
+    DEADLINE = 0.05
+
+    def __init__(self, deadline: float = DEADLINE):
+        self.deadline = deadline
+        self.turnaround = Histogram()
+        self.interval = Histogram()
+        self.missed = 0
+        self.__last_request: Optional[float] = None
+
+    def record(self, requested: float, sent: float) -> None:
+        """Record a line requested and sent at the given times in seconds."""
+        turnaround = sent - requested
+        self.turnaround.record(turnaround)
+        if turnaround > self.deadline:
+            self.missed += 1
+        if self.__last_request is not None:
+            self.interval.record(requested - self.__last_request)
+        self.__last_request = requested
+
+    @property
+    def lines(self) -> int:
+        return self.turnaround.count
+
+    def summary(self) -> str:
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.2f} ms"
+
+        return (
+            f"{self.lines} lines, reqLine to cnfLine"
+            + f" p50 {ms(self.turnaround.percentile(50))}"
+            + f" p99 {ms(self.turnaround.percentile(99))}"
+            + f" max {ms(self.turnaround.max)},"
+            + f" {self.missed} over {ms(self.deadline)};"
+            + f" line interval p50 {ms(self.interval.percentile(50))}"
+            + f" min {ms(self.interval.min)}"
+        )
+
+    def brief(self) -> str:
+        """The turnaround percentiles and missed deadlines, for the user."""
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.1f} ms"
+
+        return (
+            f"p50 {ms(self.turnaround.percentile(50))},"
+            + f" p99 {ms(self.turnaround.percentile(99))},"
+            + f" max {ms(self.turnaround.max)},"
+            + f" {self.missed} of {self.lines} lines late"
+        )
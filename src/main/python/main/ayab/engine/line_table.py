@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+from __future__ import annotations
+from collections import OrderedDict
+import threading
+from typing import Callable, Iterable, TypeAlias
+from bitarray import bitarray
+
+LineKey: TypeAlias = tuple[int, int, bool]
+LineData: TypeAlias = tuple[bytes, bitarray]
+
+
+class LineTable(object):
+    """
+    Wire-ready needle data for the lines of a knitting job.
+
+    Lines are keyed by `(color, row_index, blank_line)` as returned by the
+    `ModeFunc` methods. Each entry holds the payload of the `cnfLine` message,
+    with the flanking needles and the clipping to the start and end needles
+    already applied, together with the needle bits for the status display.
+    A line is compiled the first time it is looked up (or in advance with
+    `compile`), and lines with identical needles share one buffer, which
+    is common in repeated patterns.
+
+    Like `ExpandedRows`, the table keeps a bounded window of the most
+    recently used lines, so memory does not grow with the length of the
+    job. Lines may be compiled and looked up from different threads.
+    """
+
+    WINDOW = 256
+
+    def __init__(
+        self,
+        select_needles: Callable[[int, int, bool], bitarray],
+        window: int = WINDOW,
+    ):
+        self.__select_needles = select_needles
+        self.__window = window
+        self.__lines: OrderedDict[LineKey, LineData] = OrderedDict()
+        # shared buffers, with the number of lines using each of them
+        self.__payloads: dict[bytes, tuple[LineData, int]] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, color: int, row_index: int, blank_line: bool) -> LineData:
+        key = (color, row_index, blank_line)
+        with self.__lock:
+            line = self.__lines.get(key)
+            if line is not None:
+                self.__lines.move_to_end(key)
+                return line
+        # else
+        return self.__compile_line(key)
+
+    def compile(self, keys: Iterable[LineKey]) -> None:
+        """Compile lines ahead of their first use."""
+        for key in keys:
+            if key not in self.__lines:
+                self.__compile_line(key)
+
+    def __compile_line(self, key: LineKey) -> LineData:
+        bits = self.__select_needles(*key)
+        payload = bits.tobytes()
+        with self.__lock:
+            line = self.__lines.get(key)
+            if line is not None:
+                # compiled by another thread in the meantime
+                return line
+            # else
+            # share the buffer of an identical line compiled before
+            line, users = self.__payloads.get(payload, ((payload, bits), 0))
+            self.__payloads[payload] = line, users + 1
+            self.__lines[key] = line
+            if len(self.__lines) > self.__window:
+                _, (evicted, _) = self.__lines.popitem(last=False)
+                line_data, users = self.__payloads[evicted]
+                if users > 1:
+                    self.__payloads[evicted] = line_data, users - 1
+                else:
+                    del self.__payloads[evicted]
+        return line
+
+    def __len__(self) -> int:
+        return len(self.__lines)
+
+    @property
+    def num_payloads(self) -> int:
+        """Number of distinct payloads in the table."""
+        return len(self.__payloads)
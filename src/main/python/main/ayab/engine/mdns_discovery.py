@@ -1,24 +1,46 @@
+import asyncio
+import concurrent.futures
 import contextlib
 import zeroconf
+from zeroconf.asyncio import AsyncServiceInfo
 import threading
 import logging
-from typing import Callable
+from typing import Callable, Optional
 
 
 class MdnsBrowser:
     """
     Explore Zeroconf services and manage them using a thread-safe dict
+
+    Services are resolved with `AsyncServiceInfo` on the event loop of
+    Zeroconf, so that the listener callbacks never wait for the network.
+    A resolved service is kept until its records expire, when it is
+    resolved again, or removed if it does not answer any more.
+
+    Each change is reported as it happens by calling `update_callback` with
+    the name of the service and its information, or `None` if it is gone.
+    The callback is called on the Zeroconf thread.
     """
 
-    def __init__(self, service_type: str, update_callback: Callable[..., None]):
+    RESOLVE_TIMEOUT = 3000  # milliseconds
+    STOP_TIMEOUT = 1.0  # seconds
+
+    def __init__(
+        self,
+        service_type: str,
+        update_callback: Callable[[str, Optional[zeroconf.ServiceInfo]], None],
+    ):
         self.service_type: str = service_type
-        self.update_callback: Callable[..., None] = update_callback
-        self.services: dict[str, zeroconf.ServiceInfo | None] = {}
+        self.update_callback = update_callback
+        self.services: dict[str, zeroconf.ServiceInfo] = {}
         self.services_lock = threading.Lock()
         self.zeroconf_instance: zeroconf.Zeroconf | None = None
         self.browser: zeroconf.ServiceBrowser | None = None
         self.running = False
         self.__logger = logging.getLogger(type(self).__name__)
+        # timers of the cache entries, only used on the event loop of Zeroconf
+        self.__expiry: dict[str, asyncio.TimerHandle] = {}
+        self.__refreshing: set[asyncio.Task[None]] = set()
 
         self.listener: MdnsBrowser._ZeroconfListener = self._ZeroconfListener(self)
 
@@ -54,34 +76,115 @@ class MdnsBrowser:
         service_type: str,
         name: str,
         change_type: str,
-    ) -> None:
+    ) -> concurrent.futures.Future[None]:
         """Callback called when a service is added or updated."""
+        return asyncio.run_coroutine_threadsafe(
+            self._resolve(zeroconf_instance, service_type, name, change_type),
+            self.__loop(zeroconf_instance),
+        )
+
+    def _on_service_removed(
+        self, zeroconf_instance: zeroconf.Zeroconf, _service_type: str, name: str
+    ) -> None:
+        """Callback called when a service is removed."""
+        self.__loop(zeroconf_instance).call_soon_threadsafe(self.__remove, name)
+
+    async def _resolve(
+        self,
+        zeroconf_instance: zeroconf.Zeroconf,
+        service_type: str,
+        name: str,
+        change_type: str,
+    ) -> None:
+        """Resolve a service, from the cache of Zeroconf if possible."""
+        info = AsyncServiceInfo(service_type, name)
         try:
-            info: zeroconf.ServiceInfo | None = zeroconf_instance.get_service_info(
-                service_type, name, timeout=3000
-            )
-            if info:
-                self.__logger.info(f"Service {change_type}: {name}")
-                with self.services_lock:
-                    self.services[name] = info
-                self.update_callback()
-            else:
-                self.__logger.warning(f"Unable to retrieve service {name} information")
+            found = await info.async_request(zeroconf_instance, self.RESOLVE_TIMEOUT)
         except Exception:
             self.__logger.exception(f"Error while fetching service {name}")
+            return
+        if not found:
+            self.__logger.warning(f"Unable to retrieve service {name} information")
+            if change_type == "expired":
+                self.__remove(name)
+            return
+        # else
+        if not self.running:
+            return
+        # else
+        self.__schedule_expiry(zeroconf_instance, info)
+        with self.services_lock:
+            known = self.services.get(name)
+            self.services[name] = info
+        if known is not None and self.__same(known, info):
+            return
+        # else
+        self.__logger.info(f"Service {change_type}: {name}")
+        self.update_callback(name, info)
 
-    def _on_service_removed(
-        self, _zeroconf_instance: zeroconf.Zeroconf, _service_type: str, name: str
+    def __schedule_expiry(
+        self, zeroconf_instance: zeroconf.Zeroconf, info: AsyncServiceInfo
     ) -> None:
-        """Callback called when a service is removed."""
-        self.__logger.info(f"Service removed: {name}")
-        should_notify = False
+        """Resolve the service again when its service record expires."""
+        record = zeroconf_instance.cache.async_get_unique(info.dns_service())
+        now = zeroconf.current_time_millis()
+        if record is not None:
+            expires = record.get_expiration_time(100)
+        else:
+            expires = now + info.host_ttl * 1000
+        timer = self.__expiry.pop(info.name, None)
+        if timer is not None:
+            timer.cancel()
+        self.__expiry[info.name] = asyncio.get_running_loop().call_later(
+            max(0.0, (expires - now) / 1000),
+            self.__refresh,
+            zeroconf_instance,
+            info.type,
+            info.name,
+        )
+
+    def __refresh(
+        self, zeroconf_instance: zeroconf.Zeroconf, service_type: str, name: str
+    ) -> None:
+        task = asyncio.get_running_loop().create_task(
+            self._resolve(zeroconf_instance, service_type, name, "expired")
+        )
+        self.__refreshing.add(task)
+        task.add_done_callback(self.__refreshing.discard)
+
+    async def __forget(self) -> None:
+        """Cancel the timers and refreshes of the cache entries."""
+        for timer in self.__expiry.values():
+            timer.cancel()
+        self.__expiry.clear()
+        for task in list(self.__refreshing):
+            task.cancel()
+
+    def __remove(self, name: str) -> None:
+        timer = self.__expiry.pop(name, None)
+        if timer is not None:
+            timer.cancel()
         with self.services_lock:
-            if name in self.services:
-                del self.services[name]
-                should_notify = True
-        if should_notify:
-            self.update_callback()
+            known = self.services.pop(name, None)
+        if known is not None:
+            self.__logger.info(f"Service removed: {name}")
+            self.update_callback(name, None)
+
+    @staticmethod
+    def __loop(zeroconf_instance: zeroconf.Zeroconf) -> asyncio.AbstractEventLoop:
+        """The event loop that Zeroconf runs on its own thread while open."""
+        assert zeroconf_instance.loop is not None
+        return zeroconf_instance.loop
+
+    @staticmethod
+    def __same(a: zeroconf.ServiceInfo, b: zeroconf.ServiceInfo) -> bool:
+        """Whether two resolutions of a service are the same for clients."""
+        return (
+            a.server == b.server
+            and a.port == b.port
+            and a.addresses == b.addresses
+            and a.properties == b.properties
+        )
 
     def start(self) -> None:
         """Start Zeroconf service browser."""
@@ -92,12 +195,12 @@ class MdnsBrowser:
         self.__logger.info(f"Starting service exploration for: {self.service_type}")
         try:
             self.zeroconf_instance = zeroconf.Zeroconf()
+            self.running = True
             self.browser = zeroconf.ServiceBrowser(
                 self.zeroconf_instance,
                 self.service_type,
                 self.listener,
             )
-            self.running = True
         except Exception:
             self.__logger.exception("Error while starting Zeroconf")
             self.stop()
@@ -105,16 +208,24 @@ class MdnsBrowser:
     def stop(self) -> None:
         """Stop Zeroconf service exploration and clean up."""
         self.__logger.info("Shutting down MdnsBrowser...")
+        self.running = False
         if self.browser:
             self.browser.cancel()
             self.browser = None
         if self.zeroconf_instance:
+            # the cache entries belong to the event loop of Zeroconf
+            future = asyncio.run_coroutine_threadsafe(
+                self.__forget(), self.__loop(self.zeroconf_instance)
+            )
+            try:
+                future.result(self.STOP_TIMEOUT)
+            except Exception:
+                self.__logger.exception("Error while forgetting services")
             self.zeroconf_instance.close()
             self.zeroconf_instance = None
-        self.running = False
         self.__logger.info("ServiceBrowser stopped.")
 
-    def get_known_services(self) -> dict[str, zeroconf.ServiceInfo | None]:
+    def get_known_services(self) -> dict[str, zeroconf.ServiceInfo]:
         """Return known services."""
         with self.services_lock:
             return self.services.copy()
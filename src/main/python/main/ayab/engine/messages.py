@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Tokens of the serial protocol and typed records for the messages sent
+by the device.
+
+`decode_message` looks up the first byte of a SLIP packet in a table of
+record classes and extracts the fields with `struct`, so that the state
+machine can work with named fields instead of indexing raw bytes.
+"""
+
+from __future__ import annotations
+
+import struct
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, ClassVar
+
+
+class Token(Enum):
+    unknown = -2
+    none = -1
+    reqInfo = 0x03
+    cnfInfo = 0xC3
+    reqTest = 0x04
+    cnfTest = 0xC4
+    reqStart = 0x01
+    cnfStart = 0xC1
+    reqLine = 0x82
+    cnfLine = 0x42
+    indState = 0x84
+    helpCmd = 0x25
+    sendCmd = 0x26
+    beepCmd = 0x27
+    setSingleCmd = 0x28
+    setAllCmd = 0x29
+    readEOLsensorsCmd = 0x2A
+    readEncodersCmd = 0x2B
+    autoReadCmd = 0x2C
+    autoTestCmd = 0x2D
+    stopCmd = 0x2E
+    quitCmd = 0x2F
+    reqInit = 0x05
+    cnfInit = 0xC5
+    testRes = 0xEE
+    debug = 0x9F
+    slipFrameEnd = 0xC0
+
+
+class Message(ABC):
+    """Base class of the messages received from the device."""
+
+    __slots__ = ()
+    token: ClassVar[Token] = Token.unknown
+
+    @classmethod
+    @abstractmethod
+    def decode(cls, msg: bytes) -> Message:
+        """Extract the fields of a message that starts with `token`."""
+
+    @classmethod
+    def field_names(cls) -> tuple[str, ...]:
+        names: list[str] = []
+        for klass in reversed(cls.__mro__):
+            names.extend(getattr(klass, "__slots__", ()))
+        return tuple(names)
+
+    def fields(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.field_names())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message) or type(self) is not type(other):
+            return False
+        # else
+        return self.fields() == other.fields()
+
+    def __hash__(self) -> int:
+        return hash((type(self), self.fields()))
+
+    def __repr__(self) -> str:
+        args = ", ".join(
+            name + "=" + repr(value)
+            for name, value in zip(self.field_names(), self.fields())
+        )
+        return type(self).__name__ + "(" + args + ")"
+
+
+class Unknown(Message):
+    """A message that could not be decoded."""
+
+    __slots__ = ("raw",)
+
+    def __init__(self, raw: bytes):
+        self.raw = bytes(raw)
+
+    @classmethod
+    def decode(cls, msg: bytes) -> Unknown:
+        return cls(msg)
+
+
+class CnfInfo(Message):
+    """Reply to `reqInfo` with the API and firmware versions."""
+
+    __slots__ = ("api_version", "fw_major", "fw_minor", "fw_patch", "fw_suffix")
+    token = Token.cnfInfo
+
+    def __init__(
+        self,
+        api_version: int,
+        fw_major: int = 0,
+        fw_minor: int = 0,
+        fw_patch: int = 0,
+        fw_suffix: str = "",
+    ):
+        self.api_version = api_version
+        self.fw_major = fw_major
+        self.fw_minor = fw_minor
+        self.fw_patch = fw_patch
+        self.fw_suffix = fw_suffix
+
+    @classmethod
+    def decode(cls, msg: bytes) -> CnfInfo:
+        api_version = msg[1]
+        if api_version < 5 or len(msg) < 5:
+            return cls(api_version)
+        # else
+        fw_major, fw_minor, fw_patch = struct.unpack_from("BBB", msg, 2)
+        suffix = msg[5:21].split(b"\0", 1)[0]
+        return cls(
+            api_version,
+            fw_major,
+            fw_minor,
+            fw_patch,
+            suffix.decode(errors="replace"),
+        )
+
+    @property
+    def firmware_version(self) -> str:
+        version = f"{self.fw_major}.{self.fw_minor}.{self.fw_patch}"
+        if self.fw_suffix:
+            version += "-" + self.fw_suffix
+        return version
+
+
+class Confirmation(Message):
+    """Base class of the replies that carry only an error code."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: int):
+        self.error = error
+
+    @classmethod
+    def decode(cls, msg: bytes) -> Confirmation:
+        return cls(msg[1])
+
+
+class CnfInit(Confirmation):
+    __slots__ = ()
+    token = Token.cnfInit
+
+
+class CnfStart(Confirmation):
+    __slots__ = ()
+    token = Token.cnfStart
+
+
+class CnfTest(Confirmation):
+    __slots__ = ()
+    token = Token.cnfTest
+
+
+class ReqLine(Message):
+    """Request for the next line of stitch data."""
+
+    __slots__ = ("line_number",)
+    token = Token.reqLine
+
+    def __init__(self, line_number: int):
+        self.line_number = line_number
+
+    @classmethod
+    def decode(cls, msg: bytes) -> ReqLine:
+        return cls(msg[1])
+
+
+class IndState(Message):
+    """State of the firmware, the Hall sensors and the carriage."""
+
+    __slots__ = (
+        "error",
+        "firmware_state",
+        "hall_l",
+        "hall_r",
+        "carriage",
+        "position",
+        "direction",
+    )
+    token = Token.indState
+
+    __format = struct.Struct(">BBHHBBB")
+
+    def __init__(
+        self,
+        error: int,
+        firmware_state: int,
+        hall_l: int,
+        hall_r: int,
+        carriage: int,
+        position: int,
+        direction: int,
+    ):
+        self.error = error
+        self.firmware_state = firmware_state
+        self.hall_l = hall_l
+        self.hall_r = hall_r
+        self.carriage = carriage
+        self.position = position
+        self.direction = direction
+
+    @classmethod
+    def decode(cls, msg: bytes) -> IndState:
+        return cls(*cls.__format.unpack_from(msg, 1))
+
+
+class TestRes(Message):
+    """Output of the hardware test."""
+
+    __slots__ = ("text",)
+    token = Token.testRes
+
+    def __init__(self, text: str):
+        self.text = text
+
+    @classmethod
+    def decode(cls, msg: bytes) -> TestRes:
+        return cls(msg[1:].decode(errors="replace"))
+
+
+# Opcode table
+RECORDS: tuple[type[Message], ...] = (
+    CnfInfo,
+    CnfInit,
+    CnfStart,
+    CnfTest,
+    ReqLine,
+    IndState,
+    TestRes,
+)
+DECODERS: dict[int, type[Message]] = {record.token.value: record for record in RECORDS}
+
+
+def decode_message(msg: bytes) -> Message:
+    """Return the record for a SLIP packet received from the device."""
+    if len(msg) == 0:
+        return Unknown(msg)
+    # else
+    record = DECODERS.get(msg[0], Unknown)
+    try:
+        return record.decode(msg)
+    except (IndexError, struct.error):
+        # truncated message
+        return Unknown(msg)
@@ -22,14 +22,11 @@ from __future__ import annotations
 
 from enum import Enum
 
-from PySide6.QtCore import QCoreApplication
-from PySide6.QtWidgets import QComboBox
-
 from ..utils import odd, even
-from typing import TYPE_CHECKING, Callable, TypeAlias
+from typing import TYPE_CHECKING, Callable, Protocol, TypeAlias
 
 if TYPE_CHECKING:
-    from .control import Control
+    from PySide6.QtWidgets import QComboBox
 
 
 class Mode(Enum):
@@ -81,6 +78,8 @@ class Mode(Enum):
 
     @staticmethod
     def add_items(box: QComboBox) -> None:
+        from PySide6.QtCore import QCoreApplication
+
         tr_ = QCoreApplication.translate
         box.addItem(tr_("KnitMode", "Singlebed"))
         box.addItem(tr_("KnitMode", "Ribber: Classic"))
@@ -89,22 +88,38 @@ class Mode(Enum):
         box.addItem(tr_("KnitMode", "Ribber: Circular"))
 
 
+class KnitParams(Protocol):
+    """Knitting parameters used by the `ModeFunc` methods."""
+
+    inf_repeat: bool
+    len_pat_expanded: int
+    num_colors: int
+    passes_per_row: int
+    pat_height: int
+    pat_row: int
+    start_row: int
+
+
 if TYPE_CHECKING:
     ModeTuple: TypeAlias = tuple[int, int, bool, bool]
-    ModeFuncType: TypeAlias = Callable[[Control, int], ModeTuple]
+    ModeFuncType: TypeAlias = Callable[[KnitParams, int], ModeTuple]
 
 
 class ModeFunc(object):
     """
     Methods available to `AyabControl.func_selector()`.
 
+    Each method maps a line number to the `(color, row_index, blank_line,
+    last_line)` of that line, and sets `pat_row` on the knitting parameters.
+    They are evaluated ahead of knitting by `KnitSchedule`.
+
     @author Tom Price
     @date   June 2020
     """
 
     # singlebed, 2 color
     @staticmethod
-    def _singlebed(control: Control, line_number: int) -> ModeTuple:
+    def _singlebed(control: KnitParams, line_number: int) -> ModeTuple:
         line_number += control.start_row
 
         # when knitting infinitely, keep the requested
@@ -132,7 +147,7 @@ class ModeFunc(object):
 
     # doublebed, 2 color
     @staticmethod
-    def _classic_ribber_2col(control: Control, line_number: int) -> ModeTuple:
+    def _classic_ribber_2col(control: KnitParams, line_number: int) -> ModeTuple:
         line_number += 2 * control.start_row
 
         # calculate line number index for colors
@@ -163,7 +178,7 @@ class ModeFunc(object):
 
     # doublebed, multicolor
     @staticmethod
-    def _classic_ribber_multicol(control: Control, line_number: int) -> ModeTuple:
+    def _classic_ribber_multicol(control: KnitParams, line_number: int) -> ModeTuple:
 
         # halve line_number because every second line is BLANK
         blank_line = odd(line_number)
@@ -182,14 +197,11 @@ class ModeFunc(object):
 
         last_line = (row_index == control.len_pat_expanded - 1) and blank_line
 
-        if not blank_line:
-            control.logger.debug("COLOR " + str(color))
-
         return color, row_index, blank_line, last_line
 
     # Ribber, Middle-Colors-Twice
     @staticmethod
-    def _middlecolorstwice_ribber(control: Control, line_number: int) -> ModeTuple:
+    def _middlecolorstwice_ribber(control: KnitParams, line_number: int) -> ModeTuple:
 
         # doublebed middle-colors-twice multicolor
         # 0-00 1-11 2-22 3-33 4-44 5-55 .. (pat_row)
@@ -227,7 +239,7 @@ class ModeFunc(object):
     # doublebed, multicolor <3 of pluto
     # rotates middle colors
     @staticmethod
-    def _heartofpluto_ribber(control: Control, line_number: int) -> ModeTuple:
+    def _heartofpluto_ribber(control: KnitParams, line_number: int) -> ModeTuple:
 
         # doublebed <3 of pluto multicolor
         # 0000 1111 2222 3333 4444 5555 .. (pat_row)
@@ -264,7 +276,7 @@ class ModeFunc(object):
     # Ribber, Circular
     # not restricted to 2 colors
     @staticmethod
-    def _circular_ribber(control: Control, line_number: int) -> ModeTuple:
+    def _circular_ribber(control: KnitParams, line_number: int) -> ModeTuple:
 
         # A B  A B  A B  .. (color)
         # 0-0- 1-1- 2-2- .. (pat_row)
@@ -20,14 +20,13 @@
 
 from __future__ import annotations
 
-from enum import Enum
-
-from PySide6.QtCore import Qt, QCoreApplication
-from PySide6.QtWidgets import QWidget, QComboBox
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QWidget
 from PySide6.QtGui import QPixmap
 
 from ..signal_sender import SignalSender
 from .options_gui import Ui_Options
+from .knit_options import Alignment as Alignment, NeedleColor
 from .mode import Mode
 from ..machine import Machine
 from . import lowercase_e_rc
@@ -250,49 +249,3 @@ class OptionsTab(SignalSender, QWidget):
             return False, "Circular knitting supports only 2 colors."
         # else
         return True, None
-
-
-class Alignment(Enum):
-    CENTER = 0
-    LEFT = 1
-    RIGHT = 2
-
-    @staticmethod
-    def add_items(box: QComboBox) -> None:
-        """Add items to alignment combo box."""
-        tr_ = QCoreApplication.translate
-        box.addItem(tr_("Alignment", "Center"))
-        box.addItem(tr_("Alignment", "Left"))
-        box.addItem(tr_("Alignment", "Right"))
-
-
-class NeedleColor(Enum):
-    ORANGE = 0
-    GREEN = 1
-
-    @staticmethod
-    def add_items(box: QComboBox) -> None:
-        """Add items to needle color combo box."""
-        tr_ = QCoreApplication.translate
-        box.addItem(tr_("NeedleColor", "left"))
-        box.addItem(tr_("NeedleColor", "right"))
-
-    def read(self, needle: int, machine: Machine) -> int:
-        if self == NeedleColor.ORANGE:
-            return machine.width // 2 - int(needle)
-        elif self == NeedleColor.GREEN:
-            return machine.width // 2 + int(needle) - 1
-
-    @staticmethod
-    def read_start_needle(ui: Ui_Options, machine: Machine) -> int:
-        """Read the start needle prefs from UI and normalize"""
-        start_needle_col = NeedleColor(ui.start_needle_color.currentIndex())
-        start_needle_text = ui.start_needle_edit.value()
-        return start_needle_col.read(start_needle_text, machine)
-
-    @staticmethod
-    def read_stop_needle(ui: Ui_Options, machine: Machine) -> int:
-        """Read the stop needle prefs from UI and normalize"""
-        stop_needle_col = NeedleColor(ui.stop_needle_color.currentIndex())
-        stop_needle_text = ui.stop_needle_edit.value()
-        return stop_needle_col.read(stop_needle_text, machine)
@@ -19,75 +19,122 @@
 #    https://github.com/AllYarnsAreBeautiful/ayab-desktop
 
 from __future__ import annotations
-from typing import cast
+from collections import OrderedDict
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Iterator, Optional, TypeAlias, cast
 from bitarray import bitarray
 import numpy as np
 import numpy.typing as npt
 from PIL import Image
-from .options import Alignment, OptionsTab
+from .knit_options import Alignment
 from .mode import Mode
 from ..machine import Machine
 
+if TYPE_CHECKING:
+    from .knit_options import KnitOptions
+    from .options import OptionsTab
 
-class Pattern(object):
-    def __init__(self, image: Image.Image, config: OptionsTab, num_colors: int = 2):
-        self.__pattern = (
-            image.transpose(Image.FLIP_LEFT_RIGHT) if config.auto_mirror else image
-        )
+
+def array2rgb(a: list[int]) -> int:
+    return (a[0] & 0xFF) * 0x10000 + (a[1] & 0xFF) * 0x100 + (a[2] & 0xFF)
+
+
+class ExpandedRows(object):
+    """
+    Lazily expanded color rows of a color-indexed image.
+
+    Row `(num_colors * row) + color` selects the pixels of `row` that are
+    knitted in `color`, one bit per pixel. A row is only
+    computed the first time it is requested, and a bounded window of the
+    most recently used rows is kept, so memory does not grow with the
+    height of the pattern times the number of colors. Rows may be requested
+    from several threads.
+    """
+
+    WINDOW = 256
+
+    def __init__(
+        self, pixels: npt.NDArray[np.uint8], num_colors: int, window: int = WINDOW
+    ):
+        self.__pixels = pixels
         self.__num_colors = num_colors
-        self.__alignment = Alignment.CENTER
-        self.__pat_start_needle: int = -1
-        self.__pat_end_needle: int = -1
-        self.__knit_start_needle: int = 0
-        self.__mode: Mode = config.mode
-        self.__knit_end_needle: int = config.machine.width
-        self.__update_pattern_data()
+        self.__width = pixels.shape[1]
+        self.__length = num_colors * pixels.shape[0]
+        self.__window = window
+        self.__rows: OrderedDict[int, bitarray] = OrderedDict()
+        self.__lock = threading.Lock()
 
-    def __update_pattern_data(self) -> None:
-        self.__pat_width = self.__pattern.width
-        self.__pat_height = self.__pattern.height
-        self.__convert()
-        self.__calc_pat_start_end_needles()
+    def __len__(self) -> int:
+        return self.__length
+
+    def __iter__(self) -> Iterator[bitarray]:
+        for row_index in range(self.__length):
+            yield self[row_index]
+
+    def __getitem__(self, row_index: int) -> bitarray:
+        if row_index < 0:
+            row_index += self.__length
+        with self.__lock:
+            bits = self.__rows.get(row_index)
+            if bits is not None:
+                self.__rows.move_to_end(row_index)
+                return bits
+        # else
+        if not (0 <= row_index < self.__length):
+            raise IndexError("row index out of range")
+        row, color = divmod(row_index, self.__num_colors)
+        bits = bitarray()
+        bits.frombytes(np.packbits(self.__pixels[row] == color).tobytes())
+        del bits[self.__width :]
+        with self.__lock:
+            self.__rows[row_index] = bits
+            if len(self.__rows) > self.__window:
+                self.__rows.popitem(last=False)
+        return bits
+
+    @property
+    def cached_rows(self) -> int:
+        return len(self.__rows)
+
+
+class ColorSeparation(object):
+    """
+    Color-separated image data of a pattern.
 
-    def __convert(self) -> None:
-        # num_colors = self.__num_colors
-        # pat_width = self.__pat_width
-        # pat_height = self.__pat_height
-
-        self.__pattern_intern = [
-            [0 for i in range(self.__pat_width)] for j in range(self.__pat_height)
-        ]
-        self.__pattern_colors = [
-            [0 for i in range(self.__num_colors)] for j in range(self.__pat_height)
-        ]  # unused
-        self.__pattern_expanded = [
-            bitarray(self.__pat_width)
-            for j in range(self.__num_colors * self.__pat_height)
-        ]
+    This only depends on the image and the number of colors and knitting mode,
+    not on the needles the pattern is placed on, so it is computed once and
+    shared by all placements of the pattern.
+    """
+
+    def __init__(self, image: Image.Image, num_colors: int, mode: Mode):
+        self.__num_colors = num_colors
+        self.__width = image.width
+        self.__height = image.height
 
         # Limit number of colors in pattern
-        # self.__pattern = self.__pattern.quantize(num_colors, dither=None)
-        self.__pattern = self.__pattern.quantize(self.__num_colors)
+        # image = image.quantize(num_colors, dither=None)
+        image = image.quantize(num_colors)
 
         # Order colors most-frequent first
         # NB previously they were ordered lightest-first
-        histogram = self.__pattern.histogram()
-        if self.__mode != Mode.SINGLEBED:
-            dest_map = list(np.argsort(histogram[0 : self.__num_colors]))
+        histogram = image.histogram()
+        if mode != Mode.SINGLEBED:
+            dest_map = list(np.argsort(histogram[0:num_colors]))
         else:
             # For single bed, leave the colors as is but
-            # map them down to [0:__num_colors]
+            # map them down to [0:num_colors]
             # https://pillow.readthedocs.io/en/stable/reference/Image.html#PIL.Image.Image.remap_palette
             # `list(range(256))` is the identity tranform
-            dest_map = list(range(self.__num_colors))
+            dest_map = list(range(num_colors))
 
         # reverse it to get to zero as the first color
         dest_map.reverse()
-        self.__pattern = self.__pattern.remap_palette(dest_map)
+        image = image.remap_palette(dest_map)
 
         # reduce number of colors if necessary
-        actual_num_colors = sum(map(lambda x: x > 0, self.__pattern.histogram()))
-        if actual_num_colors < self.__num_colors:
+        actual_num_colors = sum(map(lambda x: x > 0, image.histogram()))
+        if actual_num_colors < num_colors:
             # TODO: issue warning if number of colors is less than expected
             # TODO: reduce number of colors
             # self.__num_colors = num_colors = actual_num_colors
@@ -95,26 +142,62 @@ class Pattern(object):
             pass
 
         # get palette
-        rgb = self.__pattern.getpalette()[
-            slice(0, 3 * self.__num_colors)
-        ]  # type: ignore
-        col_array = cast(npt.NDArray[np.int_], np.reshape(rgb, (self.__num_colors, 3)))
-        self.palette = list(map(self.array2rgb, col_array))
+        rgb = image.getpalette()[slice(0, 3 * num_colors)]  # type: ignore
+        col_array = cast(npt.NDArray[np.int_], np.reshape(rgb, (num_colors, 3)))
+        self.palette = list(map(array2rgb, col_array))
 
         # Make internal representations of pattern
-        for row in range(self.__pat_height):
-            for col in range(self.__pat_width):
-                pxl = self.__pattern.getpixel((col, row))
-                for color in range(self.__num_colors):
-                    if pxl == color:
-                        # color map
-                        self.__pattern_intern[row][col] = color
-                        # amount of bits per color per line
-                        self.__pattern_colors[row][color] += 1
-                        # colors separated per line
-                        self.__pattern_expanded[(self.__num_colors * row) + color][
-                            col
-                        ] = True
+        # color map
+        self.__pattern_intern = np.asarray(image)
+        # colors separated per line, expanded when requested
+        self.__pattern_expanded = ExpandedRows(self.__pattern_intern, num_colors)
+
+    @property
+    def num_colors(self) -> int:
+        return self.__num_colors
+
+    @property
+    def width(self) -> int:
+        return self.__width
+
+    @property
+    def height(self) -> int:
+        return self.__height
+
+    @property
+    def pattern_expanded(self) -> ExpandedRows:
+        return self.__pattern_expanded
+
+
+class Pattern(object):
+    def __init__(
+        self,
+        image: Image.Image,
+        config: OptionsTab | KnitOptions,
+        num_colors: int = 2,
+        separation: Optional[ColorSeparation] = None,
+    ):
+        self.__image = image
+        self.__auto_mirror = config.auto_mirror
+        self.__mode: Mode = config.mode
+        self.__alignment = Alignment.CENTER
+        self.__pat_start_needle: int = -1
+        self.__pat_end_needle: int = -1
+        self.__knit_start_needle: int = 0
+        self.__knit_end_needle: int = config.machine.width
+        if separation is None:
+            self.__separate_colors(num_colors)
+        else:
+            # reuse the color separation of an identical pattern
+            self.__separation = separation
+            self.__calc_pat_start_end_needles()
+
+    def __separate_colors(self, num_colors: int) -> None:
+        image = self.__image
+        if self.__auto_mirror:
+            image = image.transpose(Image.FLIP_LEFT_RIGHT)
+        self.__separation = ColorSeparation(image, num_colors, self.__mode)
+        self.__calc_pat_start_end_needles()
 
     def __calc_pat_start_end_needles(self) -> bool:
         if self.__alignment == Alignment.CENTER:
@@ -122,13 +205,13 @@ class Pattern(object):
             self.__pat_start_needle = (
                 self.__knit_start_needle + (needle_width - self.pat_width + 1) // 2
             )
-            self.__pat_end_needle = self.__pat_start_needle + self.__pat_width
+            self.__pat_end_needle = self.__pat_start_needle + self.pat_width
         elif self.__alignment == Alignment.LEFT:
             self.__pat_start_needle = self.__knit_start_needle
-            self.__pat_end_needle = self.__pat_start_needle + self.__pat_width
+            self.__pat_end_needle = self.__pat_start_needle + self.pat_width
         elif self.__alignment == Alignment.RIGHT:
             self.__pat_end_needle = self.__knit_end_needle
-            self.__pat_start_needle = self.__pat_end_needle - self.__pat_width
+            self.__pat_start_needle = self.__pat_end_needle - self.pat_width
         else:
             return False
         return True
@@ -142,11 +225,11 @@ class Pattern(object):
         if knit_start < knit_stop and knit_start >= 0 and knit_stop < machine.width:
             self.__knit_start_needle = knit_start
             self.__knit_end_needle = knit_stop + 1
-        self.__update_pattern_data()
+        self.__calc_pat_start_end_needles()
 
     @property
     def num_colors(self) -> int:
-        return self.__num_colors
+        return self.__separation.num_colors
 
     @num_colors.setter
     def num_colors(self, num_colors: int) -> None:
@@ -155,8 +238,7 @@ class Pattern(object):
         """
         # TODO use preferences or other options to set maximum number of colors
         if num_colors > 1 and num_colors < 7:
-            self.__num_colors = num_colors
-            self.__update_pattern_data()
+            self.__separate_colors(num_colors)
 
     @property
     def alignment(self) -> Alignment:
@@ -168,7 +250,7 @@ class Pattern(object):
         set the position of the pattern
         """
         self.__alignment = alignment
-        self.__update_pattern_data()
+        self.__calc_pat_start_end_needles()
 
     @property
     def pat_start_needle(self) -> int:
@@ -188,15 +270,75 @@ class Pattern(object):
 
     @property
     def pat_height(self) -> int:
-        return self.__pat_height
+        return self.__separation.height
 
     @property
     def pat_width(self) -> int:
-        return self.__pat_width
+        return self.__separation.width
 
     @property
-    def pattern_expanded(self) -> list[bitarray]:
-        return self.__pattern_expanded
+    def palette(self) -> list[int]:
+        return self.__separation.palette
+
+    @property
+    def separation(self) -> ColorSeparation:
+        return self.__separation
+
+    @property
+    def pattern_expanded(self) -> ExpandedRows:
+        return self.__separation.pattern_expanded
+
+    def expanded_row(self, row_index: int) -> bitarray:
+        """
+        Return the needles of one color of one row, see `ExpandedRows`.
+        """
+        return self.__separation.pattern_expanded[row_index]
+
+
+PatternKey: TypeAlias = tuple[str, int, Mode, bool]
+
+
+class PatternCache(object):
+    """
+    Bounded LRU cache of color separations.
+
+    Entries are keyed by a hash of the image content and the options that
+    change the color separation, so that knitting the same image again
+    reuses the separation instead of quantizing the image again.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        self.__maxsize = maxsize
+        self.__separations: OrderedDict[PatternKey, ColorSeparation] = OrderedDict()
+
+    @staticmethod
+    def key(image: Image.Image, config: OptionsTab | KnitOptions) -> PatternKey:
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode} {image.width}x{image.height}".encode())
+        if image.mode == "P":
+            digest.update(bytes(image.getpalette() or []))
+        digest.update(image.tobytes())
+        return digest.hexdigest(), config.num_colors, config.mode, config.auto_mirror
+
+    def pattern(self, image: Image.Image, config: OptionsTab | KnitOptions) -> Pattern:
+        """
+        Return a new pattern for the image, reusing a cached color separation
+        if there is one.
+        """
+        key = self.key(image, config)
+        separation = self.__separations.get(key)
+        if separation is not None:
+            self.__separations.move_to_end(key)
+            return Pattern(image, config, config.num_colors, separation)
+        # else
+        pattern = Pattern(image, config, config.num_colors)
+        self.__separations[key] = pattern.separation
+        if len(self.__separations) > self.__maxsize:
+            self.__separations.popitem(last=False)
+        return pattern
+
+    def clear(self) -> None:
+        self.__separations.clear()
 
-    def array2rgb(self, a: list[int]) -> int:
-        return (a[0] & 0xFF) * 0x10000 + (a[1] & 0xFF) * 0x100 + (a[2] & 0xFF)
+    def __len__(self) -> int:
+        return len(self.__separations)
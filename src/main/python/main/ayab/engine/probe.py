@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""
+Detection of AYAB devices.
+
+`DeviceProber` opens all candidate ports at the same time, sends `reqInfo`
+to each of them, and ranks the devices that answer by their API and
+firmware versions, so that the right port can be preselected.
+
+Opening a serial port usually resets the Arduino, and its bootloader delays
+the answer by a second or so. The versions are therefore cached by the
+serial number of the USB adapter, and a port whose adapter is known is not
+opened again.
+
+A websocket bridge is first asked for the versions it last read from the
+device, on its monitor path, so that probing does not take over the serial
+port from a client using it or from a session that may resume. Only a bridge
+whose serial port is free, or that does not answer, is probed like a serial
+port.
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import serial
+import serial.tools.list_ports
+
+from .communication import Communication, Transport
+from .control import Control
+from .messages import CnfInfo, decode_message
+from .websocketserial import MONITOR_PATH, WebsocketSerial
+
+
+def usb_serial_number(portname: str) -> Optional[str]:
+    """The serial number of the USB adapter of a serial port, if any."""
+    for port in serial.tools.list_ports.comports():
+        if port.device == portname:
+            return port.serial_number
+    # else
+    return None
+
+
+class DeviceInfo(object):
+    """The versions reported by a device in its `cnfInfo` message."""
+
+    def __init__(self, msg: CnfInfo):
+        self.api_version = msg.api_version
+        self.firmware_version = msg.firmware_version
+        self.supported = self.api_version >= Control.FIRST_SUPPORTED_API_VERSION
+        # newer API and firmware first, releases before pre-releases
+        self.rank = (
+            self.supported,
+            self.api_version,
+            msg.fw_major,
+            msg.fw_minor,
+            msg.fw_patch,
+            not msg.fw_suffix,
+        )
+
+    def __str__(self) -> str:
+        text = "API v" + str(self.api_version)
+        if self.api_version >= 5:
+            text += ", FW v" + self.firmware_version
+        return text
+
+
+class DeviceProber(object):
+    """Finds the ports with an AYAB device behind them."""
+
+    BAUD_RATE = 115200
+    RETRY_INTERVAL = 0.1  # seconds between `reqInfo` requests
+    TIMEOUT = 2.0  # seconds, enough for the bootloader of an Arduino
+    BRIDGE_TIMEOUT = 0.5  # seconds to wait for a bridge to tell the versions
+
+    def __init__(
+        self,
+        serial_number: Callable[[str], Optional[str]] = usb_serial_number,
+    ):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.__serial_number = serial_number
+        self.__cache: dict[str, DeviceInfo] = {}
+        self.__lock = threading.Lock()
+
+    def probe(self, portnames: list[str]) -> list[tuple[str, DeviceInfo]]:
+        """
+        Probe the ports in parallel, and return the ports with a device
+        and its versions, best first.
+        """
+        if len(portnames) == 0:
+            return []
+        # else
+        with ThreadPoolExecutor(
+            max_workers=len(portnames), thread_name_prefix="AyabProbe"
+        ) as executor:
+            infos = list(executor.map(self.probe_port, portnames))
+        devices = [
+            (portname, info)
+            for portname, info in zip(portnames, infos)
+            if info is not None
+        ]
+        devices.sort(key=lambda device: device[1].rank, reverse=True)
+        return devices
+
+    def probe_port(self, portname: str) -> Optional[DeviceInfo]:
+        """The versions of the device on a port, from the cache if known."""
+        key = None
+        if not portname.startswith("ws://"):
+            key = self.__serial_number(portname)
+        if key is not None:
+            with self.__lock:
+                info = self.__cache.get(key)
+            if info is not None:
+                return info
+        # else
+        info = self.__request_info(portname)
+        if info is not None:
+            self.logger.info("Found device on " + portname + ": " + str(info))
+            if key is not None:
+                with self.__lock:
+                    self.__cache[key] = info
+        return info
+
+    def forget(self, portname: str) -> None:
+        """Drop the cached versions of the device on a port."""
+        key = self.__serial_number(portname)
+        if key is not None:
+            with self.__lock:
+                self.__cache.pop(key, None)
+
+    def __request_info(self, portname: str) -> Optional[DeviceInfo]:
+        if portname.startswith("ws://"):
+            reply = self.__ask_bridge(portname)
+            if reply is not None:
+                msg = None
+                if reply.get("cnfInfo"):
+                    msg = decode_message(bytes.fromhex(reply["cnfInfo"]))
+                if isinstance(msg, CnfInfo):
+                    return DeviceInfo(msg)
+                if reply.get("busy"):
+                    self.logger.debug(portname + " is in use")
+                    return None
+        # else
+        ser: Transport
+        try:
+            if portname.startswith("ws://"):
+                ser = WebsocketSerial(portname, timeout=0.1, reconnect_timeout=0)
+            else:
+                ser = serial.Serial(
+                    portname, self.BAUD_RATE, timeout=0.1, exclusive=True
+                )
+        except Exception as e:
+            # missing, or in use
+            self.logger.debug("Could not open " + portname + ": " + str(e))
+            return None
+        # else
+        com = Communication(ser)
+        try:
+            deadline = time.monotonic() + self.TIMEOUT
+            last_request = 0.0
+            while time.monotonic() < deadline:
+                if time.monotonic() - last_request > self.RETRY_INTERVAL:
+                    com.req_info()
+                    last_request = time.monotonic()
+                msg = com.update_API6()
+                if isinstance(msg, CnfInfo):
+                    return DeviceInfo(msg)
+            return None
+        except Exception as e:
+            self.logger.debug("Error probing " + portname + ": " + str(e))
+            return None
+        finally:
+            com.close_serial()
+
+    def __ask_bridge(self, portname: str) -> Optional[dict[str, Any]]:
+        """
+        Ask a bridge for the `cnfInfo` message it last read from the device,
+        without taking over its serial port. Return `None` if it does not answer.
+        """
+        try:
+            ser = WebsocketSerial(
+                portname + MONITOR_PATH, timeout=0.1, reconnect_timeout=0
+            )
+        except Exception as e:
+            self.logger.debug("Could not open " + portname + ": " + str(e))
+            return None
+        # else
+        try:
+            return ser.request({"type": "info"}, self.BRIDGE_TIMEOUT)
+        except Exception as e:
+            self.logger.debug("Error asking " + portname + ": " + str(e))
+            return None
+        finally:
+            ser.close()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Serves the firmware emulator on a pseudo-terminal.
+
+`PtyEmulator` runs a `FirmwareEmulator` on the master side of a
+pseudo-terminal, and the real `Communication` stack opens the slave side
+like a serial port. Pseudo-terminals only exist on POSIX systems, so this
+module is kept apart from the emulator itself.
+
+From `src/main/python/main` run:
+
+`python -m ayab.engine.pty_emulator [--speed NEEDLES_PER_SECOND]`
+
+and select the port name it prints.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import select
+import threading
+import time
+import tty
+from typing import Optional
+
+from .emulator import FirmwareEmulator
+
+
+class PtyEmulator(object):
+    """Serves a `FirmwareEmulator` on a pseudo-terminal."""
+
+    def __init__(self, emulator: FirmwareEmulator):
+        self.emulator = emulator
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.port = os.ttyname(self.__slave)
+        self.emulator.write = self.__write
+        self.__stop = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__lock = threading.Lock()
+
+    def __write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while len(view) > 0:
+            written = os.write(self.__master, view)
+            view = view[written:]
+
+    def start(self) -> None:
+        self.__thread = threading.Thread(
+            target=self.run, name="AyabEmulator", daemon=True
+        )
+        self.__thread.start()
+
+    def run(self) -> None:
+        while not self.__stop.is_set():
+            now = time.monotonic()
+            with self.__lock:
+                due = self.emulator.advance(now)
+            timeout = 0.1 if due is None else max(0.0, min(0.1, due - now))
+            readable, _, _ = select.select([self.__master], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self.__master, 4096)
+                except OSError:
+                    # no process has the port open
+                    time.sleep(timeout)
+                    continue
+                with self.__lock:
+                    self.emulator.feed(data, time.monotonic())
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        os.close(self.__master)
+        os.close(self.__slave)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=FirmwareEmulator.DEFAULT_SPEED,
+        help="carriage speed in needles per second, 0 for no delay",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = PtyEmulator(FirmwareEmulator(args.speed))
+    print(f"AYAB firmware emulator listening on {server.port}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
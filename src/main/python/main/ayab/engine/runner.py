@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Runs the operations of the knitting controller step by step.
+
+`Runner` holds the loop shared by the engine of the GUI and by the
+knitting sessions that run without it: `begin` starts the `Control`,
+`step` operates it once and reports what changed, and `finish` closes
+the connection. Subclasses report the output and the status in their
+own way.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+from wakepy import keep
+
+from .async_driver import AsyncDriver
+from .engine_fsm import Operation, State
+from .output import Output
+
+if TYPE_CHECKING:
+    from .control import Control
+    from .knit_options import KnitOptions
+    from .options import OptionsTab
+    from .pattern import Pattern
+
+
+class Runner(object):
+    """
+    Runs operations of a `Control` on the calling thread.
+
+    With `event_driven`, `run` lets an `AsyncDriver` step the controller
+    when the device has sent something, instead of polling it.
+    """
+
+    control: Control
+    config: OptionsTab | KnitOptions
+    pattern: Pattern
+
+    __canceled = False
+    __driver: Optional[AsyncDriver] = None
+
+    @property
+    def event_driven(self) -> bool:
+        return False
+
+    @property
+    def canceled(self) -> bool:
+        return self.__canceled
+
+    def run(self, operation: Operation) -> None:
+        """Run an operation to completion."""
+        if self.event_driven:
+            # only step when the device has sent something
+            self.__driver = AsyncDriver(self)
+            try:
+                self.__driver.run(operation)
+            finally:
+                self.__driver = None
+            return
+        # else
+        with keep.presenting(on_fail="pass"):
+            self.begin(operation)
+            try:
+                while not self.step(operation):
+                    # continue operating
+                    pass
+            finally:
+                self.finish(operation)
+
+    def begin(self, operation: Operation) -> None:
+        """Set up the knitting controller for an operation."""
+        self.__canceled = False
+        self.control.start(self.pattern, self.config, operation)
+
+    def step(self, operation: Operation) -> bool:
+        """
+        Operate the state machine once, and return `True` when the operation
+        is over.
+        """
+        # typically each step involves some communication with the device
+        output = self.control.operate(operation)
+        if output != self.control.notification:
+            self.handle_output(output)
+            self.control.notification = output
+        if operation == Operation.KNIT:
+            self.handle_status()
+        return self.__canceled or self.control.state == State.FINISHED
+
+    def finish(self, operation: Operation) -> None:
+        """Close the connection."""
+        self.control.stop()
+
+    def handle_output(self, output: Output) -> None:
+        """Report a new output of the state machine."""
+        pass
+
+    def handle_status(self) -> None:
+        """Report the status after a step of knitting."""
+        pass
+
+    def cancel(self) -> None:
+        """Cancel the operation. May be called from any thread."""
+        self.__canceled = True
+        driver = self.__driver
+        if driver is not None:
+            driver.wake()
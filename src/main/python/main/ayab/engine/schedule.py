@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+from __future__ import annotations
+from math import lcm
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from .mode import Mode, ModeFunc
+
+if TYPE_CHECKING:
+    from .mode import ModeFuncType, ModeTuple
+
+
+class _ScheduleParams(object):
+    """Knitting parameters that the `ModeFunc` methods are evaluated with."""
+
+    def __init__(
+        self,
+        mode: Mode,
+        num_colors: int,
+        start_row: int,
+        pat_height: int,
+        inf_repeat: bool,
+    ):
+        self.inf_repeat = inf_repeat
+        self.len_pat_expanded = pat_height * num_colors
+        self.num_colors = num_colors
+        self.passes_per_row = mode.row_multiplier(num_colors)
+        self.pat_height = pat_height
+        self.pat_row = 0
+        self.start_row = start_row
+
+
+class KnitSchedule(object):
+    """
+    Pass sequence of a knitting job, compiled into lookup tables.
+
+    For every line number, the arrays `color`, `row_index`, `blank_line`
+    and `last_line` hold the result of the `ModeFunc` method of the
+    knitting mode, and `pat_row` the pattern row that the line belongs to.
+
+    Without infinite repeat the tables cover the job from the start row
+    to the last line. With infinite repeat they cover one period of the
+    pass sequence, and line numbers wrap around it.
+    """
+
+    def __init__(
+        self,
+        mode: Mode,
+        num_colors: int,
+        start_row: int,
+        pat_height: int,
+        inf_repeat: bool,
+    ):
+        self.mode = mode
+        self.num_colors = num_colors
+        self.start_row = start_row
+        self.pat_height = pat_height
+        self.inf_repeat = inf_repeat
+        params = _ScheduleParams(mode, num_colors, start_row, pat_height, inf_repeat)
+        passes_per_row = params.passes_per_row
+        if inf_repeat:
+            # Besides the pattern height, the mode functions depend on the
+            # line number modulo 4, twice the number of colors, and twice
+            # the number of passes per row.
+            length = lcm(
+                passes_per_row * pat_height, 4, 2 * num_colors, 2 * passes_per_row
+            )
+        else:
+            length = max(0, passes_per_row * (pat_height - start_row))
+
+        self.color = np.zeros(length, dtype=np.uint8)
+        self.row_index = np.zeros(length, dtype=np.int32)
+        self.blank_line = np.zeros(length, dtype=np.bool_)
+        self.last_line = np.zeros(length, dtype=np.bool_)
+        self.pat_row = np.zeros(length, dtype=np.int32)
+
+        mode_func: ModeFuncType = getattr(ModeFunc, mode.knit_func(num_colors))
+        for line_number in range(length):
+            color, row_index, blank_line, last_line = mode_func(params, line_number)
+            self.color[line_number] = color
+            self.row_index[line_number] = row_index
+            self.blank_line[line_number] = blank_line
+            self.last_line[line_number] = last_line
+            self.pat_row[line_number] = params.pat_row
+
+    def __len__(self) -> int:
+        return len(self.color)
+
+    def index(self, line_number: int) -> int:
+        """Return the position of a line number in the tables."""
+        if self.inf_repeat:
+            return line_number % len(self)
+        # else
+        return line_number
+
+    def line(self, line_number: int) -> ModeTuple:
+        """Return `(color, row_index, blank_line, last_line)` of a line."""
+        i = self.index(line_number)
+        return (
+            int(self.color[i]),
+            int(self.row_index[i]),
+            bool(self.blank_line[i]),
+            bool(self.last_line[i]),
+        )
+
+    def row(self, line_number: int) -> int:
+        """Return the pattern row of a line."""
+        return int(self.pat_row[self.index(line_number)])
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Knitting sessions on several machines at once.
+
+Each `KnitSession` has its own `Control`, connection, status and retry
+timer, and runs on its own thread like the knitting thread of the GUI.
+`SessionManager` starts, cancels and waits for the sessions of one
+operator station, and passes the status of every session to a listener.
+Neither needs Qt.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .clock import SYSTEM_CLOCK, Clock
+from .communication import Transport
+from .control import Control
+from .engine_fsm import Operation
+from .output import Output
+from .pattern import Pattern
+from .runner import Runner
+from .status import Status
+
+if TYPE_CHECKING:
+    from ..signal_receiver import SignalReceiver
+    from .capture import CaptureRecorder
+    from .knit_options import KnitOptions
+    from .options import OptionsTab
+
+
+class KnitSession(Runner):
+    """
+    A knitting job on one machine.
+
+    The session stands in for both the main window and the engine of its
+    `Control`: it holds the signal receiver, if any, and the status. After
+    every step that changes the output, the line or the carriage, a copy
+    of the status is passed to `listener`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pattern: Pattern,
+        options: OptionsTab | KnitOptions,
+        signal_receiver: Optional[SignalReceiver] = None,
+        clock: Clock = SYSTEM_CLOCK,
+        transport: Optional[Transport] = None,
+        listener: Optional[Callable[[KnitSession, Status], None]] = None,
+        recorder: Optional[CaptureRecorder] = None,
+    ):
+        self.logger = logging.getLogger(type(self).__name__ + "." + name)
+        self.name = name
+        self.pattern = pattern
+        self.config = options
+        self.signal_receiver = signal_receiver
+        self.status = Status()
+        self.listener = listener
+        self.control = Control(self, self, clock, transport, recorder)
+        self.output = Output.NONE
+        self.error: Optional[Exception] = None
+        self.finished = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__reported: Optional[tuple[Output, int, int, int]] = None
+
+    @property
+    def portname(self) -> str:
+        return self.config.portname
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and not self.finished.is_set()
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            raise RuntimeError(f"Session {self.name} was already started")
+        # else
+        self.__thread = threading.Thread(
+            target=self.run, name="KnitSession-" + self.name, daemon=True
+        )
+        self.__thread.start()
+
+    def run(self, operation: Operation = Operation.KNIT) -> None:
+        """Run the knitting job to completion on the calling thread."""
+        try:
+            super().run(operation)
+        except Exception as e:
+            self.logger.exception("Knitting session failed")
+            self.error = e
+        self.finished.set()
+        self.handle_status()
+        if self.canceled:
+            self.logger.info("Knitting canceled.")
+        elif self.error is None:
+            self.logger.info("Finished knitting.")
+
+    def handle_output(self, output: Output) -> None:
+        self.logger.info(output.name)
+        self.output = output
+
+    def handle_status(self) -> None:
+        if self.listener is None:
+            return
+        # else
+        status = self.status
+        key = (
+            self.output,
+            status.line_number,
+            status.carriage_position,
+            int(self.finished.is_set()),
+        )
+        if key == self.__reported:
+            return
+        # else
+        self.__reported = key
+        status_copy = Status()
+        status_copy.copy(status)
+        self.listener(self, status_copy)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the session to end, return whether it has."""
+        return self.finished.wait(timeout)
+
+
+class SessionManager(object):
+    """
+    Runs knitting sessions on several machines in parallel.
+
+    Sessions are identified by name, and no two sessions may use the same
+    port, except for the simulation. Sessions run without the GUI have no
+    signal receiver, and can only knit.
+    """
+
+    def __init__(
+        self,
+        listener: Optional[Callable[[KnitSession, Status], None]] = None,
+        signal_receiver: Optional[SignalReceiver] = None,
+    ):
+        self.logger = logging.getLogger(type(self).__name__)
+        self.listener = listener
+        self.signal_receiver = signal_receiver
+        self.sessions: dict[str, KnitSession] = {}
+        self.__lock = threading.Lock()
+
+    def add(
+        self,
+        name: str,
+        pattern: Pattern,
+        options: OptionsTab | KnitOptions,
+        clock: Clock = SYSTEM_CLOCK,
+        transport: Optional[Transport] = None,
+        recorder: Optional[CaptureRecorder] = None,
+    ) -> KnitSession:
+        """Add a session, to be started with `start`."""
+        with self.__lock:
+            if name in self.sessions:
+                raise ValueError(f"Session {name} already exists")
+            # else
+            if transport is None:
+                for other in self.sessions.values():
+                    if (
+                        other.portname == options.portname
+                        and other.control.transport is None
+                        and options.portname != "Simulation"
+                    ):
+                        raise ValueError(
+                            f"Port {options.portname} is used by session {other.name}"
+                        )
+            session = KnitSession(
+                name,
+                pattern,
+                options,
+                self.signal_receiver,
+                clock,
+                transport,
+                self.listener,
+                recorder,
+            )
+            self.sessions[name] = session
+        return session
+
+    def remove(self, name: str) -> None:
+        """Remove a session that is not running."""
+        with self.__lock:
+            if self.sessions[name].running:
+                raise RuntimeError(f"Session {name} is running")
+            # else
+            del self.sessions[name]
+
+    def __select(self, name: Optional[str]) -> list[KnitSession]:
+        with self.__lock:
+            if name is None:
+                return list(self.sessions.values())
+            # else
+            return [self.sessions[name]]
+
+    def start(self, name: Optional[str] = None) -> None:
+        """Start one session, or all the sessions that have not started."""
+        for session in self.__select(name):
+            if name is not None or not (session.running or session.finished.is_set()):
+                session.start()
+
+    def cancel(self, name: Optional[str] = None) -> None:
+        """Cancel one session, or all of them."""
+        for session in self.__select(name):
+            session.cancel()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for all the sessions to end, return whether they have."""
+        sessions = self.__select(None)
+        if timeout is None:
+            for session in sessions:
+                session.wait()
+            return True
+        # else
+        deadline = SYSTEM_CLOCK.time() + timeout
+        for session in sessions:
+            if not session.wait(max(0.0, deadline - SYSTEM_CLOCK.time())):
+                return False
+        return True
+
+    @property
+    def running(self) -> list[KnitSession]:
+        return [session for session in self.__select(None) if session.running]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Simulated device on virtual time.
+
+`SimulatedSerial` connects `Communication` to a `FirmwareEmulator` in the
+same process. Instead of blocking, a read that finds no data moves a
+`VirtualClock` forward to the next event of the emulator, so a simulated
+knit takes as many virtual seconds as on the machine but finishes as fast
+as the controller can run.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from .clock import VirtualClock
+from .emulator import FirmwareEmulator
+
+
+class SimulatedSerial(object):
+    """Serial port connected to a `FirmwareEmulator` on a virtual clock."""
+
+    def __init__(
+        self,
+        emulator: Optional[FirmwareEmulator] = None,
+        clock: Optional[VirtualClock] = None,
+        timeout: float = 0.1,
+    ):
+        self.emulator = emulator or FirmwareEmulator()
+        self.emulator.write = self.__receive
+        self.clock = clock or VirtualClock()
+        self.timeout = timeout
+        self.is_open = True
+        self.__buffer = bytearray()
+
+    def __receive(self, data: bytes) -> None:
+        self.__buffer.extend(data)
+
+    @property
+    def in_waiting(self) -> int:
+        self.emulator.advance(self.clock.time())
+        return len(self.__buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        if len(self.__buffer) == 0 and self.is_open:
+            now = self.clock.time()
+            due = self.emulator.advance(now)
+            if len(self.__buffer) == 0:
+                # wait for the next event of the emulator, up to the timeout
+                if due is not None and due - now <= self.timeout:
+                    self.clock.sleep(due - now)
+                    self.emulator.advance(self.clock.time())
+                else:
+                    self.clock.sleep(self.timeout)
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        self.emulator.feed(bytes(data), self.clock.time())
+        return len(data)
+
+    def close(self) -> None:
+        self.is_open = False
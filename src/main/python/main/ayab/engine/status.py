@@ -21,13 +21,10 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Any, Literal, Optional, TypeAlias
+from typing import Literal, Optional, TypeAlias
 from bitarray import bitarray
 
-from PySide6.QtCore import QCoreApplication
-from PySide6.QtWidgets import QWidget
-
-from .status_gui import Ui_StatusTab
+from .messages import IndState
 
 
 class Direction(Enum):
@@ -92,6 +89,8 @@ class Carriage(Enum):
             text = "Garter"
         else:
             return ""
+        from PySide6.QtCore import QCoreApplication
+
         text += " " + QCoreApplication.translate("Progress", "Carriage")
         return text
 
@@ -174,30 +173,28 @@ class Status(object):
         self.carriage_position = status.carriage_position
         self.carriage_direction = status.carriage_direction
 
-    def parse_device_state_API6(self, state: Any, msg: bytes) -> None:
+    def parse_device_state_API6(self, msg: IndState) -> None:
         if not (self.active):
             return
 
         # else
-        # firmware_state = msg[2]
-
-        hall_l = int((msg[3] << 8) + msg[4])
-        hall_r = int((msg[5] << 8) + msg[6])
+        hall_l = msg.hall_l
+        hall_r = msg.hall_r
 
-        if msg[7] == 0:
+        if msg.carriage == 0:
             carriage_type = Carriage.Knit
-        elif msg[7] == 1:
+        elif msg.carriage == 1:
             carriage_type = Carriage.Lace
-        elif msg[7] == 2:
+        elif msg.carriage == 2:
             carriage_type = Carriage.Garter
         else:
             carriage_type = Carriage.Unknown
 
-        carriage_position = int(msg[8])
+        carriage_position = msg.position
 
-        if msg[9] == 0:
+        if msg.direction == 0:
             carriage_direction = Direction.Left
-        elif msg[9] == 1:
+        elif msg.direction == 1:
             carriage_direction = Direction.Right
         else:
             carriage_direction = Direction.Unknown
@@ -207,36 +204,3 @@ class Status(object):
         self.carriage_type = carriage_type
         self.carriage_position = carriage_position
         self.carriage_direction = carriage_direction
-        print(carriage_type)
-        print(carriage_direction)
-
-
-# FIXME translations for UI
-class StatusTab(Status, QWidget):
-    """
-    Class for the status tab of the dock widget, implemented as a subclass
-    of `QWidget`.
-
-    @author Tom Price
-    @date   July 2020
-    """
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.ui = Ui_StatusTab()
-        self.ui.setupUi(self)
-
-    def refresh(self) -> None:
-        pass  # TODO
-
-    def write_carriage_info(self, status: Status) -> None:
-        if not (self.active):
-            return
-        # else
-        self.ui.progress_hall_l.setValue(status.hall_l)
-        self.ui.label_hall_l.setText(str(status.hall_l))
-        self.ui.progress_hall_r.setValue(status.hall_r)
-        self.ui.label_hall_r.setText(str(status.hall_r))
-        self.ui.slider_position.setValue(status.carriage_position)
-        self.ui.label_carriage.setText(status.carriage_type.text)
-        self.ui.label_direction.setText(status.carriage_direction.text)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+from __future__ import annotations
+
+from PySide6.QtWidgets import QWidget
+
+from .status import Status
+from .status_gui import Ui_StatusTab
+
+
+# FIXME translations for UI
+class StatusTab(Status, QWidget):
+    """
+    Class for the status tab of the dock widget, implemented as a subclass
+    of `QWidget`.
+
+    @author Tom Price
+    @date   July 2020
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.ui = Ui_StatusTab()
+        self.ui.setupUi(self)
+
+    def refresh(self) -> None:
+        pass  # TODO
+
+    def write_carriage_info(self, status: Status) -> None:
+        if not (self.active):
+            return
+        # else
+        self.ui.progress_hall_l.setValue(status.hall_l)
+        self.ui.label_hall_l.setText(str(status.hall_l))
+        self.ui.progress_hall_r.setValue(status.hall_r)
+        self.ui.label_hall_r.setText(str(status.hall_r))
+        self.ui.slider_position.setValue(status.carriage_position)
+        self.ui.label_carriage.setText(status.carriage_type.text)
+        self.ui.label_direction.setText(status.carriage_direction.text)
@@ -1,62 +1,309 @@
 import contextlib
+import json
+import logging
 import websockets.exceptions
 import websockets.protocol
 import websockets.sync.client
 import threading
+import time
+import uuid
+from typing import Any
 
 
 """Handles the serial communication protocol over a websocket.
 
 This modules exposes an interface compatible with the Serial class
 for websocket communication.
+
+A background thread receives the websocket messages into a ring buffer,
+so that reading never waits on the socket and never holds up writes from
+other threads.
+
+When the connection drops without a closing handshake, the same thread
+reconnects with exponential backoff. Every connection carries the same
+session header, so that the bridge can hand the serial port over from the
+stale connection to the new one. Writes wait for the connection to come
+back, and `reconnects` counts the reconnections, so that the protocol
+layer can resend what may have been lost.
+
+Binary messages carry the serial data. Text messages carry JSON control
+messages with a "type" key, such as the upload of a job to the bridge
+(see `ayab.engine.edge`), and their replies.
 """
 
+# must match the bridge in utils/websocket2serial.py
+SESSION_HEADER = "X-Ayab-Session"
+MONITOR_PATH = "/monitor"
+
+
+class RingBuffer:
+    """
+    Byte FIFO on a fixed `bytearray` that wraps around, so that neither
+    appending nor consuming data copies what is left in the buffer.
+    The capacity doubles when the buffer is full.
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def write(self, data: bytes | bytearray | memoryview) -> None:
+        size = len(data)
+        if self._length + size > len(self._buffer):
+            self._grow(self._length + size)
+        capacity = len(self._buffer)
+        end = (self._start + self._length) % capacity
+        first = min(size, capacity - end)
+        self._view[end : end + first] = data[:first]
+        if first < size:
+            self._view[: size - first] = data[first:]
+        self._length += size
+
+    def read(self, size: int) -> bytes:
+        size = min(size, self._length)
+        capacity = len(self._buffer)
+        first = min(size, capacity - self._start)
+        data = bytes(self._view[self._start : self._start + first])
+        if first < size:
+            data += self._view[: size - first]
+        self._start = (self._start + size) % capacity
+        self._length -= size
+        return data
+
+    def clear(self) -> None:
+        self._start = 0
+        self._length = 0
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._buffer)
+        while capacity < needed:
+            capacity *= 2
+        data = self.read(self._length)
+        self._view.release()
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._length = 0
+        self.write(data)
+
 
 class WebsocketSerial:
-    def __init__(self, uri: str, timeout: float | None):
+    RECEIVE_TIMEOUT = 0.1
+    RECONNECT_DELAY = 0.1
+    RECONNECT_MAX_DELAY = 5.0
+    RECONNECT_TIMEOUT = 60.0
+
+    def __init__(
+        self,
+        uri: str,
+        timeout: float | None,
+        reconnect_timeout: float = RECONNECT_TIMEOUT,
+    ):
+        self.logger = logging.getLogger(type(self).__name__)
+        self._uri = uri
+        self._session = uuid.uuid4().hex
+        self._ws = self._connect(uri)
+        self._timeout = timeout
+        self._reconnect_timeout = reconnect_timeout
+        self._reconnects = 0
+        self._rxbuffer = RingBuffer()
+        # protects the receive buffer
+        self._rx_ready = threading.Condition()
+        # serializes writes, independently of reads
+        self._tx_lock = threading.Lock()
+        # signals changes of the connection
+        self._link = threading.Condition()
+        self._closed = False
+        # pending reads, and whether `cancel_read` ended them
+        self._readers = 0
+        self._canceled = False
+        # latest reply of each type of control message
+        self._replies: dict[str, dict[str, Any]] = {}
+        self._receiver = threading.Thread(
+            target=self._receive, name="WebsocketSerialReceiver", daemon=True
+        )
+        self._receiver.start()
+
+    def _connect(self, uri: str) -> websockets.sync.client.ClientConnection:
         try:
-            self._ws = websockets.sync.client.connect(uri)
+            return websockets.sync.client.connect(
+                uri,
+                additional_headers={SESSION_HEADER: self._session},
+                open_timeout=self.RECONNECT_MAX_DELAY,
+            )
         except Exception as e:
             raise ConnectionError(f"Failed to connect to websocket {uri}: {e}") from e
-        self._timeout = timeout
-        self._rxbuffer = b""
-        self._lock = threading.Lock()
+
+    def _receive(self) -> None:
+        """Move incoming messages into the receive buffer until closed."""
+        while not self._closed:
+            try:
+                data = self._ws.recv(self.RECEIVE_TIMEOUT)
+            except TimeoutError:
+                continue
+            except websockets.exceptions.ConnectionClosedOK:
+                # closed by either side on purpose
+                break
+            except Exception:
+                # connection dropped
+                if self._reconnect():
+                    continue
+                break
+            if isinstance(data, str):
+                self._receive_text(data)
+                continue
+            # else
+            with self._rx_ready:
+                self._rxbuffer.write(data)
+                self._rx_ready.notify_all()
+        with self._link:
+            self._closed = True
+            self._link.notify_all()
+        with self._rx_ready:
+            self._rx_ready.notify_all()
+
+    def _receive_text(self, text: str) -> None:
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or "type" not in message:
+            self.logger.warning(f"Message from the bridge: {text}")
+            return
+        # else
+        with self._rx_ready:
+            self._replies[message["type"]] = message
+            self._rx_ready.notify_all()
+
+    def _reconnect(self) -> bool:
+        """
+        Try to connect again, waiting longer after each failure.
+        Return `False` if the port was closed or the reconnect timed out.
+        """
+        deadline = time.monotonic() + self._reconnect_timeout
+        delay = self.RECONNECT_DELAY
+        while True:
+            with self._link:
+                if self._closed or self._link.wait_for(lambda: self._closed, delay):
+                    return False
+            try:
+                ws = self._connect(self._uri)
+            except ConnectionError as e:
+                if time.monotonic() + delay > deadline:
+                    self.logger.error(f"Giving up reconnecting to websocket: {e}")
+                    return False
+                # else
+                delay = min(2 * delay, self.RECONNECT_MAX_DELAY)
+                continue
+            # else
+            with self._link:
+                self._ws = ws
+                self._reconnects += 1
+                self._link.notify_all()
+            self.logger.warning(f"Reconnected to websocket {self._uri}")
+            return True
+
+    @property
+    def reconnects(self) -> int:
+        """Number of times that the connection was reestablished."""
+        return self._reconnects
 
     @property
     def is_open(self) -> bool:
-        return self._ws.state == websockets.protocol.State.OPEN
+        """Whether the port is usable, including while reconnecting."""
+        return not self._closed
 
     @property
     def in_waiting(self) -> int:
-        with self._lock:
+        with self._rx_ready:
             return len(self._rxbuffer)
 
     def read(self, size: int = 1) -> bytes:
-        with self._lock:
-            while size > len(self._rxbuffer):
-                try:
-                    data = self._ws.recv(self._timeout)
-                    if isinstance(data, bytes):
-                        self._rxbuffer += data
-                except (TimeoutError, websockets.exceptions.ConnectionClosed):
+        """
+        Wait until `size` bytes have been received, or the timeout, and
+        return what is available up to `size` bytes.
+        """
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._rx_ready:
+            self._readers += 1
+            while len(self._rxbuffer) < size and not self._closed:
+                if self._canceled:
                     break
+                # else
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                self._rx_ready.wait(remaining)
+            self._readers -= 1
+            if self._readers == 0:
+                self._canceled = False
+            return self._rxbuffer.read(size)
 
-            data = self._rxbuffer[0:size]
-            self._rxbuffer = self._rxbuffer[size:]
-        return data
+    def write(self, data: bytes | bytearray | memoryview) -> int:
+        """Send `data`, waiting for the connection if it is reconnecting."""
+        self._send(data)
+        return len(data)
 
-    def write(self, data: bytes) -> int:
-        try:
-            with self._lock:
-                self._ws.send(data)
-                return len(data)
-        except websockets.exceptions.ConnectionClosed:
-            raise ConnectionError("WebSocket connection is closed") from None
+    def request(self, message: dict[str, Any], timeout: float) -> dict[str, Any] | None:
+        """
+        Send a control message to the bridge and wait for the reply of the
+        same type. Return `None` if there is none within `timeout` seconds,
+        e.g. because the bridge does not know this type of message.
+        """
+        kind = message["type"]
+        with self._rx_ready:
+            self._replies.pop(kind, None)
+        self._send(json.dumps(message))
+        with self._rx_ready:
+            self._rx_ready.wait_for(
+                lambda: kind in self._replies or self._closed, timeout
+            )
+            return self._replies.pop(kind, None)
+
+    def _send(self, data: bytes | bytearray | memoryview | str) -> None:
+        with self._tx_lock:
+            while True:
+                ws = self._ws
+                if ws.state == websockets.protocol.State.OPEN:
+                    try:
+                        ws.send(data)
+                        return
+                    except websockets.exceptions.ConnectionClosed:
+                        pass
+                with self._link:
+                    while self._ws is ws and not self._closed:
+                        self._link.wait()
+                    if self._closed:
+                        raise ConnectionError("WebSocket connection is closed")
+
+    def cancel_read(self) -> None:
+        """Make the pending reads return at once, without affecting later ones."""
+        with self._rx_ready:
+            if self._readers > 0:
+                self._canceled = True
+                self._rx_ready.notify_all()
 
     def close(self) -> None:
-        with self._lock:
-            with contextlib.suppress(Exception):
-                self._ws.close()
+        with self._link:
+            self._closed = True
+            self._link.notify_all()
+        with contextlib.suppress(Exception):
+            self._ws.close()
+        with self._rx_ready:
+            self._rx_ready.notify_all()
+        if self._receiver is not threading.current_thread():
+            self._receiver.join()
 
     def flush(self) -> None:
         """Flush write buffers, if applicable."""
@@ -64,8 +311,8 @@ class WebsocketSerial:
 
     def reset_input_buffer(self) -> None:
         """Clear input buffer."""
-        with self._lock:
-            self._rxbuffer = b""
+        with self._rx_ready:
+            self._rxbuffer.clear()
 
     def reset_output_buffer(self) -> None:
         """Clear output buffer."""
@@ -57,6 +57,7 @@ class FirmwareFlash(QDialog):
         super().__init__()
         self.__logger = logging.getLogger(type(self).__name__)
         self.__app_context = parent.app_context
+        self.__engine = parent.engine
 
         self.ui = Ui_Firmware()
         self.ui.setupUi(self)
@@ -177,6 +178,7 @@ class FirmwareFlash(QDialog):
             return False
         else:
             self.__logger.info("Flashing done!")
+            self.__engine.forget_device(self.port)
             utils.display_blocking_popup(
                 QCoreApplication.translate("Firmware", "Flashing done!")
             )
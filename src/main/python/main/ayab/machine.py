@@ -19,8 +19,10 @@
 
 from __future__ import annotations
 from enum import Enum
-from typing import Literal
-from PySide6.QtWidgets import QComboBox
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from PySide6.QtWidgets import QComboBox
 
 
 class Machine(Enum):
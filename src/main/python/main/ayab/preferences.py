@@ -74,6 +74,7 @@ PreferencesDictBoolKeys: TypeAlias = Literal[
     "default_knit_side_image",
     "quiet_mode",
     "disable_hardware_beep",
+    "event_driven_engine",
 ]
 PreferencesDictIntKeys: TypeAlias = Literal["lower_display_stitch_width"]
 PreferencesDictObjKeys: TypeAlias = Literal[
@@ -95,6 +96,7 @@ PreferencesDict = TypedDict(
         # 'default_continuous_reporting': bool,
         "quiet_mode": type[bool],
         "disable_hardware_beep": type[bool],
+        "event_driven_engine": type[bool],
         "language": type[Language],
         "lower_display_stitch_width": type[int],
     },
@@ -125,6 +127,7 @@ class Preferences(SignalSender):
         # 'default_continuous_reporting': bool,
         "quiet_mode": bool,
         "disable_hardware_beep": bool,
+        "event_driven_engine": bool,
         "language": Language,
         "lower_display_stitch_width": int,
     }
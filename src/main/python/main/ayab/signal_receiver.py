@@ -25,6 +25,7 @@ from .engine.status import Status
 from .engine.options import Alignment
 from .engine.engine_fsm import Operation
 from .engine.control import Control
+from .engine.latency import LineTiming
 from .utils import display_blocking_popup
 from typing import TYPE_CHECKING
 
@@ -59,6 +60,7 @@ class SignalReceiver(QObject):
     bad_config_flag = Signal()
     knitting_starter = Signal()
     operation_finisher = Signal(Operation)
+    line_timing_reporter = Signal(LineTiming)
     hw_test_starter = Signal(Control)
     hw_test_writer = Signal(str)
 
@@ -79,5 +81,6 @@ class SignalReceiver(QObject):
         self.image_resizer.connect(parent.set_image_dimensions)
         self.image_reverser.connect(parent.scene.set_image_reversed)
         self.operation_finisher.connect(parent.finish_operation)
+        self.line_timing_reporter.connect(parent.report_line_timing)
         self.hw_test_starter.connect(parent.hw_test.open)
         self.hw_test_writer.connect(parent.hw_test.output)
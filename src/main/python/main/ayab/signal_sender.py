@@ -20,8 +20,7 @@
 
 from __future__ import annotations
 
-from PySide6.QtCore import QCoreApplication
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional, cast
 
 if TYPE_CHECKING:
     from .signal_receiver import SignalReceiver
@@ -30,20 +29,31 @@ if TYPE_CHECKING:
     from .engine.engine_fsm import Operation
     from .engine.options import Alignment
     from .engine.control import Control
+    from .engine.latency import LineTiming
+
+
+def _translate(message: str) -> str:
+    # Qt is only loaded when a notification is sent to the GUI
+    from PySide6.QtCore import QCoreApplication
+
+    return QCoreApplication.translate("Notifications", message)
 
 
 class SignalSender(object):
     """
     Contains `emit` methods for all the signals in the `SignalReceiver` class.
 
+    Objects that run without the GUI have no signal receiver, and must not
+    emit any signals.
+
     @author Tom Price
     @date   July 2020
     """
 
     def __init__(
-        self, signal_receiver: SignalReceiver, *args: Any, **kwargs: Any
+        self, signal_receiver: Optional[SignalReceiver], *args: Any, **kwargs: Any
     ) -> None:
-        self.__signal_receiver = signal_receiver
+        self.__signal_receiver = cast("SignalReceiver", signal_receiver)
         super().__init__(*args, **kwargs)
 
     def emit_start_row_updater(self, start_row: int) -> None:
@@ -96,6 +106,9 @@ class SignalSender(object):
     def emit_operation_finisher(self, operation: Operation) -> None:
         self.__signal_receiver.operation_finisher.emit(operation)
 
+    def emit_line_timing_reporter(self, timing: LineTiming) -> None:
+        self.__signal_receiver.line_timing_reporter.emit(timing)
+
     def emit_hw_test_starter(self, control: Control) -> None:
         self.__signal_receiver.hw_test_starter.emit(control)
 
@@ -107,18 +120,14 @@ class SignalSender(object):
         self, message: str = "", message_type: MessageTypes = "info"
     ) -> None:
         """Sends the blocking_popup_displayer signal."""
-        self.emit_blocking_popup_displayer(
-            QCoreApplication.translate("Notifications", message), message_type
-        )
+        self.emit_blocking_popup_displayer(_translate(message), message_type)
 
     def emit_popup(
         self, message: str = "", message_type: MessageTypes = "info"
     ) -> None:
         """Sends the popup_displayer signal."""
-        self.emit_popup_displayer(
-            QCoreApplication.translate("Notifications", message), message_type
-        )
+        self.emit_popup_displayer(_translate(message), message_type)
 
     def emit_notification(self, message: str = "", log: bool = True) -> None:
         """Sends the notifier signal."""
-        self.emit_notifier(QCoreApplication.translate("Notifications", message), log)
+        self.emit_notifier(_translate(message), log)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Benchmark of the `cnfLine` encoding.
+
+Compares the way `Communication` used to build `cnfLine` frames (a new
+bytearray per message, a bitwise CRC and `sliplib`) with `FrameEncoder`.
+
+From `src/main/python/main` run:
+
+`python -m ayab.tests.benchmark_communication`
+"""
+
+import random
+import timeit
+
+import sliplib
+
+from ..engine.communication import FrameEncoder, Token
+
+
+def cnf_line_legacy(driver, line_number, color, flags, line_data):
+    """The encoding as it was before `FrameEncoder`."""
+    data = bytearray()
+    data.append(Token.cnfLine.value)
+    data.append(line_number)
+    data.append(color)
+    data.append(flags)
+    data.extend(line_data)
+    crc = 0
+    for i in range(len(data)):
+        n = data[i]
+        for _j in range(8):
+            f = (crc ^ n) & 1
+            crc >>= 1
+            if f:
+                crc ^= 0x8C
+            n >>= 1
+    data.append(crc & 0xFF)
+    return driver.send(bytes(data))
+
+
+def main(number=20000, repeat=5):
+    rng = random.Random(0)
+    plain = bytes(rng.randrange(0xC0) for _i in range(25))
+    escaped = bytes([0xC0, 0xDB]) + plain[2:]
+    driver = sliplib.Driver()
+    encoder = FrameEncoder()
+    print(f"cnfLine encoding, 25 bytes of line data, {number} frames")
+    for name, line_data in ("plain", plain), ("escaped", escaped):
+        legacy = min(
+            timeit.repeat(
+                lambda d=line_data: cnf_line_legacy(driver, 1, 0, 1, d),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        buffered = min(
+            timeit.repeat(
+                lambda d=line_data: encoder.cnf_line(1, 0, 1, d),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        print(
+            f"{name:8}: legacy {legacy / number * 1e6:6.2f} us/frame, "
+            f"encoder {buffered / number * 1e6:6.2f} us/frame "
+            f"(speedup {legacy / buffered:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Benchmark of the pattern conversion.
+
+Compares the per-pixel loop that `Pattern` used to convert the quantized
+image with expanding every row through `ExpandedRows`, as knitting the
+whole pattern does. Rows are expanded lazily, so `Pattern()` alone only
+measures quantization and the color map.
+
+From `src/main/python/main` run:
+
+`python -m ayab.tests.benchmark_pattern`
+"""
+
+import timeit
+
+import numpy as np
+from bitarray import bitarray
+
+from ..engine.mode import Mode
+from ..engine.pattern import ExpandedRows, Pattern
+from ..machine import Machine
+from .test_pattern import Config, random_image
+
+
+def convert_per_pixel(image, num_colors):
+    """The conversion loop as it was before it was vectorized."""
+    width, height = image.width, image.height
+    pattern_intern = [[0 for i in range(width)] for j in range(height)]
+    pattern_colors = [[0 for i in range(num_colors)] for j in range(height)]
+    pattern_expanded = [bitarray(width) for j in range(num_colors * height)]
+    for row in range(height):
+        for col in range(width):
+            pxl = image.getpixel((col, row))
+            for color in range(num_colors):
+                if pxl == color:
+                    pattern_intern[row][col] = color
+                    pattern_colors[row][color] += 1
+                    pattern_expanded[(num_colors * row) + color][col] = True
+    return pattern_expanded
+
+
+def main(width=200, height=800, repeat=3):
+    image = random_image(width, height)
+    config = Config(Machine.KH910_KH950, Mode.CLASSIC_RIBBER)
+    print(f"Pattern conversion, {width} x {height} pixels")
+    for num_colors in 2, 4, 6:
+        quantized = image.quantize(num_colors)
+        per_pixel = min(
+            timeit.repeat(
+                lambda q=quantized, n=num_colors: convert_per_pixel(q, n),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        vectorized = min(
+            timeit.repeat(
+                lambda q=quantized, n=num_colors: list(ExpandedRows(np.asarray(q), n)),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        construction = min(
+            timeit.repeat(
+                lambda n=num_colors: Pattern(image, config, n), number=1, repeat=repeat
+            )
+        )
+        total = min(
+            timeit.repeat(
+                lambda n=num_colors: list(Pattern(image, config, n).pattern_expanded),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(
+            f"{num_colors} colors: per-pixel {per_pixel * 1000:7.1f} ms, "
+            f"vectorized {vectorized * 1000:6.1f} ms "
+            f"(speedup {per_pixel / vectorized:5.1f}x), "
+            f"Pattern() {construction * 1000:6.1f} ms, "
+            f"with all rows expanded {total * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+"""Benchmark of full knitting jobs on the simulator.
+
+Knits an 800 row pattern in every mode through `Control`, with the device
+simulated by `SimulatedSerial` on a virtual clock, and compares the time
+the job would take on the machine with the time it takes to simulate.
+
+From `src/main/python/main` run:
+
+`python -m ayab.tests.benchmark_simulator`
+"""
+
+import logging
+import time
+
+from ..engine.clock import VirtualClock
+from ..engine.control import Control
+from ..engine.emulator import FirmwareEmulator
+from ..engine.mode import Mode
+from ..engine.pattern import Pattern
+from ..engine.simulator import SimulatedSerial
+from ..machine import Machine
+from .test_control import Config, Options, Parent
+from .test_pattern import random_image
+from .test_simulator import knit
+
+JOBS = (
+    (Mode.SINGLEBED, 2),
+    (Mode.CLASSIC_RIBBER, 2),
+    (Mode.CLASSIC_RIBBER, 4),
+    (Mode.MIDDLECOLORSTWICE_RIBBER, 4),
+    (Mode.HEARTOFPLUTO_RIBBER, 4),
+    (Mode.CIRCULAR_RIBBER, 2),
+)
+
+
+def main(width=200, height=800, speed=FirmwareEmulator.DEFAULT_SPEED):
+    logging.disable(logging.INFO)
+    parent = Parent()
+    machine = Machine.KH910_KH950
+    image = random_image(width, height)
+    print(f"Simulated knitting, {width} x {height} pixels at {speed:.0f} needles/s")
+    for mode, num_colors in JOBS:
+        clock = VirtualClock()
+        serial = SimulatedSerial(FirmwareEmulator(speed), clock)
+        control = Control(parent, parent.engine, clock, serial)
+        pattern = Pattern(image, Config(machine, mode), num_colors)
+        options = Options(machine, mode, num_colors)
+        start = time.perf_counter()
+        knit(control, pattern, options)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{mode.name:24} {num_colors} colors: "
+            f"{len(serial.emulator.lines):5} lines, "
+            f"machine {clock.time() / 60:6.1f} min, "
+            f"simulated in {elapsed:5.2f} s "
+            f"({control.timing.lines / elapsed:7.0f} lines/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+"""Benchmark of the websocket serial port against a local echo server.
+
+Measures the round trip of single frames the size of a `cnfLine` message,
+the throughput of a stream of frames read back by another thread, and the
+cost of the receive buffer alone compared with the `bytes` concatenation
+it replaced.
+
+From `src/main/python/main` run:
+
+`python -m ayab.tests.benchmark_websocketserial`
+"""
+
+import threading
+import time
+
+from ..engine.websocketserial import RingBuffer, WebsocketSerial
+from .test_websocketserial import EchoServer
+
+FRAME = bytes(range(32))
+
+
+def round_trips(ws, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        ws.write(FRAME)
+        ws.read(len(FRAME))
+    return count / (time.perf_counter() - start)
+
+
+def stream(ws, count, chunk=64):
+    total = count * len(FRAME)
+
+    def reader():
+        received = 0
+        while received < total:
+            received += len(ws.read(chunk))
+
+    thread = threading.Thread(target=reader)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(count):
+        ws.write(FRAME)
+    thread.join()
+    return total / (time.perf_counter() - start)
+
+
+def buffer_bytes(count, chunk=64):
+    """Receive buffer as it was before, with a copy on every read."""
+    buffer = b""
+    start = time.perf_counter()
+    for _ in range(count):
+        buffer += FRAME
+    while buffer:
+        buffer = buffer[chunk:]
+    return count * len(FRAME) / (time.perf_counter() - start)
+
+
+def buffer_ring(count, chunk=64):
+    buffer = RingBuffer()
+    start = time.perf_counter()
+    for _ in range(count):
+        buffer.write(FRAME)
+    while len(buffer):
+        buffer.read(chunk)
+    return count * len(FRAME) / (time.perf_counter() - start)
+
+
+def main(count=5000):
+    server = EchoServer()
+    try:
+        ws = WebsocketSerial(server.uri, timeout=1)
+        print(f"Round trips:      {round_trips(ws, count):10.0f} frames/s")
+        print(f"Stream:           {stream(ws, count) / 1e6:10.2f} MB/s")
+        ws.close()
+    finally:
+        server.close()
+    for backlog in (100, 1000, 10000):
+        print(
+            f"Buffer, {backlog:5} frames backlog: "
+            f"bytes {buffer_bytes(backlog) / 1e6:8.1f} MB/s, "
+            f"ring {buffer_ring(backlog) / 1e6:8.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
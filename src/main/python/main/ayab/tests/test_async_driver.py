@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import asyncio
+import serial
+import threading
+import time
+import unittest
+
+from ..engine.async_driver import AsyncDriver
+from ..engine.communication import Communication, Token
+from ..engine.communication_mock import CommunicationMock
+from ..engine.engine_fsm import Operation, State
+from ..engine.messages import ReqLine
+
+
+class Control(object):
+    def __init__(self, com):
+        self.com = com
+        self.state = State.RUN_KNIT
+
+
+class Engine(object):
+    """Stands in for `Engine`, collecting the messages of each step."""
+
+    def __init__(self, com, count=3):
+        self.control = Control(com)
+        self.count = count
+        self.steps = 0
+        self.messages = []
+        self.canceled = False
+        self.finished = False
+
+    def begin(self, operation):
+        pass
+
+    def step(self, operation):
+        self.steps += 1
+        msg = self.control.com.update_API6()
+        if msg is not None:
+            self.messages.append(msg)
+        if len(self.messages) == self.count:
+            self.control.state = State.FINISHED
+        return self.canceled or self.control.state == State.FINISHED
+
+    def finish(self, operation):
+        self.control.com.close_serial()
+        self.finished = True
+
+    def cancel(self):
+        self.canceled = True
+
+
+class TestAsyncDriver(unittest.TestCase):
+    def setUp(self):
+        self.dummy_serial = serial.serial_for_url("loop://", timeout=0.1)
+        self.com = Communication(self.dummy_serial, reader_thread=True)
+        self.engine = Engine(self.com)
+        self.driver = AsyncDriver(self.engine)
+
+    def tearDown(self):
+        self.com.close_serial()
+
+    def write_req_lines(self, delay):
+        for i in range(self.engine.count):
+            time.sleep(delay)
+            self.dummy_serial.write(bytes([0xC0, Token.reqLine.value, i, 0xC0]))
+
+    def test_operate(self):
+        writer = threading.Thread(target=self.write_req_lines, args=(0.2,))
+        writer.start()
+        self.driver.run(Operation.KNIT)
+        writer.join()
+        assert self.engine.messages == [ReqLine(0), ReqLine(1), ReqLine(2)]
+        assert self.engine.finished
+        # the driver only steps when a packet has arrived
+        assert self.engine.steps <= 2 * self.engine.count
+
+    def test_cancel(self):
+        async def cancel_later():
+            await asyncio.sleep(0.05)
+            start = time.monotonic()
+            self.driver.cancel()
+            return start
+
+        async def operate():
+            start, _ = await asyncio.gather(
+                cancel_later(), self.driver.operate(Operation.KNIT)
+            )
+            return time.monotonic() - start
+
+        delay = asyncio.run(operate())
+        assert self.engine.canceled
+        assert self.engine.finished
+        assert delay < self.driver.RETRY_INTERVAL
+
+    def test_reconnect(self):
+        # the driver is woken when the transport reconnects, without packets
+        self.engine.count = 0
+        step = self.engine.step
+
+        def resume(operation):
+            step(operation)
+            return self.engine.control.com.reconnects > 0
+
+        self.engine.step = resume
+        runner = threading.Thread(
+            target=self.driver.run, args=(Operation.KNIT,), daemon=True
+        )
+        runner.start()
+        time.sleep(0.2)
+        self.dummy_serial.reconnects = 1
+        runner.join(1)
+        alive = runner.is_alive()
+        self.driver.cancel()
+        assert not alive
+        assert self.engine.finished
+
+    def test_mock(self):
+        # simulated devices are polled
+        self.engine = Engine(CommunicationMock(delay=False))
+        self.engine.control.com.open_serial()
+        self.engine.control.com.req_start_API6(0, 10, False, False)
+        self.engine.count = 2
+        self.driver = AsyncDriver(self.engine)
+        self.driver.run(Operation.KNIT)
+        assert self.engine.messages[1:] == [ReqLine(0)]
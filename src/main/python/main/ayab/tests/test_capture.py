@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import io
+import serial
+import sliplib
+import time
+import unittest
+
+from ..engine.capture import (
+    READ,
+    WRITE,
+    CaptureRecorder,
+    ReplaySerial,
+    read_capture,
+)
+from ..engine.communication import Communication, FrameEncoder, Token
+from ..engine.messages import ReqLine
+
+
+def req_line(line_number):
+    return sliplib.encode(bytes([Token.reqLine.value, line_number]))
+
+
+def cnf_line(line_number):
+    payload = bytes([line_number, 0xC0, 0xDB]) + bytes(22)
+    return bytes(FrameEncoder().cnf_line(line_number, 0, 0, payload)), payload
+
+
+class TestCapture(unittest.TestCase):
+    def test_recorder(self):
+        file = io.BytesIO()
+        file.close = lambda: None
+        recorder = CaptureRecorder(file)
+        dummy_serial = serial.serial_for_url("loop://", timeout=0.1)
+        com = Communication(dummy_serial, recorder=recorder)
+        com.req_info()
+        assert com.update_API6() is not None
+        recorder.close()
+        file.seek(0)
+        records = list(read_capture(file))
+        frame = bytes([0xC0, Token.reqInfo.value, 0xC0])
+        assert [(d, data) for d, _t, data in records] == [
+            (WRITE, frame),
+            (READ, frame),
+        ]
+        assert records[0][1] <= records[1][1]
+        with self.assertRaises(ValueError):
+            list(read_capture(io.BytesIO(b"garbage")))
+
+    def records(self, lines=3, gap=0):
+        records = []
+        for i in range(lines):
+            records.append((READ, i * gap, req_line(i)))
+            records.append((WRITE, i * gap + 1000, cnf_line(i)[0]))
+        return records
+
+    def knit(self, com, replay, lines, payload=None):
+        sent = 0
+        start = time.monotonic()
+        while sent < lines and time.monotonic() - start < 5:
+            msg = com.update_API6()
+            if isinstance(msg, ReqLine):
+                n = msg.line_number
+                com.cnf_line_API6(n, 0, 0, payload or cnf_line(n)[1])
+                sent += 1
+
+    def test_replay(self):
+        replay = ReplaySerial(self.records())
+        com = Communication(replay)
+        self.knit(com, replay, 3)
+        assert replay.finished
+        assert replay.verified
+        assert len(replay.cnf_lines) == 3
+
+    def test_replay_mismatch(self):
+        replay = ReplaySerial(self.records())
+        com = Communication(replay)
+        self.knit(com, replay, 3, bytes(25))
+        assert replay.finished
+        assert replay.mismatches == 3
+        assert not replay.verified
+
+    def test_replay_follows_host(self):
+        replay = ReplaySerial(self.records(), timeout=0.01)
+        com = Communication(replay)
+        assert com.update_API6() == ReqLine(0)
+        # the next request only comes after the line was sent
+        assert com.update_API6() is None
+        com.cnf_line_API6(0, 0, 0, cnf_line(0)[1])
+        assert com.update_API6() == ReqLine(1)
+
+    def test_replay_realtime(self):
+        gap = 50_000_000  # ns
+        replay = ReplaySerial(self.records(3, gap), realtime=True)
+        com = Communication(replay)
+        start = time.monotonic()
+        self.knit(com, replay, 3)
+        assert replay.verified
+        assert time.monotonic() - start >= 2 * gap / 1e9
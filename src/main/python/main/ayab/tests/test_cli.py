@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from ..cli import main, parse_args, read_options
+from ..engine.knit_options import Alignment, KnitOptions
+from ..engine.mode import Mode
+from ..machine import Machine
+from .test_pattern import random_image
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.dir.name, "pattern.png")
+        random_image(30, 12).save(self.image)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_main(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = main([self.image, *argv])
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_without_qt(self):
+        code = (
+            "import sys, ayab.cli\n"
+            + "ayab.cli.SessionManager()\n"
+            + "qt = [m for m in sys.modules if m.startswith('PySide6')]\n"
+            + "assert qt == [], qt\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
+
+    def test_options(self):
+        options_file = os.path.join(self.dir.name, "options.json")
+        with open(options_file, "w") as file:
+            json.dump(
+                KnitOptions(
+                    "/dev/ttyACM0", Machine.KH270, Mode.CLASSIC_RIBBER, 3
+                ).as_dict(),
+                file,
+            )
+        args = parse_args(
+            [
+                self.image,
+                "--options",
+                options_file,
+                "--colors",
+                "2",
+                "--start-needle",
+                "L10",
+                "--stop-needle",
+                "R10",
+                "--alignment",
+                "LEFT",
+            ]
+        )
+        options = read_options(args)
+        assert options.portname == "/dev/ttyACM0"
+        assert options.machine == Machine.KH270
+        assert options.mode == Mode.CLASSIC_RIBBER
+        assert options.num_colors == 2
+        assert options.start_needle == 46
+        assert options.stop_needle == 65
+        assert options.alignment == Alignment.LEFT
+        assert options.validate() == (True, None)
+
+    def test_invalid(self):
+        code, _out, err = self.run_main("--simulate", "--start-needle", "X1")
+        assert code == 2
+        assert "Invalid needle" in err
+        code, _out, err = self.run_main("--mode", "SINGLEBED", "--colors", "3")
+        assert code == 2
+        code, _out, err = self.run_main("--simulate", "--start-row", "13")
+        assert code == 2
+
+    def test_simulate(self):
+        code, out, _err = self.run_main(
+            "--simulate", "--mode", "CLASSIC_RIBBER", "--colors", "2"
+        )
+        assert code == 0
+        lines = out.splitlines()
+        assert "Please knit." in lines
+        assert lines[-4].startswith("Row 12/12, line 23, color ")
+        assert lines[-1].startswith("Line timing: 24 lines")
+
+    def test_several_machines(self):
+        code, out, _err = self.run_main("--simulate", "--machines", "2")
+        assert code == 0
+        lines = out.splitlines()
+        assert "Simulation 1: Please knit." in lines
+        assert "Simulation 2: Please knit." in lines
+        assert lines[-2].startswith("Simulation 1: Line timing: 12 lines")
+        assert lines[-1].startswith("Simulation 2: Line timing: 12 lines")
+        code, _out, err = self.run_main("--machines", "2", "--port", "/dev/null")
+        assert code == 2
+
+    def test_capture_replay(self):
+        capture = os.path.join(self.dir.name, "knit.cap")
+        code, _out, _err = self.run_main("--simulate", "--capture", capture, "-q")
+        assert code == 0
+        code, out, _err = self.run_main("--replay", capture)
+        assert code == 0
+        assert out.splitlines()[-1] == "The replay matches the capture."
+        # a different job does not match the capture
+        code, _out, err = self.run_main(
+            "--replay", capture, "--alignment", "LEFT", "-q"
+        )
+        assert code == 1
+        assert "The replay differs from the capture" in err
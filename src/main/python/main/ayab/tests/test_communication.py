@@ -18,11 +18,16 @@
 #    Andreas Müller, Christian Gerbrandt
 #    https://github.com/AllYarnsAreBeautiful/ayab-desktop
 
+import random
 import serial
+import threading
+import time
+import sliplib
 import unittest
 from mock import patch
 
-from ..engine.communication import Communication, Token
+from ..engine.communication import Communication, FrameEncoder, Token, add_crc
+from ..engine.messages import CnfStart, ReqLine
 
 
 class TestCommunication(unittest.TestCase):
@@ -59,8 +64,7 @@ class TestCommunication(unittest.TestCase):
         byte_array = bytearray([0xC0, Token.cnfStart.value, 1, 0xC0])
         self.dummy_serial.write(byte_array)
         result = self.comm_dummy.update_API6()
-        expected_result = (bytes([Token.cnfStart.value, 1]), Token.cnfStart, 1)
-        assert result == expected_result
+        assert result == CnfStart(1)
 
     def test_req_start_API6(self):
         start_val, end_val, continuous_reporting, disable_hardware_beep, crc8 = (
@@ -117,3 +121,92 @@ class TestCommunication(unittest.TestCase):
         byte_array.extend(bytes([crc8, Token.slipFrameEnd.value]))
         bytes_read = self.dummy_serial.read(len(byte_array))
         assert bytes_read == byte_array
+
+    def test_frame_encoder(self):
+        # reference implementation of the CRC, bit by bit
+        def crc_bitwise(data):
+            crc = 0
+            for n in data:
+                for _j in range(8):
+                    f = (crc ^ n) & 1
+                    crc >>= 1
+                    if f:
+                        crc ^= 0x8C
+                    n >>= 1
+            return crc
+
+        encoder = FrameEncoder()
+        rng = random.Random(0)
+        for length in 0, 1, 15, 25, 32:
+            for _i in range(200):
+                # bias towards the SLIP special characters
+                line_data = bytes(
+                    rng.choice([0xC0, 0xDB, 0xDC, 0xDD, rng.randrange(256)])
+                    for _j in range(length)
+                )
+                line_number = rng.randrange(256)
+                color = rng.randrange(6)
+                flags = rng.randrange(4)
+                message = (
+                    bytes([Token.cnfLine.value, line_number, color, flags]) + line_data
+                )
+                crc8 = crc_bitwise(message)
+                assert add_crc(0, message) == crc8
+                expected = sliplib.encode(message + bytes([crc8]))
+                frame = encoder.cnf_line(line_number, color, flags, line_data)
+                assert bytes(frame) == expected
+        with self.assertRaises(ValueError):
+            encoder.cnf_line(0, 0, 0, bytes(33))
+
+    def test_cnf_line_API6_escaped(self):
+        line_data = bytes([0xC0, 0xDB, 0xDC, 0xDD]) + bytes(21)
+        self.comm_dummy.cnf_line_API6(0xC0, 1, 0, line_data)
+        message = bytes([Token.cnfLine.value, 0xC0, 1, 0]) + line_data
+        expected = sliplib.encode(message + bytes([add_crc(0, message)]))
+        bytes_read = self.dummy_serial.read(len(expected))
+        assert bytes_read == expected
+
+
+class TestCommunicationReaderThread(unittest.TestCase):
+    def setUp(self):
+        self.dummy_serial = serial.serial_for_url("loop://logging=debug", timeout=0.1)
+        self.comm_dummy = Communication(self.dummy_serial, reader_thread=True)
+
+    def tearDown(self):
+        self.comm_dummy.close_serial()
+
+    def test_update_API6(self):
+        assert self.comm_dummy.update_API6() is None
+        self.dummy_serial.write(bytes([0xC0, Token.reqLine.value, 1, 0xC0]))
+        self.dummy_serial.write(bytes([0xC0, Token.reqLine.value, 2, 0xC0]))
+        assert self.comm_dummy.update_API6() == ReqLine(1)
+        received = self.comm_dummy.rx_time
+        assert 0 < received <= time.perf_counter()
+        assert self.comm_dummy.update_API6() == ReqLine(2)
+        assert self.comm_dummy.rx_time >= received
+
+    def test_wakeup(self):
+        # a packet arriving while waiting is returned without polling delay
+        timer = threading.Timer(
+            0.02,
+            self.dummy_serial.write,
+            (bytes([0xC0, Token.cnfStart.value, 0, 0xC0]),),
+        )
+        timer.start()
+        start = time.monotonic()
+        result = self.comm_dummy.update_API6()
+        while result is None and time.monotonic() - start < 1:
+            result = self.comm_dummy.update_API6()
+        timer.join()
+        assert result == CnfStart(0)
+
+    def test_reader_error(self):
+        self.dummy_serial.close()
+        with self.assertRaises(serial.SerialException):
+            for _i in range(10):
+                self.comm_dummy.update_API6()
+
+    def test_close_serial(self):
+        self.comm_dummy.close_serial()
+        assert self.dummy_serial.is_open is False
+        assert not any(t.name == "AyabSerialReader" for t in threading.enumerate())
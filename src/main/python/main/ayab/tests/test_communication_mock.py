@@ -20,8 +20,8 @@
 
 import unittest
 
-from ..engine.communication import Token
 from ..engine.communication_mock import CommunicationMock
+from ..engine.messages import CnfInfo, CnfInit, CnfStart, CnfTest, IndState, ReqLine
 from ..machine import Machine
 
 
@@ -39,7 +39,7 @@ class TestCommunicationMock(unittest.TestCase):
         assert self.comm_dummy.is_open()
 
     def test_update_API6(self):
-        assert self.comm_dummy.update_API6() == (None, Token.none, 0)
+        assert self.comm_dummy.update_API6() is None
 
     def test_req_start_API6(self):
         start_val, end_val, continuous_reporting, disable_hardware_beep = (
@@ -48,7 +48,7 @@ class TestCommunicationMock(unittest.TestCase):
             True,
             False,
         )
-        expected_result = (bytes([Token.cnfStart.value, 0]), Token.cnfStart, 0)
+        expected_result = CnfStart(0)
         self.comm_dummy.req_start_API6(
             start_val, end_val, continuous_reporting, disable_hardware_beep
         )
@@ -57,31 +57,23 @@ class TestCommunicationMock(unittest.TestCase):
 
     def test_req_info(self):
         # expecting 1.0.0-mock
-        expected_result = (
-            bytes([Token.cnfInfo.value, 6, 1, 0, 0, 109, 111, 99, 107, 0]),
-            Token.cnfInfo,
-            6,
-        )
+        expected_result = CnfInfo(6, 1, 0, 0, "mock")
         self.comm_dummy.req_info()
         bytes_read = self.comm_dummy.update_API6()
         assert bytes_read == expected_result
 
     def test_req_init_API6(self):
-        expected_result = (bytes([Token.cnfInit.value, 0]), Token.cnfInit, 0)
+        expected_result = CnfInit(0)
         self.comm_dummy.req_init_API6(Machine.KH910_KH950)
         bytes_read = self.comm_dummy.update_API6()
         assert bytes_read == expected_result
         # indState shall be sent automatically, also
-        expected_result = (
-            bytes([Token.indState.value, 0, 1, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0, 1]),
-            Token.indState,
-            0,
-        )
+        expected_result = IndState(0, 1, 0xFFFF, 0xFFFF, 0xFF, 0, 1)
         bytes_read = self.comm_dummy.update_API6()
         assert bytes_read == expected_result
 
     def test_req_test_API6(self):
-        expected_result = (bytes([Token.cnfTest.value, 0]), Token.cnfTest, 0)
+        expected_result = CnfTest(0)
         self.comm_dummy.req_test_API6()
         bytes_read = self.comm_dummy.update_API6()
         assert bytes_read == expected_result
@@ -110,6 +102,6 @@ class TestCommunicationMock(unittest.TestCase):
         # Alternates between requesting a line and no output
         for i in range(0, 256):
             bytes_read = self.comm_dummy.update_API6()
-            assert bytes_read == (bytearray([Token.reqLine.value, i]), Token.reqLine, i)
+            assert bytes_read == ReqLine(i)
             bytes_read = self.comm_dummy.update_API6()
-            assert bytes_read == (None, Token.none, 0)
+            assert bytes_read is None
@@ -18,12 +18,17 @@
 #    Andreas Müller, Christian Gerbrandt
 #    https://github.com/AllYarnsAreBeautiful/ayab-desktop
 
+import time
 import unittest
 from PIL import Image
 from bitarray import bitarray
 
 from ..signal_receiver import SignalReceiver
 from ..engine.control import Control
+from ..engine.communication_mock import CommunicationMock
+from ..engine.engine_fsm import Operation
+from ..engine.line_table import LineTable
+from ..engine.schedule import KnitSchedule
 from ..engine.options import Alignment
 from ..engine.mode import Mode, ModeFunc
 from ..engine.pattern import Pattern
@@ -49,6 +54,33 @@ class Config(object):
         self.auto_mirror = auto_mirror
 
 
+class Preferences(object):
+    def value(self, key):
+        return False
+
+
+class Options(object):
+    def __init__(self, machine, mode, num_colors, inf_repeat=False):
+        self.machine = machine
+        self.mode = mode
+        self.num_colors = num_colors
+        self.start_row = 0
+        self.inf_repeat = inf_repeat
+        self.continuous_reporting = False
+        self.prefs = Preferences()
+        self.portname = "Simulation"
+
+
+class RecordingCommunication(CommunicationMock):
+    def __init__(self):
+        super().__init__(delay=False)
+        self.lines = []
+
+    def cnf_line_API6(self, line_number, color, flags, line_data):
+        self.lines.append((line_number, color, flags, line_data))
+        return True
+
+
 class TestControl(unittest.TestCase):
     def setUp(self):
         self.parent = Parent()
@@ -277,6 +309,77 @@ class TestControl(unittest.TestCase):
         )
         assert control.select_needles_API6(0, 0, False) == bits0
 
+    def test_line_table(self):
+        control = Control(self.parent, self.parent.engine)
+        control.machine = Machine(0)
+        control.num_colors = 2
+        control.mode = Mode.CLASSIC_RIBBER
+        im = Image.new("P", (40, 3), 1)
+        im.paste(Image.new("P", (40, 1), 0), (0, 0))
+        pattern = Pattern(im, Config(Machine(0), Mode.CLASSIC_RIBBER), 2)
+        pattern.alignment = Alignment.LEFT
+        control.pattern = pattern
+        control.start_needle = 0
+        control.end_needle = 40
+        control.start_pixel = 0
+        control.end_pixel = 40
+        table = LineTable(control.select_needles_API6)
+        for color, row_index, blank_line in [
+            (0, 0, False),
+            (1, 3, False),
+            (0, 2, True),
+        ]:
+            payload, bits = table.get(color, row_index, blank_line)
+            assert bits == control.select_needles_API6(color, row_index, blank_line)
+            assert payload == bits.tobytes()
+            assert len(payload) == Machine(0).width // 8
+        assert len(table) == 3
+        # identical rows share one buffer
+        assert table.get(1, 3, False)[0] is table.get(1, 5, False)[0]
+        table.compile([(0, 4, False), (0, 2, True)])
+        assert len(table) == 5
+        assert table.get(0, 4, False)[0] is table.get(0, 2, False)[0]
+        # only a bounded window of lines is kept
+        table = LineTable(control.select_needles_API6, window=2)
+        table.compile([(0, 0, False), (1, 3, False), (1, 5, False), (0, 2, True)])
+        assert len(table) == 2
+        assert table.num_payloads == 2
+        table.get(0, 2, True)
+        table.get(0, 0, False)
+        assert len(table) == 2
+        assert table.num_payloads == 1
+
+    def test_knit_schedule(self):
+        for mode in Mode:
+            for num_colors in 2, 3, 4:
+                if not mode.good_ncolors(num_colors):
+                    continue
+                for pat_height, start_row in (1, 0), (5, 0), (5, 2), (6, 5):
+                    for inf_repeat in False, True:
+                        schedule = KnitSchedule(
+                            mode, num_colors, start_row, pat_height, inf_repeat
+                        )
+                        control = Control(self.parent, self.parent.engine)
+                        control.num_colors = num_colors
+                        control.start_row = start_row
+                        control.inf_repeat = inf_repeat
+                        control.pat_height = pat_height
+                        control.len_pat_expanded = pat_height * num_colors
+                        control.passes_per_row = mode.row_multiplier(num_colors)
+                        func = getattr(ModeFunc, mode.knit_func(num_colors))
+                        passes = control.passes_per_row * (pat_height - start_row)
+                        if inf_repeat:
+                            passes *= 3
+                        else:
+                            assert len(schedule) == passes
+                        for line_number in range(passes):
+                            expected = func(control, line_number)
+                            assert schedule.line(line_number) == expected
+                            assert schedule.row(line_number) == control.pat_row
+                        if not inf_repeat:
+                            assert schedule.last_line[-1]
+                            assert schedule.last_line.sum() == 1
+
     def test_row_multiplier(self):
         assert Mode.SINGLEBED.row_multiplier(2) == 1
         assert Mode.CLASSIC_RIBBER.row_multiplier(2) == 2
@@ -321,3 +424,38 @@ class TestControl(unittest.TestCase):
         assert not Mode.HEARTOFPLUTO_RIBBER.flanking_needles(2, 3)
         assert Mode.CIRCULAR_RIBBER.flanking_needles(0, 2)
         assert not Mode.CIRCULAR_RIBBER.flanking_needles(1, 2)
+
+    def test_prefetch(self):
+        machine = Machine(0)
+        mode = Mode.CLASSIC_RIBBER
+        image = Image.new("P", (40, 20), 1)
+        image.paste(Image.new("P", (20, 10), 0), (10, 5))
+        pattern = Pattern(image, Config(machine, mode), 2)
+        pattern.alignment = Alignment.CENTER
+        control = Control(self.parent, self.parent.engine)
+        control.start(pattern, Options(machine, mode, 2), Operation.KNIT)
+        control.com = RecordingCommunication()
+        assert control.func_selector()
+        # the first lines are compiled before they are requested
+        for _i in range(100):
+            if len(control.line_table) >= control.PREFETCH_LINES:
+                break
+            time.sleep(0.01)
+        assert len(control.line_table) > 0
+        finished = False
+        line_number = 0
+        while not finished:
+            finished = control.cnf_line_API6(line_number % control.BLOCK_LENGTH)
+            line_number += 1
+        control.stop()
+        assert line_number == len(control.schedule)
+        assert control.timing.lines == line_number
+        # prefetching does not change the lines sent
+        for n, (requested_line, color, flags, payload) in enumerate(control.com.lines):
+            expected_color, row_index, blank_line, _ = control.schedule.line(n)
+            assert requested_line == n % control.BLOCK_LENGTH
+            assert color == expected_color
+            assert flags == 0
+            assert payload == (
+                control.select_needles_API6(color, row_index, blank_line).tobytes()
+            )
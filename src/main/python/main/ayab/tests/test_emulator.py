@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import os
+import sliplib
+import time
+import unittest
+
+from ..engine.communication import FrameEncoder, Token, add_crc
+from ..engine.control import Control
+from ..engine.emulator import FirmwareEmulator, OpState
+from ..engine.engine_fsm import Operation, State
+from ..engine.messages import (
+    CnfInfo,
+    CnfInit,
+    CnfStart,
+    CnfTest,
+    IndState,
+    ReqLine,
+    decode_message,
+)
+from ..engine import messages
+from ..engine.mode import Mode
+from ..engine.pattern import Pattern
+from ..machine import Machine
+from .test_control import Config, Options, Parent
+from .test_pattern import random_image
+
+
+def with_crc(*data):
+    return bytes(data) + bytes([add_crc(0, bytes(data))])
+
+
+class Host(object):
+    """Feeds messages to an emulator and decodes its replies."""
+
+    def __init__(self, speed=0):
+        self.driver = sliplib.Driver()
+        self.received = []
+        self.emulator = FirmwareEmulator(speed, self.receive)
+
+    def receive(self, data):
+        self.received.extend(decode_message(msg) for msg in self.driver.receive(data))
+
+    def send(self, msg, now=0.0):
+        self.emulator.feed(sliplib.encode(msg), now)
+        received, self.received = self.received, []
+        return received
+
+
+class TestFirmwareEmulator(unittest.TestCase):
+    def test_info(self):
+        host = Host()
+        (info,) = host.send(bytes([Token.reqInfo.value]))
+        assert isinstance(info, CnfInfo)
+        assert info.api_version == 6
+        assert info.firmware_version == "1.0.0-emulator"
+
+    def test_init(self):
+        host = Host()
+        init, state = host.send(with_crc(Token.reqInit.value, Machine.KH270.value))
+        assert init == CnfInit(0)
+        assert isinstance(state, IndState)
+        assert state.error == 0
+        assert host.emulator.width == 112
+        assert host.send(with_crc(Token.reqInit.value, 7)) == [CnfInit(0x10)]
+        assert host.send(bytes([Token.reqInit.value, 0, 0x55])) == [CnfInit(0x04)]
+        assert host.emulator.crc_errors == 1
+
+    def test_start(self):
+        host = Host()
+        assert host.send(with_crc(Token.reqStart.value, 0, 199, 1)) == [CnfStart(0x21)]
+        host.send(with_crc(Token.reqInit.value, 0))
+        assert host.send(with_crc(Token.reqStart.value, 100, 10, 1)) == [CnfStart(0x11)]
+        assert host.send(with_crc(Token.reqStart.value, 0, 199, 1)) == [
+            CnfStart(0),
+            ReqLine(0),
+        ]
+        assert host.emulator.state == OpState.KNIT
+        assert host.emulator.continuous_reporting
+
+    def test_knit(self):
+        host = Host(speed=100)
+        host.send(with_crc(Token.reqInit.value, 0))
+        host.send(with_crc(Token.reqStart.value, 0, 99, 0))
+        encoder = FrameEncoder()
+        data = bytes(range(25))
+        # the carriage turns around for 0.24 s,
+        # then one pass over 100 needles takes a second
+        frame = bytes(encoder.cnf_line(0, 0, 0, data))
+        host.emulator.feed(frame, 0.1)
+        assert host.emulator.late_lines == 0
+        assert host.emulator.advance(1.0) == 1.24
+        assert host.emulator.advance(1.24) is None
+        assert host.received == [ReqLine(1)]
+        host.received = []
+        # a line sent after the carriage turned around is late
+        frame = bytes(encoder.cnf_line(1, 0, 1, data))
+        host.emulator.feed(frame, 2.0)
+        assert host.emulator.late_lines == 1
+        host.emulator.advance(3.0)
+        assert host.received == []
+        assert host.emulator.state == OpState.READY
+        assert host.emulator.lines == [(0, 0, 0, data), (1, 0, 1, data)]
+
+    def test_line_checksum_error(self):
+        host = Host()
+        host.send(with_crc(Token.reqInit.value, 0))
+        host.send(with_crc(Token.reqStart.value, 0, 199, 0))
+        frame = bytearray(
+            sliplib.decode(bytes(FrameEncoder().cnf_line(0, 0, 0, bytes(25))))
+        )
+        frame[-1] ^= 0xFF
+        assert host.send(bytes(frame)) == [ReqLine(0)]
+        assert host.emulator.crc_errors == 1
+        assert host.emulator.lines == []
+
+    def test_hardware_test(self):
+        host = Host()
+        received = host.send(bytes([Token.reqTest.value]))
+        assert received[0] == CnfTest(0)
+        assert all(isinstance(msg, messages.TestRes) for msg in received[1:])
+        received = host.send(bytes([Token.sendCmd.value]))
+        assert received == [
+            messages.TestRes("Called send\n"),
+            messages.TestRes("\x31\x32\x33\n"),
+        ]
+        host.send(bytes([Token.autoReadCmd.value]), 0.0)
+        host.emulator.advance(0.5)
+        assert len(host.received) > 0
+        host.send(bytes([Token.stopCmd.value]), 0.6)
+        host.emulator.advance(1.5)
+        assert host.received == []
+        host.send(bytes([Token.quitCmd.value]))
+        assert host.emulator.state == OpState.WAIT_FOR_MACHINE
+
+
+@unittest.skipUnless(os.name == "posix", "needs a pseudo-terminal")
+class TestPtyEmulator(unittest.TestCase):
+    def setUp(self):
+        from ..engine.pty_emulator import PtyEmulator
+
+        self.server = PtyEmulator(FirmwareEmulator(speed=20000))
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_knit(self):
+        parent = Parent()
+        control = Control(parent, parent.engine)
+        machine = Machine.KH910_KH950
+        pattern = Pattern(random_image(40, 30), Config(machine, Mode.CLASSIC_RIBBER), 2)
+        options = Options(machine, Mode.CLASSIC_RIBBER, 2)
+        options.portname = self.server.port
+        options.continuous_reporting = True
+        control.start(pattern, options, Operation.KNIT)
+        start = time.monotonic()
+        while control.state != State.FINISHED and time.monotonic() - start < 10:
+            control.operate(Operation.KNIT)
+        control.stop()
+        emulator = self.server.emulator
+        assert control.state == State.FINISHED
+        assert emulator.crc_errors == 0
+        assert [line[0] for line in emulator.lines] == list(range(len(emulator.lines)))
+        assert emulator.lines[-1][2] & 1
+        # the carriage finishes the final pass
+        time.sleep(0.1)
+        assert emulator.state == OpState.READY
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import unittest
+
+from ..engine.latency import Histogram, LineTiming
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        for value in list(range(1000)) + [10**k + 7 for k in range(3, 9)]:
+            index = Histogram.bucket(value)
+            assert Histogram.highest_value(index) >= value
+            assert index == 0 or Histogram.highest_value(index - 1) < value
+            # relative precision
+            assert Histogram.highest_value(index) - value <= value / 64
+
+    def test_percentile(self):
+        histogram = Histogram()
+        assert histogram.percentile(50) == 0.0
+        for i in range(1, 1001):
+            histogram.record(i * 1e-4)
+        assert histogram.count == 1000
+        assert histogram.min == 1e-4
+        assert histogram.max == 0.1
+        self.assertAlmostEqual(histogram.mean, 0.05005)
+        self.assertAlmostEqual(histogram.percentile(50), 0.05, delta=0.05 / 64)
+        self.assertAlmostEqual(histogram.percentile(99), 0.099, delta=0.099 / 64)
+        assert histogram.percentile(100) == 0.1
+
+
+class TestLineTiming(unittest.TestCase):
+    def test_record(self):
+        timing = LineTiming(deadline=0.01)
+        timing.record(1.0, 1.002)
+        timing.record(1.5, 1.52)
+        timing.record(2.0, 2.001)
+        assert timing.lines == 3
+        assert timing.missed == 1
+        assert timing.interval.count == 2
+        self.assertAlmostEqual(timing.interval.min, 0.5)
+        self.assertAlmostEqual(timing.turnaround.max, 0.02)
+        assert "3 lines" in timing.summary()
+        assert timing.brief().endswith("max 20.0 ms, 1 of 3 lines late")
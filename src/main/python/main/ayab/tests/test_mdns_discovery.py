@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import queue
+import socket
+import time
+import unittest
+
+import zeroconf
+
+from ..engine.mdns_discovery import MdnsBrowser
+
+SERVICE_TYPE = "_ayabtest._tcp.local."
+SERVICE_NAME = "Test Bridge." + SERVICE_TYPE
+
+
+class TestMdnsBrowser(unittest.TestCase):
+    def setUp(self):
+        self.updates = queue.Queue()
+        self.browser = MdnsBrowser(
+            SERVICE_TYPE, lambda name, info: self.updates.put((name, info))
+        )
+        self.browser.RESOLVE_TIMEOUT = 500
+        self.browser.start()
+        self.server = zeroconf.Zeroconf(interfaces=["127.0.0.1"])
+
+    def tearDown(self):
+        self.server.close()
+        self.browser.stop()
+
+    def service_info(self, path):
+        return zeroconf.ServiceInfo(
+            SERVICE_TYPE,
+            SERVICE_NAME,
+            addresses=[socket.inet_aton("127.0.0.1")],
+            port=8080,
+            properties={"path": path},
+            server="test-bridge.local.",
+        )
+
+    def next_update(self):
+        # several announcements may arrive, only changes are reported
+        return self.updates.get(timeout=10)
+
+    def test_changes(self):
+        self.server.register_service(self.service_info("/ws"))
+        name, info = self.next_update()
+        assert name == SERVICE_NAME
+        assert info.properties[b"path"] == b"/ws"
+        assert info.port == 8080
+        assert SERVICE_NAME in self.browser.get_known_services()
+
+        self.server.update_service(self.service_info("/ws/kh1"))
+        name, info = self.next_update()
+        assert name == SERVICE_NAME
+        assert info.properties[b"path"] == b"/ws/kh1"
+
+        self.server.unregister_service(self.service_info("/ws/kh1"))
+        assert self.next_update() == (SERVICE_NAME, None)
+        assert self.browser.get_known_services() == {}
+
+    def test_no_blocking(self):
+        zc = self.browser.zeroconf_instance
+        start = time.monotonic()
+        # a service that does not answer is resolved on the event loop
+        future = self.browser._on_service_changed(
+            zc, SERVICE_TYPE, "Missing." + SERVICE_TYPE, "added"
+        )
+        assert time.monotonic() - start < 0.1
+        future.result(timeout=10)
+        assert self.updates.empty()
+
+    def test_stop(self):
+        self.server.register_service(self.service_info("/ws"))
+        self.next_update()
+        expiry = self.browser._MdnsBrowser__expiry
+        timers = list(expiry.values())
+        assert len(timers) == 1
+        self.browser.stop()
+        # the timers were canceled on the event loop of Zeroconf
+        assert expiry == {}
+        assert all(timer.cancelled() for timer in timers)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+
+import unittest
+
+from ..engine.messages import (
+    CnfInfo,
+    CnfInit,
+    CnfStart,
+    CnfTest,
+    IndState,
+    ReqLine,
+    Token,
+    Unknown,
+    decode_message,
+)
+
+
+class TestMessages(unittest.TestCase):
+    def test_decode(self):
+        msg = bytes([Token.cnfInfo.value, 6, 1, 2, 3, 109, 111, 99, 107, 0, 0xFF])
+        assert decode_message(msg) == CnfInfo(6, 1, 2, 3, "mock")
+        assert decode_message(msg).firmware_version == "1.2.3-mock"
+        msg = bytes([Token.cnfInfo.value, 4])
+        assert decode_message(msg) == CnfInfo(4)
+        assert decode_message(bytes([Token.cnfInit.value, 1])) == CnfInit(1)
+        assert decode_message(bytes([Token.cnfStart.value, 0])) == CnfStart(0)
+        assert decode_message(bytes([Token.cnfTest.value, 0])) == CnfTest(0)
+        assert decode_message(bytes([Token.reqLine.value, 42])) == ReqLine(42)
+        msg = bytes([Token.indState.value, 0, 1, 2, 3, 4, 5, 2, 7, 0])
+        assert decode_message(msg) == IndState(0, 1, 0x203, 0x405, 2, 7, 0)
+        msg = decode_message(bytes([Token.testRes.value]) + "Called beep\n".encode())
+        assert msg.token == Token.testRes
+        assert msg.text == "Called beep\n"
+
+    def test_decode_unknown(self):
+        # unknown token
+        assert decode_message(b"\xfe\xff\x00") == Unknown(b"\xfe\xff\x00")
+        # truncated message
+        msg = bytes([Token.indState.value, 0, 1, 2])
+        assert decode_message(msg) == Unknown(msg)
+        assert decode_message(bytes()) == Unknown(bytes())
+        # binary garbage from the hardware test
+        msg = decode_message(bytes([Token.testRes.value, 0xFF, 0xFE]))
+        assert msg.token == Token.testRes
+
+    def test_equality(self):
+        assert CnfInit(0) == CnfInit(0)
+        assert CnfInit(0) != CnfStart(0)
+        assert CnfInit(0) != CnfInit(1)
+        assert repr(ReqLine(3)) == "ReqLine(line_number=3)"
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2013-2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import unittest
+import numpy as np
+from bitarray import bitarray
+from PIL import Image
+
+from ..engine.mode import Mode
+from ..engine.options import Alignment
+from ..engine.pattern import ExpandedRows, Pattern, PatternCache
+from ..machine import Machine
+
+
+class Config(object):
+    def __init__(self, machine, mode=Mode.SINGLEBED, auto_mirror=False, num_colors=2):
+        self.machine = machine
+        self.mode = mode
+        self.auto_mirror = auto_mirror
+        self.num_colors = num_colors
+
+
+def random_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+class TestPattern(unittest.TestCase):
+    def test_convert(self):
+        image = random_image(37, 11)
+        for mode, num_colors in [
+            (Mode.SINGLEBED, 2),
+            (Mode.CLASSIC_RIBBER, 3),
+            (Mode.HEARTOFPLUTO_RIBBER, 5),
+        ]:
+            pattern = Pattern(image, Config(Machine(0), mode), num_colors)
+            quantized = image.quantize(num_colors)
+            assert pattern.pat_width == 37
+            assert pattern.pat_height == 11
+            expanded = pattern.pattern_expanded
+            assert len(expanded) == num_colors * 11
+            # color separation is a relabelling of the quantized image
+            mapping = {}
+            for row in range(11):
+                for col in range(37):
+                    hits = [
+                        color
+                        for color in range(num_colors)
+                        if expanded[num_colors * row + color][col]
+                    ]
+                    # every pixel belongs to exactly one color plane
+                    assert len(hits) == 1
+                    src = quantized.getpixel((col, row))
+                    assert mapping.setdefault(src, hits[0]) == hits[0]
+
+    def test_convert_width_not_multiple_of_8(self):
+        image = Image.new("P", (13, 2), 0)
+        image.putpixel((12, 1), 1)
+        pattern = Pattern(image, Config(Machine(0)), 2)
+        for bits in pattern.pattern_expanded:
+            assert len(bits) == 13
+        assert pattern.pattern_expanded[3].count() == 1
+        assert pattern.pattern_expanded[3][12]
+
+    def test_placement_keeps_color_separation(self):
+        image = random_image(40, 5)
+        pattern = Pattern(image, Config(Machine(0), Mode.CLASSIC_RIBBER), 3)
+        separation = pattern.separation
+        pattern.set_knit_needles(10, 150, Machine(0))
+        pattern.alignment = Alignment.RIGHT
+        assert pattern.separation is separation
+        assert pattern.pat_end_needle == 151
+        assert pattern.pat_start_needle == 111
+        pattern.alignment = Alignment.LEFT
+        assert pattern.pat_start_needle == 10
+        assert pattern.pat_end_needle == 50
+        pattern.num_colors = 4
+        assert pattern.separation is not separation
+        assert len(pattern.pattern_expanded) == 4 * 5
+        assert pattern.pat_start_needle == 10
+
+    def test_pattern_cache(self):
+        cache = PatternCache(maxsize=2)
+        image = random_image(20, 4)
+        config = Config(Machine(0), Mode.CLASSIC_RIBBER, num_colors=3)
+        first = cache.pattern(image, config)
+        second = cache.pattern(image.copy(), config)
+        assert second is not first
+        assert second.separation is first.separation
+        assert len(cache) == 1
+        # options that change the color separation miss the cache
+        mirrored = cache.pattern(
+            image, Config(Machine(0), Mode.CLASSIC_RIBBER, True, 3)
+        )
+        assert mirrored.separation is not first.separation
+        assert len(cache) == 2
+        # the least recently used separation is evicted
+        cache.pattern(random_image(20, 4, seed=1), config)
+        assert len(cache) == 2
+        assert cache.pattern(image, config).separation is not first.separation
+
+    def test_expanded_rows(self):
+        pixels = np.asarray(random_image(45, 30).quantize(4))
+        rows = ExpandedRows(pixels, 4, window=8)
+        assert len(rows) == 4 * 30
+        assert rows.cached_rows == 0
+        expanded = [
+            bitarray((pixels[row] == color).tolist())
+            for row in range(30)
+            for color in range(4)
+        ]
+        for row_index in range(0, len(rows), 2):
+            assert rows[row_index] == expanded[row_index]
+        # only a bounded window of rows is kept
+        assert rows.cached_rows == 8
+        assert rows[-1] == expanded[-1]
+        with self.assertRaises(IndexError):
+            rows[4 * 30]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import json
+import os
+import threading
+import time
+import unittest
+
+import websockets.sync.server
+
+from ..engine.emulator import FirmwareEmulator
+from ..engine.probe import DeviceProber
+from ..engine.websocketserial import MONITOR_PATH
+
+
+@unittest.skipUnless(os.name == "posix", "needs a pseudo-terminal")
+class TestDeviceProber(unittest.TestCase):
+    def setUp(self):
+        from ..engine.pty_emulator import PtyEmulator
+
+        self.emulators = [PtyEmulator(FirmwareEmulator()) for _ in range(3)]
+        # the newest firmware on the second port
+        self.emulators[1].emulator.FIRMWARE_VERSION = 1, 1, 0
+        # a port without a device
+        self.master, self.slave = os.openpty()
+        self.portnames = [emulator.port for emulator in self.emulators]
+        self.portnames.insert(1, os.ttyname(self.slave))
+        for emulator in self.emulators:
+            emulator.start()
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def test_probe(self):
+        prober = DeviceProber(lambda portname: None)
+        prober.TIMEOUT = 0.5
+        start = time.monotonic()
+        devices = prober.probe(self.portnames + ["/dev/missing"])
+        # the ports are probed at the same time
+        assert time.monotonic() - start < 2 * prober.TIMEOUT
+        assert [portname for portname, _info in devices][0] == self.emulators[1].port
+        assert len(devices) == 3
+        assert all(info.supported for _portname, info in devices)
+        assert str(devices[0][1]) == "API v6, FW v1.1.0-emulator"
+
+    def test_cache(self):
+        serial_numbers = {self.emulators[0].port: "A1", self.emulators[1].port: "A1"}
+        prober = DeviceProber(serial_numbers.get)
+        info = prober.probe_port(self.emulators[0].port)
+        assert info is not None
+        self.emulators[0].stop()
+        self.emulators.pop(0)
+        # the device moved to another port
+        assert prober.probe_port(self.emulators[0].port) is info
+        prober.forget(self.emulators[0].port)
+        assert prober.probe_port(self.emulators[0].port) is not info
+
+
+class Bridge(object):
+    """Websocket server that tells the versions of its device to monitors."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.connections = []
+        self.server = websockets.sync.server.serve(self.handle, "127.0.0.1", 0)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.uri = f"ws://127.0.0.1:{self.server.socket.getsockname()[1]}/ws"
+
+    def handle(self, websocket):
+        self.connections.append(websocket.request.path)
+        if websocket.request.path.endswith(MONITOR_PATH):
+            for _message in websocket:
+                if self.reply is not None:
+                    websocket.send(json.dumps(self.reply))
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+
+
+class TestBridgeProber(unittest.TestCase):
+    def probe(self, reply):
+        bridge = Bridge(reply)
+        try:
+            prober = DeviceProber(lambda portname: None)
+            prober.TIMEOUT = 0.5
+            prober.BRIDGE_TIMEOUT = 0.5
+            info = prober.probe_port(bridge.uri)
+        finally:
+            bridge.close()
+        return info, bridge.connections
+
+    def test_info(self):
+        # the bridge tells the versions without opening its serial port
+        info, connections = self.probe(
+            {"type": "info", "cnfInfo": "c30601020300", "busy": True}
+        )
+        assert str(info) == "API v6, FW v1.2.3"
+        assert connections == ["/ws" + MONITOR_PATH]
+
+    def test_busy(self):
+        info, connections = self.probe({"type": "info", "cnfInfo": None, "busy": True})
+        assert info is None
+        assert connections == ["/ws" + MONITOR_PATH]
+
+    def test_free(self):
+        # a bridge that does not know the device is probed like a serial port
+        info, connections = self.probe({"type": "info", "cnfInfo": None, "busy": False})
+        assert info is None
+        assert connections == ["/ws" + MONITOR_PATH, "/ws"]
+        info, connections = self.probe(None)
+        assert connections == ["/ws" + MONITOR_PATH, "/ws"]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import threading
+import unittest
+
+from ..engine.clock import VirtualClock
+from ..engine.emulator import FirmwareEmulator
+from ..engine.mode import Mode
+from ..engine.output import Output
+from ..engine.pattern import Pattern
+from ..engine.sessions import SessionManager
+from ..engine.simulator import SimulatedSerial
+from ..machine import Machine
+from .test_control import Config, Options
+from .test_pattern import random_image
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.reports = {}
+        self.manager = SessionManager(self.report)
+
+    def report(self, session, status):
+        with self.lock:
+            self.reports.setdefault(session.name, []).append(status)
+
+    def add(self, name, mode, num_colors, rows=20, speed=400):
+        machine = Machine.KH910_KH950
+        pattern = Pattern(random_image(40, rows), Config(machine, mode), num_colors)
+        options = Options(machine, mode, num_colors)
+        clock = VirtualClock()
+        serial = SimulatedSerial(FirmwareEmulator(speed), clock)
+        return self.manager.add(name, pattern, options, clock, serial)
+
+    def test_parallel(self):
+        sessions = [
+            self.add("kh1", Mode.SINGLEBED, 2, rows=10),
+            self.add("kh2", Mode.CLASSIC_RIBBER, 2, rows=20),
+            self.add("kh3", Mode.CLASSIC_RIBBER, 4, rows=30),
+        ]
+        self.manager.start()
+        assert self.manager.wait(30)
+        assert self.manager.running == []
+        for session in sessions:
+            assert session.error is None
+            assert session.output == Output.KNITTING_FINISHED
+            emulator = session.control.transport.emulator
+            assert len(emulator.lines) == session.control.timing.lines + 1
+            # each session knitted its own pattern
+            assert session.status.total_rows == session.pattern.pat_height
+            reports = self.reports[session.name]
+            assert reports[-1].line_number == session.status.line_number
+        # sessions run on their own clocks
+        clocks = [session.control.clock.time() for session in sessions]
+        assert clocks == sorted(clocks)
+        lines = [len(self.reports[session.name]) for session in sessions]
+        assert lines == sorted(lines)
+
+    def test_cancel(self):
+        session = self.add("kh1", Mode.CLASSIC_RIBBER, 4, rows=200)
+        self.manager.start()
+        self.manager.cancel("kh1")
+        assert session.wait(10)
+        assert session.canceled
+        assert session.error is None
+
+    def test_names_and_ports(self):
+        self.add("kh1", Mode.SINGLEBED, 2)
+        with self.assertRaises(ValueError):
+            self.add("kh1", Mode.SINGLEBED, 2)
+        machine = Machine.KH910_KH950
+        pattern = Pattern(random_image(10, 10), Config(machine), 2)
+        options = Options(machine, Mode.SINGLEBED, 2)
+        options.portname = "/dev/ttyACM0"
+        self.manager.add("kh2", pattern, options)
+        with self.assertRaises(ValueError):
+            self.manager.add("kh3", pattern, options)
+        self.manager.remove("kh2")
+        self.manager.add("kh3", pattern, options)
+        assert sorted(self.manager.sessions) == ["kh1", "kh3"]
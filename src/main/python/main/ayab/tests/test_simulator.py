@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import time
+import unittest
+
+import sliplib
+
+from ..engine.clock import VirtualClock
+from ..engine.communication import Token, add_crc
+from ..engine.communication_mock import CommunicationMock
+from ..engine.control import Control
+from ..engine.emulator import FirmwareEmulator, OpState
+from ..engine.engine_fsm import Operation, State
+from ..engine.mode import Mode
+from ..engine.pattern import Pattern
+from ..engine.simulator import SimulatedSerial
+from ..machine import Machine
+from .test_control import Config, Options, Parent
+from .test_pattern import random_image
+
+
+def knit(control, pattern, options, limit=10000000):
+    control.start(pattern, options, Operation.KNIT)
+    steps = 0
+    while control.state != State.FINISHED and steps < limit:
+        control.operate(Operation.KNIT)
+        steps += 1
+    control.stop()
+
+
+class DroppingSerial(SimulatedSerial):
+    """Loses a `cnfLine` frame, as if the connection dropped and came back."""
+
+    def __init__(self, drop_line, *args):
+        super().__init__(*args)
+        self.drop_line = drop_line
+        self.reconnects = 0
+        self.lines_written = 0
+
+    def write(self, data):
+        if bytes(data[1:2]) == bytes([Token.cnfLine.value]):
+            self.lines_written += 1
+            if self.lines_written == self.drop_line:
+                self.reconnects += 1
+                return len(data)
+        return super().write(data)
+
+
+class EdgeSerial(SimulatedSerial):
+    """Answers the line requests of the device from an uploaded job."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.job = None
+        self.lines_written = 0
+        self.requests = []
+        receive = self.emulator.write
+
+        def write(data):
+            if data[1] == Token.reqLine.value:
+                self.requests.append(data[2])
+            receive(data)
+
+        self.emulator.write = write
+
+    def request(self, message, timeout):
+        payloads = [bytes.fromhex(payload) for payload in message["payloads"]]
+        self.job = [(color, payloads[index]) for color, index in message["lines"]]
+        return {"type": "job", "accepted": True}
+
+    def read(self, size=1):
+        # answer at once, before the controller sees the requests
+        while self.job is not None and self.requests:
+            line_number = self.requests.pop(0)
+            index = len(self.emulator.lines)
+            color, payload = self.job[min(index, len(self.job) - 1)]
+            flags = 0
+            if index == len(self.job):
+                payload, flags = bytes(len(payload)), 1
+            msg = bytes([Token.cnfLine.value, line_number, color, flags]) + payload
+            msg += bytes([add_crc(0, msg)])
+            self.emulator.feed(sliplib.encode(msg), self.clock.time())
+        return super().read(size)
+
+    def write(self, data):
+        if bytes(data[1:2]) == bytes([Token.cnfLine.value]):
+            self.lines_written += 1
+        return super().write(data)
+
+
+class TestVirtualClock(unittest.TestCase):
+    def test_sleep(self):
+        clock = VirtualClock(10.0)
+        start = time.monotonic()
+        clock.sleep(3600)
+        clock.sleep(-1)
+        assert clock.time() == 3610.0
+        assert time.monotonic() - start < 1
+
+    def test_communication_mock(self):
+        clock = VirtualClock()
+        com = CommunicationMock(clock=clock)
+        com.open_serial()
+        com.req_start_API6(0, 199, False, False)
+        lines = 0
+        for _i in range(10):
+            msg = com.read_API6()
+            if msg is not None and msg[0] == Token.reqLine.value:
+                lines += 1
+        assert lines > 0
+        assert clock.time() == lines
+
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.parent = Parent()
+
+    def simulate(self, mode, num_colors, machine=Machine.KH910_KH950, rows=20):
+        clock = VirtualClock()
+        serial = SimulatedSerial(FirmwareEmulator(speed=200), clock)
+        control = Control(self.parent, self.parent.engine, clock, serial)
+        pattern = Pattern(random_image(60, rows), Config(machine, mode), num_colors)
+        options = Options(machine, mode, num_colors)
+        options.continuous_reporting = True
+        knit(control, pattern, options)
+        assert control.state == State.FINISHED
+        return control, serial
+
+    def test_modes(self):
+        for mode, num_colors in (
+            (Mode.SINGLEBED, 2),
+            (Mode.CLASSIC_RIBBER, 2),
+            (Mode.CLASSIC_RIBBER, 4),
+            (Mode.MIDDLECOLORSTWICE_RIBBER, 3),
+            (Mode.HEARTOFPLUTO_RIBBER, 4),
+            (Mode.CIRCULAR_RIBBER, 2),
+        ):
+            with self.subTest(mode=mode, num_colors=num_colors):
+                control, serial = self.simulate(mode, num_colors)
+                emulator = serial.emulator
+                assert emulator.crc_errors == 0
+                assert emulator.late_lines == 0
+                assert len(emulator.lines) == control.timing.lines + 1
+                assert emulator.lines[-1][2] & 1
+                assert [line[0] for line in emulator.lines] == [
+                    i % 256 for i in range(len(emulator.lines))
+                ]
+
+    def test_virtual_time(self):
+        start = time.monotonic()
+        control, serial = self.simulate(Mode.CLASSIC_RIBBER, 4, rows=100)
+        # 400 passes of 60 needles at 200 needles per second
+        assert len(serial.emulator.lines) > 400
+        assert serial.clock.time() > 120
+        assert time.monotonic() - start < serial.clock.time() / 10
+        assert serial.emulator.state in (OpState.KNIT, OpState.READY)
+
+    def test_resume(self):
+        clock = VirtualClock()
+        serial = DroppingSerial(5, FirmwareEmulator(speed=200), clock)
+        control = Control(self.parent, self.parent.engine, clock, serial)
+        machine = Machine.KH910_KH950
+        pattern = Pattern(random_image(60, 10), Config(machine), 2)
+        options = Options(machine, Mode.SINGLEBED, 2)
+        knit(control, pattern, options)
+        assert control.state == State.FINISHED
+        emulator = serial.emulator
+        # the lost line is sent again
+        assert [line[0] for line in emulator.lines] == list(range(len(emulator.lines)))
+        assert len(emulator.lines) == control.timing.lines + 1
+
+    def test_edge(self):
+        machine = Machine.KH910_KH950
+        pattern = Pattern(random_image(60, 10), Config(machine), 2)
+        options = Options(machine, Mode.CLASSIC_RIBBER, 2)
+        clock = VirtualClock()
+        serial = SimulatedSerial(FirmwareEmulator(speed=200), clock)
+        knit(Control(self.parent, self.parent.engine, clock, serial), pattern, options)
+        clock = VirtualClock()
+        edge = EdgeSerial(FirmwareEmulator(speed=200), clock)
+        control = Control(self.parent, self.parent.engine, clock, edge)
+        knit(control, pattern, options)
+        assert control.state == State.FINISHED
+        assert control.edge
+        # the controller only followed the progress
+        assert edge.lines_written == 0
+        assert control.status.current_row == 10
+        assert edge.emulator.lines == serial.emulator.lines
+
+    def test_mock(self):
+        clock = VirtualClock()
+        control = Control(self.parent, self.parent.engine, clock)
+        pattern = Pattern(random_image(10, 20), Config(Machine.KH910_KH950), 2)
+        options = Options(Machine.KH910_KH950, Mode.SINGLEBED, 2)
+        start = time.monotonic()
+        knit(control, pattern, options)
+        assert control.state == State.FINISHED
+        # one second per line
+        assert clock.time() >= control.timing.lines
+        assert time.monotonic() - start < clock.time()
@@ -20,6 +20,7 @@
 
 import unittest
 
+from ..engine.messages import Token, decode_message
 from ..engine.status import Status, Carriage, Direction
 
 
@@ -31,8 +32,8 @@ class TestStatus(unittest.TestCase):
     def test_parse_device_state_API6(self):
         p = Status()
         p.active = True
-        msg = bytes([0, 99, 1, 2, 3, 4, 5, 0, 7, 1])
-        p.parse_device_state_API6(1, msg)
+        msg = decode_message(bytes([Token.indState.value, 99, 1, 2, 3, 4, 5, 0, 7, 1]))
+        p.parse_device_state_API6(msg)
         assert p.hall_l == 0x203
         assert p.hall_r == 0x405
         assert p.carriage_type == Carriage.Knit
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+from http import HTTPStatus
+import json
+import socket
+import threading
+import time
+import unittest
+
+import websockets.sync.server
+
+from ..engine.websocketserial import SESSION_HEADER, RingBuffer, WebsocketSerial
+
+
+class EchoServer(object):
+    """Websocket server on a free local port that echoes every message."""
+
+    def __init__(self, handler=None, **kwargs):
+        self.server = websockets.sync.server.serve(
+            handler or self.echo, "127.0.0.1", 0, **kwargs
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.uri = f"ws://127.0.0.1:{self.server.socket.getsockname()[1]}"
+
+    @staticmethod
+    def echo(websocket):
+        for message in websocket:
+            websocket.send(message)
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wrap_around(self):
+        buffer = RingBuffer(8)
+        buffer.write(b"abcdef")
+        assert buffer.read(4) == b"abcd"
+        buffer.write(b"ghijk")
+        assert len(buffer) == 7
+        assert buffer.capacity == 8
+        assert buffer.read(3) == b"efg"
+        assert buffer.read(10) == b"hijk"
+        assert buffer.read(1) == b""
+
+    def test_grow(self):
+        buffer = RingBuffer(4)
+        buffer.write(b"abc")
+        assert buffer.read(2) == b"ab"
+        buffer.write(memoryview(b"defghij"))
+        assert buffer.capacity == 8
+        assert buffer.read(8) == b"cdefghij"
+        buffer.write(b"xy")
+        buffer.clear()
+        assert len(buffer) == 0
+
+
+class TestWebsocketSerial(unittest.TestCase):
+    def setUp(self):
+        self.server = EchoServer()
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+
+    def test_echo(self):
+        ws = WebsocketSerial(self.server.uri, timeout=1)
+        assert ws.is_open
+        ws.write(b"\xc0\x03\xc0")
+        ws.write(memoryview(b"\xc0\x04\xc0"))
+        assert ws.read(4) == b"\xc0\x03\xc0\xc0"
+        assert ws.read(1) == b"\x04"
+        deadline = time.monotonic() + 1
+        while ws.in_waiting < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert ws.read(ws.in_waiting) == b"\xc0"
+        ws.close()
+        assert not ws.is_open
+
+    def test_timeout(self):
+        ws = WebsocketSerial(self.server.uri, timeout=0.05)
+        start = time.monotonic()
+        assert ws.read(1) == b""
+        assert time.monotonic() - start >= 0.05
+        ws.close()
+
+    def test_write_while_reading(self):
+        ws = WebsocketSerial(self.server.uri, timeout=2)
+        result = []
+        reader = threading.Thread(target=lambda: result.append(ws.read(3)))
+        reader.start()
+        time.sleep(0.05)
+        # the pending read does not hold up the write it is waiting for
+        start = time.monotonic()
+        ws.write(b"abc")
+        assert time.monotonic() - start < 0.5
+        reader.join()
+        assert result == [b"abc"]
+        ws.close()
+
+    def test_cancel_read(self):
+        ws = WebsocketSerial(self.server.uri, timeout=5)
+        result = []
+        reader = threading.Thread(target=lambda: result.append(ws.read(1)))
+        reader.start()
+        time.sleep(0.05)
+        ws.cancel_read()
+        reader.join(1)
+        assert result == [b""]
+        # without a pending read, canceling does not affect the next read
+        ws.cancel_read()
+        reader = threading.Thread(target=lambda: result.append(ws.read(3)))
+        reader.start()
+        time.sleep(0.05)
+        ws.write(b"abc")
+        reader.join(1)
+        assert result == [b"", b"abc"]
+        ws.close()
+
+    def test_closed_by_server(self):
+        self.server.close()
+        self.server = EchoServer(lambda websocket: websocket.close())
+        ws = WebsocketSerial(self.server.uri, timeout=5)
+        start = time.monotonic()
+        assert ws.read(1) == b""
+        assert time.monotonic() - start < 1
+        with self.assertRaises(ConnectionError):
+            ws.write(b"abc")
+        ws.close()
+
+    def test_request(self):
+        def reply(websocket):
+            for message in websocket:
+                if isinstance(message, bytes):
+                    websocket.send(message)
+                elif json.loads(message)["type"] == "job":
+                    websocket.send("Error: not a control message")
+                    websocket.send(json.dumps({"type": "job", "accepted": True}))
+
+        self.server.close()
+        self.server = EchoServer(reply)
+        ws = WebsocketSerial(self.server.uri, timeout=1)
+        assert ws.request({"type": "job", "lines": []}, 1) == {
+            "type": "job",
+            "accepted": True,
+        }
+        # no reply to an unknown message
+        assert ws.request({"type": "unknown"}, 0.05) is None
+        # text messages are kept out of the serial data
+        ws.write(b"abc")
+        assert ws.read(4) == b"abc"
+        ws.close()
+
+    def test_reconnect(self):
+        sessions = []
+
+        def drop_first(websocket):
+            sessions.append(websocket.request.headers[SESSION_HEADER])
+            if len(sessions) == 1:
+                websocket.recv()
+                # the connection drops without a closing handshake
+                websocket.socket.shutdown(socket.SHUT_RDWR)
+                return
+            # else
+            EchoServer.echo(websocket)
+
+        self.server.close()
+        self.server = EchoServer(drop_first)
+        ws = WebsocketSerial(self.server.uri, timeout=1)
+        ws.write(b"lost")
+        deadline = time.monotonic() + 5
+        while ws.reconnects == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert ws.reconnects == 1
+        assert ws.is_open
+        ws.write(b"abc")
+        assert ws.read(3) == b"abc"
+        assert sessions[0] == sessions[1]
+        ws.close()
+
+    def test_give_up_reconnecting(self):
+        requests = []
+
+        def reject_after_first(connection, request):
+            requests.append(request)
+            if len(requests) > 1:
+                return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "Gone\n")
+            # else
+            return None
+
+        def drop(websocket):
+            websocket.recv()
+            websocket.socket.shutdown(socket.SHUT_RDWR)
+
+        self.server.close()
+        self.server = EchoServer(drop, process_request=reject_after_first)
+        ws = WebsocketSerial(self.server.uri, timeout=5, reconnect_timeout=0.3)
+        ws.write(b"abc")
+        start = time.monotonic()
+        assert ws.read(1) == b""
+        assert time.monotonic() - start < 2
+        assert not ws.is_open
+        assert len(requests) > 2
+        with self.assertRaises(ConnectionError):
+            ws.write(b"abc")
+        ws.close()
@@ -21,12 +21,13 @@
 
 from __future__ import annotations
 import logging
-from typing import Any, Callable, Literal, Optional, TypeAlias, cast
+from typing import TYPE_CHECKING, Any, Callable, Literal, Optional, TypeAlias, cast
 import numpy as np
 import numpy.typing as npt
 import serial.tools.list_ports
 
-from PySide6.QtWidgets import QMessageBox, QComboBox
+if TYPE_CHECKING:
+    from PySide6.QtWidgets import QMessageBox, QComboBox
 
 
 def even(x: int) -> bool:
@@ -38,13 +39,15 @@ def odd(x: int) -> bool:
 
 
 MessageTypes: TypeAlias = Literal["error", "info", "question", "warning"]
-QMessageBoxFunc: TypeAlias = Callable[..., QMessageBox.StandardButton]
+QMessageBoxFunc: TypeAlias = "Callable[..., QMessageBox.StandardButton]"
 
 
 def display_blocking_popup(
     message: str = "", message_type: MessageTypes = "info"
 ) -> bool:
     """Display a modal message box."""
+    from PySide6.QtWidgets import QMessageBox
+
     logging.debug(f"MessageBox {message_type}: '{message}'")
     box_function: dict[MessageTypes, QMessageBoxFunc] = {
         "error": QMessageBox.critical,
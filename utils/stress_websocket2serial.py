@@ -0,0 +1,190 @@
+"""
+Stress test of websocket2serial serving several serial ports at once.
+
+Each machine is a firmware emulator on its own pseudo-terminal, i.e. a
+virtual serial pair. One bridge serves all of them from one process, and
+every machine knits a pattern at the same time through the bridge, while
+read-only monitors watch each port. The test checks that every knit
+completes with all its lines in sequence, that the monitors of a port all
+see the same stream, and that a port being busy does not lock the others.
+The desktop side uploads each job, so that the bridge answers the line
+requests itself (edge mode), unless the bridge is run with `--no_edge`.
+
+Needs pseudo-terminals (Linux, macOS). From the repository root run:
+
+`PYTHONPATH=src/main/python/main python utils/stress_websocket2serial.py`
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+import websockets
+import websockets.sync.client
+from PIL import Image
+
+import websocket2serial
+from ayab.engine.communication import Token
+from ayab.engine.emulator import FirmwareEmulator
+from ayab.engine.knit_options import KnitOptions
+from ayab.engine.mode import Mode
+from ayab.engine.output import Output
+from ayab.engine.pattern import Pattern
+from ayab.engine.pty_emulator import PtyEmulator
+from ayab.engine.sessions import SessionManager
+from ayab.machine import Machine
+
+MODES = (
+    (Mode.SINGLEBED, 2),
+    (Mode.CLASSIC_RIBBER, 2),
+    (Mode.CLASSIC_RIBBER, 4),
+    (Mode.MIDDLECOLORSTWICE_RIBBER, 3),
+)
+
+
+def start_bridge(bridges):
+    """Serve the bridges on a free local port, return the port."""
+    started = threading.Event()
+    port = []
+
+    async def serve():
+        async with websockets.serve(
+            lambda ws: websocket2serial.websocket_handler(bridges, ws),
+            "127.0.0.1",
+            0,
+        ) as server:
+            port.append(server.sockets[0].getsockname()[1])
+            started.set()
+            await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    started.wait()
+    return port[0]
+
+
+def watch(uri, received):
+    """Collect what a monitor receives until the connection closes."""
+    with websockets.sync.client.connect(uri) as ws:
+        try:
+            for message in ws:
+                received.extend(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+def check_busy(uri):
+    """Whether a second controlling client is turned away."""
+    with websockets.sync.client.connect(uri) as ws:
+        message = ws.recv(5)
+    return isinstance(message, str) and "already in use" in message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-n", "--machines", type=int, default=4)
+    parser.add_argument("-m", "--monitors", type=int, default=2)
+    parser.add_argument("-r", "--rows", type=int, default=20)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=4 * FirmwareEmulator.DEFAULT_SPEED,
+        help="needles per second of the emulated carriages",
+    )
+    parser.add_argument("--no_edge", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    websocket2serial.measure_latency = args.verbose
+    websocket2serial.edge_enabled = not args.no_edge
+
+    emulators = [
+        PtyEmulator(FirmwareEmulator(args.speed)) for _ in range(args.machines)
+    ]
+    for emulator in emulators:
+        emulator.start()
+    bridges = websocket2serial.create_bridges(
+        [f"{emulator.port}=kh{i}" for i, emulator in enumerate(emulators)],
+        websocket2serial.SERIAL_BAUD_RATE,
+    )
+    port = start_bridge(bridges)
+    base = f"ws://127.0.0.1:{port}"
+    names = {bridge.service_info(port, "127.0.0.1").name for bridge in bridges}
+    failures = []
+    if len(names) != len(bridges):
+        failures.append("Zeroconf service names are not unique")
+
+    monitors = []
+    for bridge in bridges:
+        for _ in range(args.monitors):
+            received = bytearray()
+            thread = threading.Thread(
+                target=watch, args=(base + bridge.monitor_path, received), daemon=True
+            )
+            thread.start()
+            monitors.append((bridge, received))
+    time.sleep(0.2)
+
+    machine = Machine.KH910_KH950
+    image = Image.effect_noise((60, args.rows), 64).convert("RGB")
+    manager = SessionManager()
+    sessions = []
+    for i, bridge in enumerate(bridges):
+        mode, num_colors = MODES[i % len(MODES)]
+        options = KnitOptions(base + bridge.path, machine, mode, num_colors)
+        pattern = Pattern(image, options, num_colors)
+        pattern.set_knit_needles(options.start_needle, options.stop_needle, machine)
+        sessions.append(manager.add(bridge.path, pattern, options))
+    start = time.perf_counter()
+    manager.start()
+
+    # while the first port is busy, it turns other clients away,
+    # and the other ports still serve their own clients
+    time.sleep(1)
+    if not check_busy(base + bridges[0].path):
+        failures.append(f"{bridges[0].path} accepted a second client")
+
+    manager.wait(600)
+    elapsed = time.perf_counter() - start
+    time.sleep(0.2)
+
+    print(
+        f"{len(bridges)} machines, {args.monitors} monitors each, "
+        f"{args.rows} rows at {args.speed:.0f} needles/s"
+    )
+    for session, emulator in zip(sessions, emulators):
+        emulator = emulator.emulator
+        numbers = [line[0] for line in emulator.lines]
+        in_sequence = numbers == [i % 256 for i in range(len(numbers))]
+        print(
+            f"{session.name:10} {session.config.mode.name:24} "
+            f"{session.output.name:20} {len(emulator.lines):5} lines, "
+            f"{emulator.late_lines:3} late, {emulator.crc_errors} CRC errors"
+        )
+        if session.output != Output.KNITTING_FINISHED or session.error is not None:
+            failures.append(f"{session.name} did not finish: {session.output.name}")
+        if not in_sequence or emulator.crc_errors > 0:
+            failures.append(f"{session.name} received corrupted lines")
+        streams = {
+            bytes(received)
+            for bridge, received in monitors
+            if bridge.path == session.name
+        }
+        requests = streams and next(iter(streams)).count(
+            bytes([0xC0, Token.reqLine.value])
+        )
+        if len(streams) != 1 or requests != len(emulator.lines):
+            failures.append(f"monitors of {session.name} did not see every reqLine")
+    print(f"Knitted in {elapsed:.2f} s")
+
+    for emulator in emulators:
+        emulator.stop()
+    for failure in failures:
+        print("FAILED: " + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+# This file is part of AYAB.
+#
+#    AYAB is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    AYAB is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with AYAB.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Copyright 2020 Sebastian Oliva, Christian Obersteiner,
+#    Andreas Müller, Christian Gerbrandt
+#    https://github.com/AllYarnsAreBeautiful/ayab-desktop
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import unittest
+import unittest.mock
+
+import websockets.asyncio.client
+import websockets.asyncio.server
+
+import websocket2serial
+
+TIMEOUT = 2.0
+
+
+class Device(object):
+    """The device end of a pseudo-terminal, whose other end the bridge opens."""
+
+    def __init__(self):
+        self.fd, slave = os.openpty()
+        self.name = os.ttyname(slave)
+        os.close(slave)
+        os.set_blocking(self.fd, False)
+        self.received = bytearray()
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+    async def read(self, size):
+        """Wait until `size` bytes were written by the bridge."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + TIMEOUT
+        while len(self.received) < size and loop.time() < deadline:
+            try:
+                self.received += os.read(self.fd, 1024)
+            except BlockingIOError:
+                await asyncio.sleep(0.01)
+        data = bytes(self.received[:size])
+        del self.received[:size]
+        return data
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FakeSerial(object):
+    """A serial port without a file descriptor, read from a thread."""
+
+    port = "fake"
+
+    def __init__(self):
+        self.data = queue.Queue()
+        self.reading = threading.Event()
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def read(self, size):
+        self.reading.set()
+        try:
+            return self.data.get(timeout=0.1)
+        except queue.Empty:
+            return b""
+        finally:
+            self.reading.clear()
+
+
+async def receive(websocket, size):
+    """Receive binary messages until `size` bytes arrived."""
+    data = b""
+    while len(data) < size:
+        data += await asyncio.wait_for(websocket.recv(), TIMEOUT)
+    return data
+
+
+async def until(condition):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TIMEOUT
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@unittest.skipUnless(os.name == "posix", "needs a pseudo-terminal")
+class TestSerialBridge(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.devices = [Device(), Device()]
+        self.bridges = websocket2serial.create_bridges(
+            [f"{self.devices[0].name}=a", f"{self.devices[1].name}=b"],
+            websocket2serial.SERIAL_BAUD_RATE,
+        )
+        self.server = await websockets.asyncio.server.serve(
+            lambda websocket: websocket2serial.websocket_handler(
+                self.bridges, websocket
+            ),
+            "127.0.0.1",
+            0,
+        )
+        port = self.server.sockets[0].getsockname()[1]
+        self.uri = f"ws://127.0.0.1:{port}{websocket2serial.WEBSOCKET_PATH}"
+        self.clients = []
+
+    async def asyncTearDown(self):
+        for client in self.clients:
+            await client.close()
+        self.server.close()
+        await self.server.wait_closed()
+        for bridge in self.bridges:
+            port, bridge.open_port = bridge.open_port, None
+            if port is not None:
+                port.close_handle.cancel()
+                port.ser.close()
+        for device in self.devices:
+            device.close()
+
+    async def connect(self, path, session=None):
+        headers = {websocket2serial.SESSION_HEADER: session} if session else None
+        client = await websockets.asyncio.client.connect(
+            self.uri + path, additional_headers=headers
+        )
+        self.clients.append(client)
+        return client
+
+    async def test_monitors(self):
+        bridge = self.bridges[0]
+        client = await self.connect("/a")
+        monitors = [await self.connect("/a/monitor") for _ in range(2)]
+        await until(lambda: len(bridge.monitors) == 2)
+        await monitors[0].send(b"\x03")
+        self.devices[0].write(b"\xc3\x06")
+        assert await receive(client, 2) == b"\xc3\x06"
+        for monitor in monitors:
+            assert await receive(monitor, 2) == b"\xc3\x06"
+        # monitors cannot write to the serial port
+        await client.send(b"\x01")
+        assert await self.devices[0].read(1) == b"\x01"
+
+    async def test_several_ports(self):
+        a = await self.connect("/a")
+        b = await self.connect("/b")
+        await a.send(b"to a")
+        await b.send(b"to b")
+        assert await self.devices[0].read(4) == b"to a"
+        assert await self.devices[1].read(4) == b"to b"
+        self.devices[1].write(b"from b")
+        self.devices[0].write(b"from a")
+        assert await receive(a, 6) == b"from a"
+        assert await receive(b, 6) == b"from b"
+        # each port has its own write lease
+        other = await self.connect("/a")
+        reply = await asyncio.wait_for(other.recv(), TIMEOUT)
+        assert "already in use" in reply
+        await a.send(b"kept")
+        assert await self.devices[0].read(4) == b"kept"
+
+    async def test_resume(self):
+        bridge = self.bridges[0]
+        client = await self.connect("/a", "session")
+        await client.send(b"\x03")
+        assert await self.devices[0].read(1) == b"\x03"
+        # the connection drops without a close frame
+        client.transport.abort()
+        await until(lambda: bridge.open_port is not None)
+        kept = bridge.open_port
+        self.devices[0].write(b"\xc3\x06")
+        await asyncio.sleep(0.1)
+        resumed = await self.connect("/a", "session")
+        assert await receive(resumed, 2) == b"\xc3\x06"
+        assert bridge.open_port is None
+        assert kept.ser.is_open
+        await resumed.send(b"\x82\x00")
+        assert await self.devices[0].read(2) == b"\x82\x00"
+        # a normal close ends the session
+        await resumed.close()
+        await until(lambda: not kept.ser.is_open)
+        assert bridge.open_port is None
+
+    async def test_linger(self):
+        bridge = self.bridges[0]
+        client = await self.connect("/a", "session")
+        await client.send(b"\x03")
+        assert await self.devices[0].read(1) == b"\x03"
+        client.transport.abort()
+        await until(lambda: bridge.open_port is not None)
+        kept = bridge.open_port
+        # another session gets a port opened anew
+        other = await self.connect("/a", "other")
+        await until(lambda: not kept.ser.is_open)
+        assert bridge.open_port is None
+        # which is closed when the session does not resume in time
+        with unittest.mock.patch.object(websocket2serial, "SERIAL_LINGER", 0.1):
+            other.transport.abort()
+            await until(lambda: bridge.open_port is not None)
+            kept = bridge.open_port
+            await until(lambda: not kept.ser.is_open)
+        assert bridge.open_port is None
+
+    async def test_job(self):
+        client = await self.connect("/a")
+        payloads = [bytes([0x0F] * 25), bytes([0xF0] * 25)]
+        await client.send(
+            json.dumps(
+                {
+                    "type": "job",
+                    "repeat": False,
+                    "payloads": [payload.hex() for payload in payloads],
+                    "lines": [[0, 0], [1, 1]],
+                }
+            )
+        )
+        reply = json.loads(await asyncio.wait_for(client.recv(), TIMEOUT))
+        assert reply == {"type": "job", "accepted": True}
+        device = self.devices[0]
+        for line, (color, payload) in enumerate([(0, payloads[0]), (1, payloads[1])]):
+            device.write(bytes([0xC0, 0x82, line, 0xC0]))
+            frame = websocket2serial.cnf_line_frame(line, color, 0, payload)
+            assert await device.read(len(frame)) == frame
+            # the desktop application still sees the requests
+            assert await receive(client, 4) == bytes([0xC0, 0x82, line, 0xC0])
+        # after the last line, the device gets a blank final line
+        device.write(bytes([0xC0, 0x82, 2, 0xC0]))
+        frame = websocket2serial.cnf_line_frame(2, 0, 1, bytes(25))
+        assert await device.read(len(frame)) == frame
+
+    async def test_info(self):
+        bridge = self.bridges[0]
+        probe = await self.connect("/a/monitor")
+
+        async def info():
+            await probe.send(json.dumps({"type": "info"}))
+            while True:
+                message = await asyncio.wait_for(probe.recv(), TIMEOUT)
+                if isinstance(message, str):
+                    return json.loads(message)
+
+        assert await info() == {"type": "info", "cnfInfo": None, "busy": False}
+        client = await self.connect("/a", "session")
+        await client.send(b"\xc0\x03\xc0")
+        assert await self.devices[0].read(3) == b"\xc0\x03\xc0"
+        self.devices[0].write(b"\xc0\xc3\x06\x01\x00\x00\xc0")
+        assert await receive(client, 7) == b"\xc0\xc3\x06\x01\x00\x00\xc0"
+        assert await info() == {"type": "info", "cnfInfo": "c306010000", "busy": True}
+        # the port kept open for the session to resume is left alone
+        client.transport.abort()
+        await until(lambda: bridge.open_port is not None)
+        assert (await info())["busy"]
+        assert bridge.open_port.ser.is_open
+
+
+class TestSerialReader(unittest.IsolatedAsyncioTestCase):
+    async def test_reader_thread(self):
+        ser = FakeSerial()
+        delivered, kept = [], []
+        stop = websocket2serial.start_serial_reader(
+            ser,
+            lambda item: delivered.append(item[1]),
+            asyncio.get_running_loop(),
+            lambda item: kept.append(item[1]),
+        )
+        ser.data.put(b"\x01")
+        await until(lambda: delivered)
+        await until(ser.reading.is_set)
+        # the thread reads data while reading stops
+        ser.data.put(b"\x02")
+        stop()
+        await until(lambda: kept)
+        assert delivered == [b"\x01"]
+        assert kept == [b"\x02"]
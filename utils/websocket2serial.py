@@ -2,10 +2,18 @@ import serial
 import asyncio
 import websockets
 import websockets.exceptions
+from websockets.frames import CloseCode
 import logging
+import os
 import socket
 import argparse
+import collections
 import contextlib
+import itertools
+import json
+import statistics
+import threading
+import time
 from zeroconf.asyncio import (
     AsyncServiceInfo,
     AsyncZeroconf,
@@ -24,90 +32,473 @@ SERIAL_TIMEOUT = 0.1
 # --- WebSocket Configuration ---
 WEBSOCKET_HOST = "0.0.0.0"  # Listen on all available interfaces
 WEBSOCKET_PORT = 8080
-WEBSOCKET_PATH = "/ws"
+WEBSOCKET_PATH = "/ws"  # with several serial ports, followed by "/<name>"
+MONITOR_PATH = "/monitor"  # appended to the path of a port for read-only clients
+BROADCAST_CAPACITY = 1024  # chunks of serial data kept for slow monitors
 
 # --- Zeroconf Configuration ---
 ZEROCONF_SERVICE_TYPE = "_ayab._tcp.local."
 ZEROCONF_SERVICE_NAME = "Ayab Serial Bridge"
 
+# --- Session Resume Configuration ---
+# Clients identify their session with this header, so that a client that
+# reconnects after its connection dropped can take over the serial port.
+# It must match the desktop application (ayab/engine/websocketserial.py).
+SESSION_HEADER = "X-Ayab-Session"
+SERIAL_LINGER = 60.0  # seconds to keep the serial port open for a session
+RESUME_TIMEOUT = 5.0  # seconds to wait for a stale connection to let go
+
+# --- Edge Execution Configuration ---
+# With a job uploaded by the desktop application, the bridge answers the
+# line requests of the device itself. The protocol must match the desktop
+# application (ayab/engine/communication.py and ayab/engine/edge.py).
+CNF_INFO = 0xC3
+REQ_LINE = 0x82
+CNF_LINE = 0x42
+BLOCK_LENGTH = 256
+SLIP_END = b"\xc0"
+SLIP_ESC = b"\xdb"
+SLIP_ESC_END = b"\xdb\xdc"
+SLIP_ESC_ESC = b"\xdb\xdd"
+
+# --- Latency Measurement Configuration (set via command-line arguments) ---
+LATENCY_REPORT_INTERVAL = 10.0  # seconds between latency reports
+
 # Global variables for Zeroconf instance and service info
 zeroconf_instance = None
-service_info = None
-serial_port_lock = asyncio.Lock()
+service_infos = []
+measure_latency = False
+edge_enabled = True
+
+
+class BroadcastBuffer:
+    """
+    The recent data read from the serial port, shared by the read-only
+    monitors. Each chunk is stored once for all of them, and each monitor
+    keeps its own position in the buffer, so that a slow monitor misses
+    data rather than holding up the knitting client or the other monitors.
+
+    The latest `cnfInfo` message of the device is kept as well, to tell
+    its versions to the clients probing the bridge.
+    """
+
+    def __init__(self, capacity=BROADCAST_CAPACITY):
+        self.chunks = collections.deque(maxlen=capacity)
+        self.end = 0  # position after the newest chunk
+        self.waiter = None
+        self.info = None
+        self.decoder = SlipDecoder()
+
+    def publish(self, data):
+        for message in self.decoder.feed(data):
+            if message[0] == CNF_INFO and len(message) > 1:
+                self.info = message
+        self.chunks.append(data)
+        self.end += 1
+        waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            waiter.set_result(None)
+
+    async def read(self, position):
+        """
+        Wait for data after `position`, and return the chunks still in the
+        buffer, how many chunks were missed, and the new position.
+        """
+        while position >= self.end:
+            if self.waiter is None:
+                self.waiter = asyncio.get_running_loop().create_future()
+            # a monitor going away must not cancel the wait of the others
+            await asyncio.shield(self.waiter)
+        start = self.end - len(self.chunks)
+        missed = max(0, start - position)
+        chunks = list(itertools.islice(self.chunks, position + missed - start, None))
+        return chunks, missed, self.end
+
+
+class OpenPort:
+    """
+    A serial port opened for a client session, together with the data
+    read from it that could not be sent to the client, and the job
+    uploaded by the client, if any.
+    """
+
+    def __init__(self, ser, session):
+        self.ser = ser
+        self.session = session
+        self.unsent = bytearray()
+        self.close_handle = None
+        self.job = None
+        self.decoder = SlipDecoder()
+
+
+def _crc_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            lsb = crc & 1
+            crc >>= 1
+            if lsb:
+                crc ^= 0x8C
+        table[i] = crc
+    return bytes(table)
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc8(data):
+    """The Maxim/Dallas CRC of the device protocol."""
+    crc = 0
+    for byte in data:
+        crc = CRC_TABLE[crc ^ byte]
+    return crc
+
+
+def cnf_line_frame(line_number, color, flags, payload):
+    """The SLIP frame of a `cnfLine` message."""
+    message = bytes([CNF_LINE, line_number, color, flags]) + payload
+    message += bytes([crc8(message)])
+    message = message.replace(SLIP_ESC, SLIP_ESC_ESC).replace(SLIP_END, SLIP_ESC_END)
+    return SLIP_END + message + SLIP_END
+
 
+class SlipDecoder:
+    """Splits the data read from the serial port into messages."""
 
-async def serial_to_websocket_task(serial_port_name, websocket, ser):
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data):
+        """Return the messages completed by `data`."""
+        *frames, self.buffer = (self.buffer + data).split(SLIP_END)
+        return [
+            frame.replace(SLIP_ESC_END, SLIP_END).replace(SLIP_ESC_ESC, SLIP_ESC)
+            for frame in frames
+            if frame
+        ]
+
+
+class EdgeJob:
+    """
+    A knitting job uploaded by the desktop application: the color and
+    payload of each line in the order that the device requests them.
+
+    The bookkeeping of the requested line numbers follows
+    `Control.cnf_line_API6` in the desktop application, which still receives
+    the requests to show the progress, so that both agree on when the job
+    ends. After the last line, or a request out of sequence, the device
+    gets a blank line flagged as the final one.
+    """
+
+    def __init__(self, message):
+        payloads = [bytes.fromhex(payload) for payload in message["payloads"]]
+        self.lines = [(color, payloads[index]) for color, index in message["lines"]]
+        if not self.lines:
+            raise ValueError("no lines")
+        self.repeat = bool(message["repeat"])
+        self.final_payload = bytes(len(self.lines[-1][1]))
+        self.former_request = 0
+        self.line_block = 0
+        self.finishing = False
+
+    def answer(self, line_number):
+        """The `cnfLine` frame answering a `reqLine` request."""
+        if self.finishing:
+            return cnf_line_frame(line_number, 0, 1, self.final_payload)
+        # else
+        if self.former_request == BLOCK_LENGTH - 1 and line_number == 0:
+            self.line_block += 1
+        elif line_number not in (self.former_request, self.former_request + 1):
+            logging.error(f"Edge: Requested line {line_number} out of sequence")
+            self.finishing = True
+            return None
+        self.former_request = line_number
+        index = line_number + BLOCK_LENGTH * self.line_block
+        if not self.repeat and index >= len(self.lines) - 1:
+            self.finishing = True
+        color, payload = self.lines[index % len(self.lines)]
+        return cnf_line_frame(line_number, color, 0, payload)
+
+
+def answer_line_requests(port, data, received, latency):
+    """Answer the line requests in the data read from the serial port."""
+    for message in port.decoder.feed(data):
+        if len(message) < 2 or message[0] != REQ_LINE:
+            continue
+        # else
+        frame = port.job.answer(message[1])
+        if frame is not None:
+            port.ser.write(frame)
+            if latency:
+                latency.add(time.perf_counter() - received)
+
+
+def handle_control_message(port, text):
+    """
+    Handle a JSON control message from the desktop application, and
+    return the reply, or `None` for an unknown message.
+    """
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("type") != "job":
+        return None
+    # else
+    if not edge_enabled:
+        return {"type": "job", "accepted": False, "error": "edge mode is disabled"}
+    # else
+    try:
+        job = EdgeJob(message)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return {"type": "job", "accepted": False, "error": f"invalid job: {e!r}"}
+    port.job = job
+    port.decoder = SlipDecoder()
+    logging.info(
+        f"Edge: Answering {len(job.lines)} line requests of "
+        f"{port.ser.port}" + (" repeatedly" if job.repeat else "")
+    )
+    return {"type": "job", "accepted": True}
+
+
+def is_info_request(text):
+    """Whether a text message is an `info` control message."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(message, dict) and message.get("type") == "info"
+
+
+class LatencyStats:
+    """
+    Collects the forwarding delays in one direction of the bridge and
+    periodically logs a summary of them.
+    """
+
+    def __init__(self, direction):
+        self.direction = direction
+        self.delays = []
+        self.last_report = time.perf_counter()
+
+    def add(self, delay):
+        self.delays.append(delay)
+        if time.perf_counter() - self.last_report >= LATENCY_REPORT_INTERVAL:
+            self.report()
+
+    def report(self):
+        self.last_report = time.perf_counter()
+        if not self.delays:
+            return
+        delays = sorted(self.delays)
+        self.delays = []
+        p95 = delays[min(len(delays) - 1, int(len(delays) * 0.95))]
+        logging.info(
+            f"Latency {self.direction}: {len(delays)} messages, "
+            f"mean {statistics.fmean(delays) * 1000:.2f} ms, "
+            f"median {statistics.median(delays) * 1000:.2f} ms, "
+            f"95% {p95 * 1000:.2f} ms, max {delays[-1] * 1000:.2f} ms"
+        )
+
+
+def start_serial_reader(ser, deliver, loop, keep=None):
+    """
+    Calls `deliver((timestamp, data))` on the event loop as soon as data
+    arrives on the serial port, and `deliver((timestamp, exception))`
+    if reading fails.
+
+    Where the event loop can watch the serial port's file descriptor
+    (`loop.add_reader`), data is read from the loop itself. Otherwise,
+    e.g. on Windows, a thread blocks in `ser.read` and hands the data
+    over to the loop. Data that the thread has read when reading stops
+    is not delivered, but passed to `keep` if given.
+
+    Returns a function that stops reading, to be called on the event loop.
+    """
+
+    def read():
+        # the first byte is already waiting, or arrives within the timeout
+        return ser.read(ser.in_waiting or 1)
+
+    try:
+        fd = ser.fileno()
+
+        def on_readable():
+            try:
+                data = read()
+            except Exception as e:
+                loop.remove_reader(fd)
+                deliver((time.perf_counter(), e))
+                return
+            if data:
+                deliver((time.perf_counter(), data))
+
+        loop.add_reader(fd, on_readable)
+        logging.debug(f"Watching serial port {ser.port} from the event loop")
+        return lambda: loop.remove_reader(fd)
+    except (AttributeError, NotImplementedError):
+        pass
+
+    stopped = threading.Event()
+
+    def hand_over(item):
+        # runs on the event loop, so reading cannot stop halfway through
+        if not stopped.is_set():
+            deliver(item)
+        elif keep is not None and isinstance(item[1], bytes):
+            keep(item)
+
+    def reader_thread():
+        while not stopped.is_set():
+            try:
+                data = read()
+            except Exception as e:
+                if not stopped.is_set():
+                    loop.call_soon_threadsafe(hand_over, (time.perf_counter(), e))
+                return
+            if data:
+                loop.call_soon_threadsafe(hand_over, (time.perf_counter(), data))
+
+    thread = threading.Thread(
+        target=reader_thread, name=f"SerialReader {ser.port}", daemon=True
+    )
+    thread.start()
+    logging.debug(f"Reading serial port {ser.port} from a thread")
+    return stopped.set
+
+
+async def serial_to_websocket_task(serial_port_name, websocket, port, broadcast):
     """
     Asynchronously reads data from the serial port and sends it to the
     WebSocket. This task runs continuously as long as the WebSocket
     connection is open.
+
+    Data is forwarded as soon as it arrives on the serial port,
+    without polling, and published to the monitors in `broadcast`.
+    Data that cannot be sent is kept in `port.unsent`, and sent first
+    when the session resumes. With a job uploaded to `port.job`, the line
+    requests of the device are answered at once, before forwarding them.
     """
     logging.info(
         f"Starting serial_to_websocket_task for {serial_port_name}"
         f"(WS client: {websocket.remote_address})"
     )
+    ser, unsent = port.ser, port.unsent
+    queue = asyncio.Queue()
+    edge_latency = LatencyStats("reqLine -> cnfLine") if measure_latency else None
+
+    def deliver(item):
+        received, data = item
+        if isinstance(data, bytes):
+            if port.job is not None:
+                answer_line_requests(port, data, received, edge_latency)
+            broadcast.publish(data)
+        queue.put_nowait(item)
+
+    def keep(item):
+        # read by the reader thread after the connection ended
+        unsent.extend(item[1])
+
+    stop_reader = start_serial_reader(ser, deliver, asyncio.get_running_loop(), keep)
+    latency = LatencyStats("Serial -> WS") if measure_latency else None
+    if unsent:
+        logging.info(f"Serial -> WS: Resending {len(unsent)} bytes not sent before.")
+        queue.put_nowait((time.perf_counter(), bytes(unsent)))
+        unsent.clear()
     try:
         while True:
-            if ser.in_waiting > 0:
-                data = ser.read(ser.in_waiting)  # Read all available data
-                logging.debug(
-                    f"Serial -> WS: Read {len(data)} bytes from "
-                    f"{serial_port_name}: {data!r}"
+            received, data = await queue.get()
+            if isinstance(data, Exception):
+                logging.error(f"Serial -> WS: Error reading from serial port: {data}")
+                break
+            # Read whatever else has arrived in the meantime
+            while not queue.empty():
+                _, more = queue.get_nowait()
+                if isinstance(more, Exception):
+                    queue.put_nowait((received, more))
+                    break
+                data += more
+            logging.debug(
+                f"Serial -> WS: Read {len(data)} bytes from "
+                f"{serial_port_name}: {data!r}"
+            )
+            try:
+                await websocket.send(data)  # Send raw binary data
+                logging.debug(f"Serial -> WS: Sent {len(data)} bytes to WS client.")
+            except websockets.exceptions.ConnectionClosedOK:
+                logging.info(
+                    f"Serial -> WS: WebSocket client "
+                    f"{websocket.remote_address} disconnected cleanly."
                 )
-                try:
-                    await websocket.send(data)  # Send raw binary data
-                    logging.debug(f"Serial -> WS: Sent {len(data)} bytes to WS client.")
-                except websockets.exceptions.ConnectionClosedOK:
-                    logging.info(
-                        f"Serial -> WS: WebSocket client "
-                        f"{websocket.remote_address} disconnected cleanly."
-                    )
-                    break  # Exit task if client disconnects
-                except Exception:
-                    logging.exception("Serial -> WS: Error sending data to WebSocket")
-                    break  # Exit task on other WebSocket errors
-            await asyncio.sleep(SERIAL_TIMEOUT)
+                break  # Exit task if client disconnects
+            except Exception:
+                logging.exception("Serial -> WS: Error sending data to WebSocket")
+                unsent.extend(data)
+                break  # Exit task on other WebSocket errors
+            if latency:
+                latency.add(time.perf_counter() - received)
     except Exception:
         logging.exception("Serial -> WS task encountered an unexpected error")
     finally:
+        stop_reader()
+        # keep what was read but not sent yet
+        while not queue.empty():
+            _, data = queue.get_nowait()
+            if isinstance(data, bytes):
+                unsent.extend(data)
+        if latency:
+            latency.report()
+            edge_latency.report()
         logging.info(
             f"Stopped serial_to_websocket_task for {serial_port_name} "
             f"(WS client: {websocket.remote_address})"
         )
 
 
-async def websocket_to_serial_task(serial_port_name, websocket, ser):
+async def websocket_to_serial_task(serial_port_name, websocket, port):
     """
     Asynchronously receives data from the WebSocket and sends it to the
     serial port. This task runs continuously as long as the WebSocket
     connection is open.
+
+    Binary messages are serial data, text messages are JSON control
+    messages, which are answered on the WebSocket.
     """
     logging.info(
         f"Starting websocket_to_serial_task for {serial_port_name} "
         f"(WS client: {websocket.remote_address})"
     )
+    latency = LatencyStats("WS -> Serial") if measure_latency else None
     try:
         while True:
             try:
                 # Receive data from WebSocket. 'await websocket.recv()' is blocking.
                 # It will wait until data is received or connection is closed.
                 message = await websocket.recv()
+                received = time.perf_counter()
                 logging.debug(
                     f"WS -> Serial: Received {len(message)} bytes from "
                     f"WS client: {message!r}"
                 )
 
                 if isinstance(message, bytes):
-                    ser.write(message)
+                    port.ser.write(message)
                     logging.debug(
                         f"WS -> Serial: Wrote {len(message)} bytes to "
                         f"{serial_port_name}."
                     )
+                    if latency:
+                        latency.add(time.perf_counter() - received)
                 else:
-                    logging.warning(
-                        f"WS -> Serial: Received non-binary message "
-                        f"(type: {type(message)}), discarding: {message!r}"
-                    )
+                    reply = handle_control_message(port, message)
+                    if reply is None:
+                        logging.warning(
+                            f"WS -> Serial: Received unknown text message, "
+                            f"discarding: {message!r}"
+                        )
+                    else:
+                        await websocket.send(json.dumps(reply))
 
             except websockets.exceptions.ConnectionClosedOK:
                 logging.info(
@@ -129,115 +520,348 @@ async def websocket_to_serial_task(serial_port_name, websocket, ser):
     except Exception:
         logging.exception("WS -> Serial task encountered an unexpected error")
     finally:
+        if latency:
+            latency.report()
         logging.info(
             f"Stopped websocket_to_serial_task for {serial_port_name} "
             f"(WS client: {websocket.remote_address})"
         )
 
 
-async def serial_websocket_handler(serial_port_name, baud_rate, websocket):
+class SerialBridge:
     """
-    Main handler for each new WebSocket connection.
-    It opens the serial port and creates two tasks for bidirectional
-    communication.
+    Relays one serial port, on its own websocket path and with its own
+    Zeroconf record, lock and monitors, so that one process can serve
+    several machines independently.
     """
 
-    if websocket.request.path != WEBSOCKET_PATH:
-        error_message = (
-            f"Error: No handler for path {websocket.request.path}, "
-            f"closing connection"
+    def __init__(self, serial_port_name, baud_rate, path=WEBSOCKET_PATH):
+        self.serial_port_name = serial_port_name
+        self.baud_rate = baud_rate
+        self.path = path
+        self.monitor_path = path + MONITOR_PATH
+        self.lock = asyncio.Lock()
+        # The session using the serial port, the task serving it, and the port
+        # kept open after its connection dropped
+        self.active_session = None
+        self.active_task = None
+        self.open_port = None
+        # The serial data shared with the monitors, and their connections
+        self.broadcast = BroadcastBuffer()
+        self.monitors = set()
+
+    async def monitor_handler(self, websocket):
+        """
+        Handler for a read-only monitor connection, which receives the data
+        read from the serial port while another client holds the write lease.
+
+        A monitor may also ask for the versions of the device with an `info`
+        control message, so that probing the bridge never takes over the
+        serial port from the client using it, or from a session that may
+        resume.
+        """
+        self.monitors.add(websocket)
+        logging.info(
+            f"Monitor {websocket.remote_address} connected to "
+            f"{self.serial_port_name} ({len(self.monitors)} monitors)."
         )
-        await websocket.send(error_message)
-        logging.error(error_message)
-        return
 
-    logging.info(
-        f"New WebSocket connection from {websocket.remote_address}. "
-        f"Attempting to open serial port {serial_port_name}..."
-    )
-    ser = None
-    acquired = False
-    try:
-        await asyncio.wait_for(serial_port_lock.acquire(), timeout=0.01)
-        acquired = True
+        async def send():
+            position = self.broadcast.end  # only data from now on
+            while True:
+                chunks, missed, position = await self.broadcast.read(position)
+                if missed:
+                    logging.debug(
+                        f"Monitor {websocket.remote_address} missed {missed} chunks."
+                    )
+                for chunk in chunks:
+                    await websocket.send(chunk)
+
+        async def receive():
+            async for message in websocket:
+                if isinstance(message, str) and is_info_request(message):
+                    await websocket.send(json.dumps(self.info_reply()))
+                    continue
+                # else
+                logging.warning(
+                    f"Discarding message from read-only monitor "
+                    f"{websocket.remote_address}: {message!r}"
+                )
+
+        tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
         try:
-            ser = serial.Serial(
-                port=serial_port_name,
-                baudrate=baud_rate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=SERIAL_TIMEOUT,
-            )
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+                with contextlib.suppress(
+                    asyncio.CancelledError, websockets.exceptions.ConnectionClosed
+                ):
+                    await task
+            self.monitors.discard(websocket)
             logging.info(
-                f"Serial port {serial_port_name} opened for "
-                f"{websocket.remote_address}."
+                f"Monitor {websocket.remote_address} disconnected "
+                f"({len(self.monitors)} monitors)."
             )
 
-            # Create two concurrent tasks for bidirectional communication
-            producer_task = asyncio.create_task(
-                serial_to_websocket_task(serial_port_name, websocket, ser)
-            )
-            consumer_task = asyncio.create_task(
-                websocket_to_serial_task(serial_port_name, websocket, ser)
-            )
-
-            # Wait for both tasks to complete (e.g., if WebSocket disconnects
-            # or an error occurs)
-            _, pending = await asyncio.wait(
-                [producer_task, consumer_task],
-                return_when=asyncio.FIRST_COMPLETED,  # Stop if one task completes
+    def info_reply(self):
+        """
+        The reply to an `info` control message: the latest `cnfInfo` message
+        read from the device, if any, and whether the serial port is in use
+        or kept open for a session to resume.
+        """
+        info = self.broadcast.info
+        return {
+            "type": "info",
+            "cnfInfo": None if info is None else info.hex(),
+            "busy": self.lock.locked() or self.open_port is not None,
+        }
+
+    def take_serial_port(self, session):
+        """
+        Return the serial port kept open for `session`, or open it anew
+        (closing a port kept open for another session).
+        """
+        port, self.open_port = self.open_port, None
+        if port is not None:
+            port.close_handle.cancel()
+            if session is not None and port.session == session and port.ser.is_open:
+                logging.info(
+                    f"Resuming session on serial port {self.serial_port_name}."
+                )
+                return port
+            # else
+            port.ser.close()
+            logging.info(
+                f"Serial port {self.serial_port_name} closed for a new session."
             )
+        ser = serial.Serial(
+            port=self.serial_port_name,
+            baudrate=self.baud_rate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=SERIAL_TIMEOUT,
+        )
+        return OpenPort(ser, session)
+
+    def release_serial_port(self, port, resumable):
+        """
+        Close the serial port, or keep it open for `SERIAL_LINGER` seconds
+        if the session may resume, so that the device is not reset and
+        the knitting can continue.
+        """
+        if not resumable or port.session is None or not port.ser.is_open:
+            if port.ser.is_open:
+                port.ser.close()
+            logging.info(f"Serial port {self.serial_port_name} closed.")
+            return
+        # else
+        logging.info(
+            f"Keeping serial port {self.serial_port_name} open for "
+            f"{SERIAL_LINGER:.0f} s for the session to resume."
+        )
 
-            for task in pending:  # Cancel any remaining pending tasks
-                task.cancel()
-                with contextlib.suppress(asyncio.CancelledError):
-                    await task  # Await to ensure cancellation completes
+        def close():
+            if self.open_port is port:
+                self.open_port = None
+                port.ser.close()
+                logging.info(
+                    f"Serial port {self.serial_port_name} closed, "
+                    "the session did not resume."
+                )
 
+        port.close_handle = asyncio.get_running_loop().call_later(SERIAL_LINGER, close)
+        self.open_port = port
+
+    async def serial_websocket_handler(self, websocket):
+        """
+        Main handler for each new WebSocket connection.
+        It opens the serial port and creates two tasks for bidirectional
+        communication.
+
+        The client connected on `path` holds the write lease on the serial
+        port, which only one client can hold at a time. Any number of clients
+        can watch on `monitor_path`.
+
+        A connection that resumes the session of the connection using the
+        serial port takes over from it, as the old connection has most likely
+        dropped without the server noticing yet.
+        """
+        session = websocket.request.headers.get(SESSION_HEADER)
+        lock_timeout = 0.01
+        if (
+            session is not None
+            and session == self.active_session
+            and self.active_task is not None
+        ):
             logging.info(
-                f"WebSocket communication closed for {websocket.remote_address}."
+                f"Session resumed by {websocket.remote_address}, "
+                "dropping its previous connection."
             )
+            stale_task, self.active_task = self.active_task, None
+            stale_task.cancel()
+            lock_timeout = RESUME_TIMEOUT
 
-        except serial.SerialException as e:
-            logging.error(
-                f"Failed to open serial port {serial_port_name} for "
-                f"{websocket.remote_address}: {e}"
-            )
-            # Send error to WebSocket client if connection is still open
+        logging.info(
+            f"New WebSocket connection from {websocket.remote_address}. "
+            f"Attempting to open serial port {self.serial_port_name}..."
+        )
+        port = None
+        acquired = False
+        try:
+            await asyncio.wait_for(self.lock.acquire(), timeout=lock_timeout)
+            acquired = True
+            self.active_session, self.active_task = session, asyncio.current_task()
             try:
-                error_message = (
-                    f"Error: Could not open serial port {serial_port_name}. {e}".encode(
-                        "utf-8"
+                port = self.take_serial_port(session)
+                logging.info(
+                    f"Serial port {self.serial_port_name} opened for "
+                    f"{websocket.remote_address}."
+                )
+
+                # Create two concurrent tasks for bidirectional communication
+                producer_task = asyncio.create_task(
+                    serial_to_websocket_task(
+                        self.serial_port_name, websocket, port, self.broadcast
                     )
                 )
-                await websocket.send(error_message)
-            except Exception:
-                pass  # Ignore if WebSocket is already closed
-        except Exception:
-            logging.exception(
-                "An unexpected error occurred in serial_websocket_handler"
-            )
+                consumer_task = asyncio.create_task(
+                    websocket_to_serial_task(self.serial_port_name, websocket, port)
+                )
+
+                try:
+                    # Wait for both tasks to complete (e.g., if WebSocket
+                    # disconnects or an error occurs)
+                    await asyncio.wait(
+                        [producer_task, consumer_task],
+                        return_when=asyncio.FIRST_COMPLETED,  # Stop if one completes
+                    )
+                finally:
+                    # Cancel remaining tasks
+                    for task in (producer_task, consumer_task):
+                        task.cancel()
+                        with contextlib.suppress(asyncio.CancelledError):
+                            await task  # Await to ensure cancellation completes
 
-        finally:
-            if ser and ser.is_open:
-                ser.close()
                 logging.info(
-                    f"Serial port {serial_port_name} closed for "
-                    f"{websocket.remote_address}."
+                    f"WebSocket communication closed for {websocket.remote_address}."
+                )
+
+            except serial.SerialException as e:
+                logging.error(
+                    f"Failed to open serial port {self.serial_port_name} for "
+                    f"{websocket.remote_address}: {e}"
+                )
+                # Send error to WebSocket client if connection is still open
+                try:
+                    error_message = (
+                        f"Error: Could not open serial port "
+                        f"{self.serial_port_name}. {e}".encode("utf-8")
+                    )
+                    await websocket.send(error_message)
+                except Exception:
+                    pass  # Ignore if WebSocket is already closed
+            except Exception:
+                logging.exception(
+                    "An unexpected error occurred in serial_websocket_handler"
                 )
 
-    except asyncio.TimeoutError:
-        # Another connection acquired the lock just before us
-        error_message = (
-            f"Error: Serial port {serial_port_name} is already "
-            "in use by another connection."
+            finally:
+                if port is not None:
+                    # a client that closed the connection normally is done
+                    resumable = websocket.close_code != CloseCode.NORMAL_CLOSURE
+                    self.release_serial_port(port, resumable)
+
+        except asyncio.TimeoutError:
+            # Another connection acquired the lock just before us
+            error_message = (
+                f"Error: Serial port {self.serial_port_name} is already "
+                "in use by another connection. "
+                f"Connect to {self.monitor_path} to watch it."
+            )
+            await websocket.send(error_message)
+            logging.error(error_message)
+
+        except asyncio.CancelledError:
+            if self.active_task is asyncio.current_task():
+                raise
+            # else
+            logging.info(
+                f"Connection from {websocket.remote_address} was taken over "
+                "by its resumed session."
+            )
+
+        finally:
+            if acquired:
+                if self.active_task is asyncio.current_task():
+                    self.active_session = self.active_task = None
+                self.lock.release()
+
+    def service_info(self, websocket_port, local_ip):
+        """The Zeroconf record announcing this serial port."""
+        # Optional properties for the service (can be useful for clients)
+        properties = {
+            "api_ver": "0.1",
+            "port": str(websocket_port),
+            "path": self.path,
+            "monitor_path": self.monitor_path,
+            "board_id": (
+                f"Ayab Serial to WebSocket Bridge for {self.serial_port_name} at "
+                f"{self.baud_rate} baud"
+            ),
+            "serial_port_name": self.serial_port_name,
+            "serial_baud_rate": str(self.baud_rate),
+            "edge": "1" if edge_enabled else "0",
+        }
+        return AsyncServiceInfo(
+            ZEROCONF_SERVICE_TYPE,
+            f"{ZEROCONF_SERVICE_NAME} - {self.serial_port_name}@{self.baud_rate}"
+            f"._ayab._tcp.local.",  # Full service name including port and baud rate
+            addresses=[socket.inet_aton(local_ip)],  # Convert IP to binary format
+            port=websocket_port,
+            properties=properties,
+            server=f"{socket.gethostname()}.local.",  # Hostname of the machine
         )
-        await websocket.send(error_message)
-        logging.error(error_message)
 
-    finally:
-        if acquired:
-            serial_port_lock.release()
+
+async def websocket_handler(bridges, websocket):
+    """Hands each new WebSocket connection to the bridge of its path."""
+    for bridge in bridges:
+        if websocket.request.path == bridge.path:
+            await bridge.serial_websocket_handler(websocket)
+            return
+        if websocket.request.path == bridge.monitor_path:
+            await bridge.monitor_handler(websocket)
+            return
+    # else
+    error_message = (
+        f"Error: No handler for path {websocket.request.path}, " f"closing connection"
+    )
+    await websocket.send(error_message)
+    logging.error(error_message)
+
+
+def create_bridges(serial_ports, baud_rate):
+    """
+    Create a bridge for each `PORT[=NAME]` specification. A single port
+    without a name is served on `WEBSOCKET_PATH`, other ports on
+    `WEBSOCKET_PATH/NAME`, where the name defaults to the port's base name.
+    """
+    if len(serial_ports) == 1 and "=" not in serial_ports[0]:
+        return [SerialBridge(serial_ports[0], baud_rate)]
+    # else
+    bridges = []
+    for spec in serial_ports:
+        serial_port_name, _, name = spec.partition("=")
+        name = name or os.path.basename(serial_port_name)
+        path = f"{WEBSOCKET_PATH}/{name}"
+        if any(bridge.path == path for bridge in bridges):
+            raise ValueError(f"More than one serial port is named {name}")
+        bridges.append(SerialBridge(serial_port_name, baud_rate, path))
+    return bridges
 
 
 def get_local_ip():
@@ -262,21 +886,24 @@ def get_local_ip():
 async def main():
     """
     Main function to parse arguments, start the WebSocket server, and
-    declare the Zeroconf service.
+    declare the Zeroconf services.
     """
-    global zeroconf_instance, service_info
+    global zeroconf_instance, measure_latency, edge_enabled
 
     parser = argparse.ArgumentParser(
-        description="WebSocket server to relay data from a serial port "
+        description="WebSocket server to relay data from serial ports "
         "with Zeroconf discovery."
     )
     parser.add_argument(
         "-s",
         "--serial_port",
         type=str,
-        default=SERIAL_PORT,
+        action="append",
+        metavar="PORT[=NAME]",
         help="The serial port name to use (e.g., COM1 on Windows, "
-        "/dev/ttyUSB0 on Linux).",
+        f"/dev/ttyUSB0 on Linux; default: {SERIAL_PORT}). Repeat to serve "
+        f"several ports, each on {WEBSOCKET_PATH}/NAME, where NAME defaults "
+        "to the last part of the port name.",
     )
     parser.add_argument(
         "-b",
@@ -292,53 +919,54 @@ async def main():
         default=WEBSOCKET_PORT,
         help="The WebSocket server port (default: 8080).",
     )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        action="store_true",
+        help="Measure how long messages take to pass through the bridge "
+        f"and report it every {LATENCY_REPORT_INTERVAL:.0f} seconds.",
+    )
+    parser.add_argument(
+        "--no_edge",
+        action="store_true",
+        help="Refuse the jobs uploaded by the desktop application, so that it "
+        "answers every line request of the device itself.",
+    )
     args = parser.parse_args()
-    serial_port_name = args.serial_port
+    measure_latency = args.latency
+    edge_enabled = not args.no_edge
     baud_rate = args.baud_rate
     websocket_port = args.websocket_port
-    logging.info(f"Specified serial port: {serial_port_name} at baud rate: {baud_rate}")
+    try:
+        bridges = create_bridges(args.serial_port or [SERIAL_PORT], baud_rate)
+    except ValueError as e:
+        parser.error(str(e))
+    for bridge in bridges:
+        logging.info(
+            f"Specified serial port: {bridge.serial_port_name} at baud rate: "
+            f"{baud_rate}, on path {bridge.path}"
+        )
 
-    # 1. Start the Zeroconf server and register the service
+    # 1. Start the Zeroconf server and register the services
     zeroconf_instance = AsyncZeroconf()
     local_ip = get_local_ip()
     logging.info(f"Local IP address detected for Zeroconf: {local_ip}")
 
-    # Optional properties for the service (can be useful for clients)
-    properties = {
-        "api_ver": "0.1",
-        "port": str(websocket_port),
-        "path": WEBSOCKET_PATH,
-        "board_id": (
-            f"Ayab Serial to WebSocket Bridge for {serial_port_name} at "
-            f"{baud_rate} baud"
-        ),
-        "serial_port_name": serial_port_name,
-        "serial_baud_rate": str(baud_rate),
-    }
-
-    service_info = AsyncServiceInfo(
-        ZEROCONF_SERVICE_TYPE,
-        f"{ZEROCONF_SERVICE_NAME} - {serial_port_name}@{baud_rate}"
-        f"._ayab._tcp.local.",  # Full service name including port and baud rate
-        addresses=[socket.inet_aton(local_ip)],  # Convert IP to binary format
-        port=websocket_port,
-        properties=properties,
-        server=f"{socket.gethostname()}.local.",  # Hostname of the machine
-    )
-
-    logging.info(
-        f"Registering Zeroconf service: {ZEROCONF_SERVICE_NAME} for "
-        f"{serial_port_name}@{baud_rate} on port {websocket_port}"
-    )
-    await zeroconf_instance.async_register_service(service_info)
+    for bridge in bridges:
+        service_info = bridge.service_info(websocket_port, local_ip)
+        logging.info(
+            f"Registering Zeroconf service: {ZEROCONF_SERVICE_NAME} for "
+            f"{bridge.serial_port_name}@{baud_rate} on port {websocket_port}"
+        )
+        await zeroconf_instance.async_register_service(service_info)
+        service_infos.append(service_info)
 
     # 2. Start the WebSocket server
     logging.info(f"Starting WebSocket server on ws://{WEBSOCKET_HOST}:{websocket_port}")
     try:
-        # Pass both serial_port_name and baud_rate to the WebSocket handler function
-        # using a lambda
+        # Pass the bridges to the WebSocket handler function using a lambda
         async with websockets.serve(
-            lambda ws: serial_websocket_handler(serial_port_name, baud_rate, ws),
+            lambda ws: websocket_handler(bridges, ws),
             WEBSOCKET_HOST,
             websocket_port,
         ) as server: